@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+"""Benchmark the Foreman client against the local mock server
+
+Measures get_resources (buffered and streamed), search_resource, bulk
+create/delete, interactive lookups under bulk load with and without a
+RequestScheduler and a full backup_foreman run. Reports latency
+percentiles, throughput and the peak memory allocated by the client.
+
+    python benchmarks/bench_client.py --hosts 5000 --latency 0.001
+"""
+
+import argparse
+import os
+import runpy
+import shutil
+import tempfile
+import threading
+import time
+
+from common import mock_foreman, report, run, summarize
+
+from foreman.bulk import BulkProvisioner
+from foreman.foreman import HOSTS
+from foreman.scheduler import BULK, RequestScheduler, priority
+
+BACKUP_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin', 'backup_foreman')
+
+
+def bench_get_resources(client, args):
+    return run('get_resources', lambda: client.get_resources(resource_type=HOSTS),
+               iterations=args.iterations, items=args.hosts)
+
+
+def bench_stream_resources(client, args):
+    def stream():
+        for _ in client.get_resources(resource_type=HOSTS, stream=True):
+            pass
+
+    return run('get_resources_stream', stream, iterations=args.iterations, items=args.hosts)
+
+
+def bench_search_resource(client, args):
+    names = [host.get('name') for host in client.get_resources(resource_type=HOSTS)[:args.searches]]
+    state = {'i': 0}
+
+    def search():
+        name = names[state['i'] % len(names)]
+        state['i'] += 1
+        client.search_resource(resource_type=HOSTS, data={'name': name})
+
+    return run('search_resource', search, iterations=args.searches, items=1)
+
+
+def bench_bulk(client, args):
+    hostgroup_id = client.get_hostgroups()[0].get('id')
+    created = []
+    state = {'i': 0}
+
+    def create():
+        state['i'] += 1
+        host = client.create_host(data={'name': 'bench{0:06d}.example.com'.format(state['i']),
+                                        'hostgroup_id': hostgroup_id})
+        created.append(host.get('id'))
+
+    results = [run('bulk_create', create, iterations=args.bulk, items=1)]
+
+    def delete():
+        client.delete_host(id=created.pop())
+
+    results.append(run('bulk_delete', delete, iterations=args.bulk, items=1))
+
+    hostgroup = client.get_hostgroups()[0].get('title')
+    provisioner = BulkProvisioner(client, max_workers=args.workers)
+
+    def provision():
+        provisioner.provision({'name': 'bulk{0:06d}.example.com'.format(i), 'hostgroup': hostgroup}
+                              for i in range(args.bulk))
+
+    # A second run would find all hosts created already
+    results.append(run('bulk_provision', provision, iterations=1, items=args.bulk, warmup=0))
+    return results
+
+
+def bench_priority(make_client, args, scheduled):
+    """Time interactive lookups while bulk threads keep the client busy"""
+    scheduler = RequestScheduler(max_concurrency=args.workers) if scheduled else None
+    client = make_client(scheduler=scheduler)
+    stop = threading.Event()
+
+    def bulk(i):
+        with priority(BULK):
+            while not stop.is_set():
+                client.get_host(id=i % args.hosts + 1)
+
+    threads = [threading.Thread(target=bulk, args=(i,)) for i in range(args.bulk_threads)]
+    for thread in threads:
+        thread.start()
+    samples = []
+    try:
+        # Discarded, opens the connections
+        client.get_domains()
+        for _ in range(args.searches // 4):
+            start = time.perf_counter()
+            client.get_domains()
+            samples.append(time.perf_counter() - start)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    return summarize('interactive_{0}'.format('scheduled' if scheduled else 'unscheduled'), samples, items=1)
+
+
+def bench_backup(client, args, workers=0):
+    namespace = runpy.run_path(BACKUP_SCRIPT, run_name='backup_foreman')
+    backup_dir = tempfile.mkdtemp(prefix='foreman-bench-')
+    resource_count = {}
+    try:
+        backup = namespace['ForemanBackup'](hostname='127.0.0.1', port=client.port, username='admin',
+                                            password='changeme', backup_dir=backup_dir, workers=workers)
+        backup.foreman = client
+
+        def count():
+            return sum(len(files) for _, _, files in os.walk(backup_dir))
+
+        def run_backup():
+            backup.run()
+            resource_count['items'] = count()
+
+        name = 'backup_foreman' if not workers else 'backup_foreman_w{0}'.format(workers)
+        result = run(name, run_backup, iterations=1)
+        if result['total_s']:
+            result['items_per_s'] = resource_count['items'] / result['total_s']
+        return result
+    finally:
+        shutil.rmtree(backup_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hosts', type=int, default=2000, help='number of hosts in the dataset')
+    parser.add_argument('--hostgroups', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.0, help='server latency per request in seconds')
+    parser.add_argument('--latency-jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--iterations', type=int, default=5, help='iterations of the listing benchmark')
+    parser.add_argument('--searches', type=int, default=200, help='number of searches')
+    parser.add_argument('--bulk', type=int, default=100, help='number of hosts to create and delete')
+    parser.add_argument('--workers', type=int, default=8, help='concurrency of the bulk provisioner')
+    parser.add_argument('--bulk-threads', type=int, default=32,
+                        help='threads sending bulk requests during the priority benchmark')
+    parser.add_argument('--skip-backup', action='store_true')
+    parser.add_argument('--backup-workers', type=int, default=0,
+                        help='also run the backup with this many worker processes')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    dataset = {'hosts': args.hosts, 'hostgroups': args.hostgroups}
+    with mock_foreman(dataset, latency=args.latency, latency_jitter=args.latency_jitter,
+                      error_rate=args.error_rate) as make_client:
+        client = make_client()
+        results = [bench_get_resources(client, args), bench_stream_resources(client, args),
+                   bench_search_resource(client, args)]
+        results.extend(bench_bulk(client, args))
+        results.extend([bench_priority(make_client, args, False), bench_priority(make_client, args, True)])
+        if not args.skip_backup:
+            results.append(bench_backup(client, args))
+            if args.backup_workers:
+                results.append(bench_backup(client, args, workers=args.backup_workers))
+    report(results, as_json=args.json)
+
+
+if __name__ == '__main__':
+    main()
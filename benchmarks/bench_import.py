@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+"""Benchmark the start-up cost of importing the client
+
+Each sample imports the module in a fresh interpreter, the bare interpreter
+start-up is measured as a baseline. Also reports whether the HTTP stack was
+pulled in by the import.
+
+    python benchmarks/bench_import.py --iterations 20
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from common import report, summarize
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+STATEMENTS = [
+    ('interpreter', 'pass'),
+    ('import foreman', 'import foreman'),
+    ('import backup deps', 'from foreman.foreman import *'),
+    ('first client', "from foreman.foreman import Foreman; Foreman('localhost', 443, 'a', 'b')"),
+]
+
+
+def sample(statement, iterations):
+    samples = []
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    # Discarded, fills the OS file cache and writes the bytecode
+    subprocess.check_call([sys.executable, '-c', statement], env=env)
+    for _ in range(iterations):
+        start = time.perf_counter()
+        subprocess.check_call([sys.executable, '-c', statement], env=env)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def loads_requests():
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    output = subprocess.check_output([sys.executable, '-c', "import sys, foreman; print('requests' in sys.modules)"],
+                                     env=env)
+    return output.strip() == b'True'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    results = [summarize(name, sample(statement, args.iterations)) for name, statement in STATEMENTS]
+    report(results, as_json=args.json)
+    if not args.json:
+        print('requests imported by "import foreman": {0}'.format(loads_requests()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""Compare the HTTP transports against the local mock server
+
+Each transport runs a large host listing, many small concurrent GETs and
+template uploads. "requests_per_call" is the former behaviour of one
+requests call, and so one connection, per request. The HTTP/2 transport is
+only included if httpx is installed; as the mock server speaks plain HTTP
+it measures httpx over HTTP/1.1 there.
+
+    python benchmarks/bench_transport.py --hosts 5000 --concurrency 16 --compress
+"""
+
+import argparse
+from concurrent import futures
+
+from common import mock_foreman, report, run
+
+from foreman.foreman import HOSTS
+from foreman.transport import HTTP2Transport, RequestsTransport, Response, Transport, _requests
+
+
+class PerCallTransport(Transport):
+    """One requests call per request without a session"""
+
+    def request(self, method, url, auth=None, params=None, body=None, headers=None, timeout=None, stream=False):
+        body, headers = self._body(body, headers)
+        req = _requests().request(method.upper(), url, data=params if body is None else body, headers=headers,
+                                  auth=auth, verify=False, timeout=timeout)
+        return Response(req.status_code, req.url, req.headers, content=req.content)
+
+
+def transports(args):
+    yield 'requests_per_call', lambda: PerCallTransport(compress_requests=args.compress)
+    yield 'requests_session', lambda: RequestsTransport(pool_maxsize=args.concurrency,
+                                                        compress_requests=args.compress)
+    try:
+        import httpx  # noqa: F401
+    except ImportError:
+        return
+    yield 'httpx', lambda: HTTP2Transport(max_connections=args.concurrency, compress_requests=args.compress)
+
+
+def bench(name, client, args):
+    ids = [host.get('id') for host in client.get_resources(resource_type=HOSTS)[:args.requests]]
+    template = client.get_config_templates()[0]
+    content = 'echo template\n' * (args.template_size // 14)
+    executor = futures.ThreadPoolExecutor(max_workers=args.concurrency)
+
+    def concurrent_gets():
+        list(executor.map(lambda host_id: client.get_host(id=host_id), ids))
+
+    def uploads():
+        for _ in range(args.uploads):
+            client.update_config_template(id=template['id'], data={'config_template': {'template': content}})
+
+    try:
+        return [
+            run(name + ':list', lambda: client.get_resources(resource_type=HOSTS),
+                iterations=args.iterations, items=args.hosts),
+            run(name + ':gets', concurrent_gets, iterations=args.iterations, items=len(ids)),
+            run(name + ':uploads', uploads, iterations=args.iterations, items=args.uploads),
+        ]
+    finally:
+        executor.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hosts', type=int, default=2000, help='number of hosts in the dataset')
+    parser.add_argument('--latency', type=float, default=0.0, help='server latency per request in seconds')
+    parser.add_argument('--iterations', type=int, default=5)
+    parser.add_argument('--requests', type=int, default=200, help='concurrent GETs per iteration')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--uploads', type=int, default=20, help='template uploads per iteration')
+    parser.add_argument('--template-size', type=int, default=64 * 1024)
+    parser.add_argument('--compress', action='store_true', help='gzip responses and request bodies')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    results = []
+    with mock_foreman({'hosts': args.hosts}, latency=args.latency, compress=args.compress) as make_client:
+        for name, transport in transports(args):
+            client = make_client(transport=transport(), coalesce_requests=False)
+            try:
+                results.extend(bench(name, client, args))
+            finally:
+                client.close()
+    report(results, as_json=args.json)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Helpers shared by the benchmarks
+
+The benchmarks need Python 3.4 or later for tracemalloc and
+time.perf_counter; the client itself still runs on Python 2.7.
+
+The mock Foreman is run in a separate process so timings and memory
+measured in the benchmark process belong to the client only.
+"""
+
+import json
+import multiprocessing
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+# The mock server is not part of the installed package
+sys.path.insert(0, os.path.join(ROOT, 'tests'))
+
+from foreman.foreman import Foreman  # noqa: E402
+from mockserver import MockForeman, generate_dataset  # noqa: E402
+
+
+def _serve(queue, dataset_options, server_options):
+    server = MockForeman(dataset=generate_dataset(**dataset_options), **server_options).start()
+    queue.put(server.port)
+    while True:
+        time.sleep(3600)
+
+
+@contextmanager
+def mock_foreman(dataset_options=None, **server_options):
+    """Run a MockForeman in a child process and yield a client factory"""
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve, args=(queue, dataset_options or {}, server_options))
+    process.daemon = True
+    process.start()
+    try:
+        port = queue.get(timeout=60)
+
+        def client(**kwargs):
+            return Foreman('127.0.0.1', port, 'admin', 'changeme', protocol='http', **kwargs)
+
+        yield client
+    finally:
+        process.terminate()
+        process.join()
+
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(name, samples, items=None, peak_memory=None):
+    """Build the result record of one benchmark
+
+    Args:
+      name (str): Benchmark name
+      samples (list): Duration of each iteration in seconds
+      items (int): Items processed per iteration, used for throughput
+      peak_memory (int): Peak traced memory in bytes
+    """
+    total = sum(samples)
+    result = {
+        'name': name,
+        'iterations': len(samples),
+        'total_s': total,
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p90_ms': percentile(samples, 90) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'max_ms': max(samples) * 1000,
+    }
+    if items is not None and total:
+        result['items_per_s'] = items * len(samples) / total
+    if peak_memory is not None:
+        result['peak_memory_kb'] = peak_memory / 1024.0
+    return result
+
+
+def run(name, func, iterations=1, items=None, warmup=1):
+    """Time func over a number of iterations while tracing memory
+
+    The first warmup calls are discarded, so connection set-up, imports and
+    caches filled on first use do not skew the samples.
+    """
+    for _ in range(warmup):
+        func()
+    samples = []
+    tracemalloc.start()
+    try:
+        for _ in range(iterations):
+            start = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - start)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return summarize(name, samples, items=items, peak_memory=peak)
+
+
+def report(results, as_json=False, stream=sys.stdout):
+    if as_json:
+        json.dump(results, stream, indent=2, sort_keys=True)
+        stream.write('\n')
+        return
+    columns = ['name', 'iterations', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms', 'items_per_s', 'peak_memory_kb']
+    width = max([20] + [len(result['name']) + 2 for result in results])
+    stream.write(columns[0].ljust(width) + ''.join('{0:>16}'.format(c) for c in columns[1:]) + '\n')
+    for result in results:
+        row = [result['name'].ljust(width)]
+        for column in columns[1:]:
+            value = result.get(column)
+            if isinstance(value, float):
+                row.append('{0:>16.2f}'.format(value))
+            else:
+                row.append('{0:>16}'.format('-' if value is None else value))
+        stream.write(''.join(row) + '\n')
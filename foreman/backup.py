@@ -0,0 +1,576 @@
+"""
+Helpers of the backup_foreman script
+
+:class:`BackupStats` records where a backup spends its time. Each resource
+type is timed per stage:
+
+list
+    the collection request
+detail
+    the per-id requests fetching each resource
+clear
+    removing volatile keys (Ansible format only)
+dump
+    serialising to YAML
+write
+    writing files
+
+Requests and bytes received are counted through :class:`StatsTransport`
+and attributed to the resource type and stage active in the requesting
+thread.
+
+Each backup also gets a :class:`Manifest` with a content hash per resource.
+:func:`diff_backups` and :func:`diff_live` use it to skip unchanged
+resources without parsing their YAML files and only diff the others.
+
+Sanitising and dumping resources is CPU bound. With a :class:`BackupPipeline`
+it runs in worker processes, one batch of resources at a time.
+
+Large multi-tenant instances can be backed up in shards, each covering the
+hosts of some organizations, on one or several machines.
+:func:`merge_backups` combines the shard directories into one backup.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent import futures
+from contextlib import contextmanager
+
+from .foreman import ForemanError
+from .transport import Transport
+
+STAGES = ('list', 'detail', 'clear', 'dump', 'write')
+MANIFEST_FILE = 'manifest.json'
+# Resources handed to a worker process at once
+BATCH_SIZE = 100
+
+
+class BackupStats(object):
+    """Timings, request counts and bytes per resource type and stage"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.started = time.time()
+        self.finished = None
+        self.types = {}
+
+    def _entry(self, resource_type):
+        entry = self.types.get(resource_type)
+        if entry is None:
+            entry = self.types[resource_type] = {
+                'items': 0,
+                'requests': 0,
+                'bytes_received': 0,
+                'stages': dict((stage, 0.0) for stage in STAGES),
+            }
+        return entry
+
+    @contextmanager
+    def stage(self, resource_type, stage):
+        """Time a block as a stage of a resource type
+
+        Stages may repeat, e.g. once per resource, their times add up.
+        """
+        previous = getattr(self._local, 'current', None)
+        self._local.current = (resource_type, stage)
+        start = time.time()
+        try:
+            yield
+        finally:
+            elapsed = time.time() - start
+            self._local.current = previous
+            self.add_stage(resource_type, stage, elapsed)
+
+    def add_stage(self, resource_type, stage, seconds):
+        """Add time spent on a stage elsewhere, e.g. in a worker process"""
+        with self._lock:
+            stages = self._entry(resource_type)['stages']
+            stages[stage] = stages.get(stage, 0.0) + seconds
+
+    def add_items(self, resource_type, count):
+        with self._lock:
+            self._entry(resource_type)['items'] += count
+
+    def add_request(self, size):
+        """Count a request of the current thread's resource type"""
+        current = getattr(self._local, 'current', None)
+        resource_type = current[0] if current else None
+        with self._lock:
+            entry = self._entry(resource_type)
+            entry['requests'] += 1
+            entry['bytes_received'] += size
+
+    def finish(self):
+        self.finished = time.time()
+
+    def report(self):
+        """Return the statistics as a dict ready to be dumped as JSON"""
+        elapsed = (self.finished or time.time()) - self.started
+        with self._lock:
+            types = {}
+            for resource_type, entry in self.types.items():
+                entry = dict(entry, stages=dict(entry['stages']))
+                busy = sum(entry['stages'].values())
+                entry['elapsed'] = busy
+                entry['items_per_s'] = entry['items'] / busy if busy else None
+                types[resource_type or 'other'] = entry
+        return {
+            'elapsed': elapsed,
+            'items': sum(entry['items'] for entry in types.values()),
+            'requests': sum(entry['requests'] for entry in types.values()),
+            'bytes_received': sum(entry['bytes_received'] for entry in types.values()),
+            'stages': dict((stage, sum(entry['stages'].get(stage, 0.0) for entry in types.values()))
+                           for stage in STAGES),
+            'resource_types': types,
+        }
+
+    def dump(self, stream):
+        json.dump(self.report(), stream, indent=2, sort_keys=True)
+        stream.write('\n')
+
+
+class _NoStage(object):
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *args):
+        pass
+
+
+def stage(stats, resource_type, name):
+    """Return stats.stage(resource_type, name), or a no-op if stats is None"""
+    if stats is None:
+        return _NoStage()
+    return stats.stage(resource_type, name)
+
+
+class StatsTransport(Transport):
+    """Wrap a transport to count requests and bytes received in BackupStats"""
+
+    def __init__(self, transport, stats):
+        super(StatsTransport, self).__init__()
+        self.transport = transport
+        self.stats = stats
+
+    def request(self, method, url, **kwargs):
+        response = self.transport.request(method, url, **kwargs)
+        self.stats.add_request(0 if kwargs.get('stream') else len(response.content))
+        return response
+
+    def close(self):
+        self.transport.close()
+
+
+def resource_name(resource):
+    """Return the name a resource is backed up under, None if it has none"""
+    for key in ('title', 'login', 'name'):
+        if key in resource:
+            return resource.get(key)
+    return None
+
+
+def file_name(name):
+    return name.replace('/', '_') + '.yaml'
+
+
+def resource_hash(resource):
+    """Return a SHA-256 hash of a resource independent of key order"""
+    content = json.dumps(resource, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def manifest_entry(resource, name):
+    return {
+        'file': file_name(name),
+        'hash': resource_hash(resource),
+        'id': resource.get('id'),
+        'updated_at': resource.get('updated_at'),
+    }
+
+
+class Manifest(object):
+    """Hashes of all resources of a backup
+
+    Stored as manifest.json in the backup directory::
+
+        {"hosts": {"host1.example.com": {"file": "host1.example.com.yaml", "hash": "...",
+                                         "id": 1, "updated_at": "..."}}}
+    """
+
+    def __init__(self, types=None):
+        self.types = types or {}
+        self._lock = threading.Lock()
+
+    def add(self, resource_type, resource, name=None):
+        name = name or resource_name(resource)
+        self.set(resource_type, name, manifest_entry(resource, name))
+
+    def set(self, resource_type, name, entry):
+        with self._lock:
+            self.types.setdefault(resource_type, {})[name] = entry
+
+    def save(self, directory):
+        path = os.path.join(directory, MANIFEST_FILE)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.types, f, indent=1, sort_keys=True)
+        os.rename(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, directory):
+        """Load the manifest of a backup, built from its files if it has none"""
+        path = os.path.join(directory, MANIFEST_FILE)
+        if os.path.exists(path):
+            with open(path) as f:
+                return cls(json.load(f))
+        manifest = cls()
+        for resource_type in sorted(os.listdir(directory)):
+            type_dir = os.path.join(directory, resource_type)
+            if not os.path.isdir(type_dir):
+                continue
+            for entry in sorted(os.listdir(type_dir)):
+                if entry.endswith('.yaml'):
+                    resource = load_resource(os.path.join(type_dir, entry))
+                    manifest.add(resource_type, resource, name=resource_name(resource) or entry[:-5])
+        return manifest
+
+
+def remove_keys_from_dict(keys, data):
+    for key in keys:
+        if key in data:
+            data.pop(key)
+    return data
+
+
+def clear_data(data, invalid_keys):
+    if isinstance(data, list):
+        for i in range(len(data)):
+            data[i] = clear_data(data=data[i], invalid_keys=invalid_keys)
+    elif isinstance(data, dict):
+        data = remove_keys_from_dict(keys=invalid_keys, data=data)
+        for key in data:
+            data[key] = clear_data(data[key], invalid_keys=invalid_keys)
+    return data
+
+
+def _dump(data):
+    import yaml
+    return yaml.safe_dump(data, default_flow_style=False, encoding='utf-8', allow_unicode=True)
+
+
+def write_resource_files(directory, resources):
+    """Dump each resource to its own YAML file in directory
+
+    Runs in the backup process or in a worker process of a BackupPipeline.
+
+    Returns:
+      tuple of the manifest entries as (name, entry) tuples, the resources
+      without a name and the seconds spent per stage
+    """
+    timings = {'dump': 0.0, 'write': 0.0}
+    entries = []
+    skipped = []
+    for resource in resources:
+        name = resource_name(resource)
+        if name is None:
+            skipped.append(resource)
+            continue
+        start = time.time()
+        content = _dump(resource)
+        entries.append((name, manifest_entry(resource, name)))
+        written = time.time()
+        with open(os.path.join(directory, file_name(name)), 'wb') as f:
+            f.write(content)
+        timings['dump'] += written - start
+        timings['write'] += time.time() - written
+    return entries, skipped, timings
+
+
+def dump_ansible_resources(resources, invalid_keys):
+    """Clear volatile keys of resources and dump them as part of a YAML list
+
+    The dumps of consecutive batches concatenate to the dump of the whole
+    list.
+
+    Returns:
+      tuple of the YAML document as bytes and the seconds spent per stage
+    """
+    start = time.time()
+    for i in range(len(resources)):
+        resources[i] = clear_data(resources[i], invalid_keys=invalid_keys)
+        resources[i]['state'] = 'present'
+    cleared = time.time()
+    content = _dump(resources)
+    return content, {'clear': cleared - start, 'dump': time.time() - cleared}
+
+
+class BackupPipeline(object):
+    """Run the CPU bound part of a backup in worker processes
+
+    At most max_pending batches are queued, so fetching blocks instead of
+    piling up resources in memory while the workers are busy.
+
+    Args:
+      workers (int): Number of worker processes
+      max_pending (int): Batches queued or in progress at most, twice the
+          number of workers by default
+    """
+
+    def __init__(self, workers, max_pending=None):
+        self.executor = futures.ProcessPoolExecutor(max_workers=workers)
+        self.max_pending = max_pending or workers * 2
+        self._pending = {}
+
+    def _wait(self, return_when):
+        done, _ = futures.wait(list(self._pending), return_when=return_when)
+        for future in done:
+            callback = self._pending.pop(future)
+            result = future.result()
+            if callback is not None:
+                callback(result)
+
+    def submit(self, function, *args, **kwargs):
+        """Queue function(*args) for a worker, blocking while the queue is full
+
+        Args:
+          callback (callable): Called with the result in the calling process
+        Returns:
+          Future
+        """
+        callback = kwargs.pop('callback', None)
+        while len(self._pending) >= self.max_pending:
+            self._wait(futures.FIRST_COMPLETED)
+        future = self.executor.submit(function, *args)
+        self._pending[future] = callback
+        return future
+
+    def result(self, future):
+        """Wait for a future of submit and return its result"""
+        while future in self._pending:
+            self._wait(futures.FIRST_COMPLETED)
+        return future.result()
+
+    def close(self):
+        """Wait for all batches and stop the workers"""
+        try:
+            while self._pending:
+                self._wait(futures.ALL_COMPLETED)
+        finally:
+            self.executor.shutdown(wait=True)
+
+
+def merge_backups(directory, sources):
+    """Merge backups written by backup_foreman shards into one directory
+
+    Resources found in several shards are copied once. If their content
+    differs between shards, the first one is kept and the conflict reported.
+
+    Args:
+      directory (str): Directory of the merged backup, created if missing
+      sources (list): Backup directories of the shards
+    Returns:
+      list of (resource type, name, source directory) tuples of the
+      conflicting resources that were not copied
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    merged = Manifest()
+    conflicts = []
+    for source in sources:
+        manifest = Manifest.load(source)
+        for resource_type, entries in sorted(manifest.types.items()):
+            known = merged.types.get(resource_type, {})
+            type_dir = os.path.join(directory, resource_type)
+            if not os.path.isdir(type_dir):
+                os.makedirs(type_dir)
+            for name, entry in sorted(entries.items()):
+                if name in known:
+                    if known[name]['hash'] != entry['hash']:
+                        conflicts.append((resource_type, name, source))
+                    continue
+                shutil.copyfile(os.path.join(source, resource_type, entry['file']),
+                                os.path.join(type_dir, entry['file']))
+                merged.set(resource_type, name, entry)
+    merged.save(directory)
+    return conflicts
+
+
+def load_resource(path):
+    import yaml
+    with open(path, 'rb') as f:
+        return yaml.safe_load(f)
+
+
+def _key(item):
+    """Identity of a list element used to match elements of two lists"""
+    if isinstance(item, dict):
+        for key in ('id', 'name'):
+            if item.get(key) is not None:
+                return key, item[key]
+    return None
+
+
+def structural_diff(old, new, path=''):
+    """Return the differences between two decoded resources
+
+    Lists of dicts are matched by id or name, other lists are compared by
+    position.
+
+    Returns:
+      list of (path, old value, new value) tuples, None stands for a missing
+      value
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        changes = []
+        for key in sorted(set(old) | set(new), key=str):
+            child = '{0}.{1}'.format(path, key) if path else str(key)
+            changes.extend(structural_diff(old.get(key), new.get(key), child))
+        return changes
+    if isinstance(old, list) and isinstance(new, list):
+        old_keys = [_key(item) for item in old]
+        new_keys = [_key(item) for item in new]
+        if None not in old_keys and None not in new_keys:
+            old_items = dict(zip(old_keys, old))
+            new_items = dict(zip(new_keys, new))
+            changes = []
+            for key in old_keys + [k for k in new_keys if k not in old_items]:
+                child = '{0}[{1}={2}]'.format(path, key[0], key[1])
+                changes.extend(structural_diff(old_items.get(key), new_items.get(key), child))
+            return changes
+        changes = []
+        for i in range(max(len(old), len(new))):
+            changes.extend(structural_diff(old[i] if i < len(old) else None, new[i] if i < len(new) else None,
+                                           '{0}[{1}]'.format(path, i)))
+        return changes
+    if old != new:
+        return [(path, old, new)]
+    return []
+
+
+class DiffReport(object):
+    """Changed, added and removed resources per resource type
+
+    Attributes:
+      changed (dict): Resource type to a dict of name to structural changes
+      added (dict): Resource type to a list of names
+      removed (dict): Resource type to a list of names
+      loaded (int): Number of resources that had to be parsed or fetched
+    """
+
+    def __init__(self):
+        self.changed = {}
+        self.added = {}
+        self.removed = {}
+        self.loaded = 0
+
+    def __bool__(self):
+        return bool(self.changed or self.added or self.removed)
+    __nonzero__ = __bool__
+
+    def to_dict(self):
+        types = sorted(set(self.changed) | set(self.added) | set(self.removed))
+        return dict((resource_type, {
+            'changed': dict((name, [list(change) for change in changes])
+                            for name, changes in self.changed.get(resource_type, {}).items()),
+            'added': sorted(self.added.get(resource_type, [])),
+            'removed': sorted(self.removed.get(resource_type, [])),
+        }) for resource_type in types)
+
+    def format(self):
+        """Return a compact human readable report"""
+        lines = []
+        for resource_type, entry in sorted(self.to_dict().items()):
+            lines.append('{0}: {1} changed, {2} added, {3} removed'.format(
+                resource_type, len(entry['changed']), len(entry['added']), len(entry['removed'])))
+            for name in sorted(entry['changed']):
+                changes = ', '.join('{0} {1!r} -> {2!r}'.format(*change) for change in entry['changed'][name])
+                lines.append('  ~ {0}: {1}'.format(name, changes))
+            lines.extend('  + {0}'.format(name) for name in entry['added'])
+            lines.extend('  - {0}'.format(name) for name in entry['removed'])
+        return '\n'.join(lines)
+
+
+def _compare(report, resource_type, old_entries, new_entries, load_old, load_new):
+    """Compare the manifest entries of one resource type
+
+    Only resources whose hashes differ are loaded and diffed.
+    """
+    for name in sorted(set(old_entries) | set(new_entries), key=str):
+        old, new = old_entries.get(name), new_entries.get(name)
+        if old is None:
+            report.added.setdefault(resource_type, []).append(name)
+        elif new is None:
+            report.removed.setdefault(resource_type, []).append(name)
+        elif old['hash'] != new['hash']:
+            report.loaded += 1
+            changes = structural_diff(load_old(name), load_new(name))
+            if changes:
+                report.changed.setdefault(resource_type, {})[name] = changes
+
+
+def diff_backups(old_directory, new_directory):
+    """Compare two backups written by backup_foreman
+
+    Returns:
+      DiffReport
+    """
+    old_manifest = Manifest.load(old_directory)
+    new_manifest = Manifest.load(new_directory)
+    report = DiffReport()
+    for resource_type in sorted(set(old_manifest.types) | set(new_manifest.types)):
+        old_entries = old_manifest.types.get(resource_type, {})
+        new_entries = new_manifest.types.get(resource_type, {})
+        _compare(report, resource_type, old_entries, new_entries,
+                 lambda name, t=resource_type: load_resource(
+                     os.path.join(old_directory, t, old_entries[name]['file'])),
+                 lambda name, t=resource_type: load_resource(
+                     os.path.join(new_directory, t, new_entries[name]['file'])))
+    return report
+
+
+def diff_live(directory, foreman, resource_types=None):
+    """Compare a backup with the resources currently in Foreman
+
+    Resources whose updated_at did not change since the backup are taken as
+    unchanged without fetching them. The others are fetched, hashed and
+    only diffed if their hash differs.
+
+    Args:
+      directory (str): Backup directory
+      foreman (Foreman): Client of the Foreman to compare with
+      resource_types (list): Resource types to compare, all types of the
+          backup by default
+    Returns:
+      DiffReport
+    """
+    manifest = Manifest.load(directory)
+    report = DiffReport()
+    for resource_type in resource_types or sorted(manifest.types):
+        old_entries = manifest.types.get(resource_type, {})
+        new_entries = {}
+        live = {}
+        for item in foreman.get_resources(resource_type=resource_type):
+            name = resource_name(item)
+            if name is None:
+                continue
+            old = old_entries.get(name)
+            if old is not None and old.get('updated_at') and old.get('updated_at') == item.get('updated_at'):
+                new_entries[name] = old
+                continue
+            if 'id' in item:
+                try:
+                    item = foreman.get_resource(resource_type=resource_type, resource_id=item['id'])
+                except ForemanError as e:
+                    if e.status_code != 404:
+                        raise
+            live[name] = item
+            new_entries[name] = {'hash': resource_hash(item)}
+        _compare(report, resource_type, old_entries, new_entries,
+                 lambda name, t=resource_type: load_resource(
+                     os.path.join(directory, t, old_entries[name]['file'])),
+                 lambda name: live[name])
+    return report
@@ -0,0 +1,298 @@
+"""
+Client-side load balancing across Foreman replicas
+
+Several Foreman frontends sharing one database can serve the same client. A
+:class:`LoadBalancer` is a transport sending each request to one of them::
+
+    balancer = LoadBalancer(['https://foreman1.example.com', 'https://foreman2.example.com'],
+                            health_interval=10)
+    f = Foreman('foreman.example.com', 443, 'admin', 'secret', transport=balancer)
+
+The host name the client was created with is replaced by the endpoint
+chosen for each request. Endpoints are chosen by the fewest requests in
+flight, or with ``strategy=LATENCY`` by their recent response time weighted
+by the requests in flight. A streamed response is in flight until it is
+closed.
+
+Each endpoint has a circuit breaker. After ``failure_threshold`` consecutive
+failures (connection errors, timeouts and 502, 503 or 504 responses) it
+is taken out of rotation. After ``reset_timeout`` seconds one request is let
+through as a probe, and its outcome closes or opens the breaker again.
+Health checks of ``/api/status``, run by :meth:`LoadBalancer.check_health`
+or every ``health_interval`` seconds in the background, close and open the
+breakers too.
+
+GET requests failing on one endpoint are retried on another, other methods
+are not since they may have been applied. Requests timing out are retried
+the same way, and so are requests of any method whose connection timed
+out, as long as the current deadline leaves time for it.
+
+Health checks are sent with the credentials of the client's last request,
+or those given as ``auth``. An endpoint answering 401 or 403 is up.
+"""
+
+import threading
+import time
+
+from .deadline import Deadline
+from .transport import RequestsTransport, Transport, TransportTimeout
+
+LEAST_OUTSTANDING = 'least_outstanding'
+LATENCY = 'latency'
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Status codes of a frontend that is down or restarting
+FAILURE_STATUS_CODES = (502, 503, 504)
+HEALTH_PATH = '/api/status'
+# Status codes of a frontend that is up, even if it rejects the credentials
+HEALTHY_STATUS_CODES = (200, 401, 403)
+# Weight of the latest sample in the moving average of response times
+LATENCY_ALPHA = 0.3
+
+
+class NoEndpointAvailable(Exception):
+    """All endpoints are out of rotation"""
+
+
+class Endpoint(object):
+    """State of one replica"""
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.outstanding = 0
+        self.latency = None
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.requests = 0
+        self.errors = 0
+
+    def to_dict(self):
+        return {
+            'url': self.url,
+            'state': self.state,
+            'outstanding': self.outstanding,
+            'latency_ms': self.latency * 1000 if self.latency is not None else None,
+            'requests': self.requests,
+            'errors': self.errors,
+        }
+
+
+class LoadBalancer(Transport):
+    """Transport spreading requests over several Foreman endpoints
+
+    Args:
+      endpoints (list): Base URLs of the replicas, e.g.
+          'https://foreman1.example.com:443'
+      transport (Transport): Transport sending the requests, a
+          RequestsTransport by default
+      strategy (str): LEAST_OUTSTANDING or LATENCY
+      failure_threshold (int): Consecutive failures opening the breaker of
+          an endpoint
+      reset_timeout (float): Seconds before an open breaker lets a probe
+          request through
+      retries (int): Other endpoints a failed GET request is sent to
+      health_interval (float): Seconds between background health checks,
+          None disables them
+      health_timeout (float): Timeout of a health check
+      auth (tuple): Credentials of the health checks, those of the last
+          request by default
+    """
+
+    def __init__(self, endpoints, transport=None, strategy=LEAST_OUTSTANDING, failure_threshold=3,
+                 reset_timeout=10.0, retries=1, health_interval=None, health_timeout=2.0, auth=None):
+        super(LoadBalancer, self).__init__()
+        if not endpoints:
+            raise ValueError('At least one endpoint is required')
+        if strategy not in (LEAST_OUTSTANDING, LATENCY):
+            raise ValueError('Unknown strategy {0!r}'.format(strategy))
+        self.endpoints = [Endpoint(url) for url in endpoints]
+        self.transport = transport if transport is not None else RequestsTransport()
+        self.strategy = strategy
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.retries = retries
+        self.health_timeout = health_timeout
+        self.auth = auth
+        self._last_auth = None
+        self._lock = threading.Lock()
+        self._next = 0
+        self._stop = threading.Event()
+        self._health_thread = None
+        if health_interval:
+            self._health_thread = threading.Thread(target=self._health_loop, args=(health_interval,))
+            self._health_thread.daemon = True
+            self._health_thread.start()
+
+    def _score(self, endpoint):
+        if self.strategy == LATENCY:
+            # Unmeasured endpoints are tried first to get a sample
+            return (endpoint.latency or 0.0) * (endpoint.outstanding + 1)
+        return endpoint.outstanding
+
+    def _available(self, endpoint, now):
+        if endpoint.state == CLOSED:
+            return True
+        if endpoint.state == OPEN and now - endpoint.opened_at >= self.reset_timeout:
+            return True
+        # Half open endpoints take one probe at a time
+        return False
+
+    def _choose(self, exclude):
+        """Pick an endpoint and count the request against it"""
+        now = time.time()
+        with self._lock:
+            candidates = [endpoint for endpoint in self.endpoints
+                          if endpoint not in exclude and self._available(endpoint, now)]
+            if not candidates:
+                raise NoEndpointAvailable('No Foreman endpoint available')
+            # Rotate the endpoint preferred on ties so they are spread evenly
+            self._next = (self._next + 1) % len(self.endpoints)
+            count = len(self.endpoints)
+            endpoint = min(candidates, key=lambda e: (self._score(e), (self.endpoints.index(e) - self._next) % count))
+            if endpoint.state == OPEN:
+                endpoint.state = HALF_OPEN
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def _release(self, endpoint):
+        with self._lock:
+            endpoint.outstanding -= 1
+
+    def _record(self, endpoint, elapsed=None, failed=False, release=True):
+        with self._lock:
+            if release:
+                endpoint.outstanding -= 1
+            if failed:
+                endpoint.errors += 1
+                endpoint.failures += 1
+                if endpoint.state == HALF_OPEN or endpoint.failures >= self.failure_threshold:
+                    endpoint.state = OPEN
+                    endpoint.opened_at = time.time()
+                return
+            endpoint.failures = 0
+            endpoint.state = CLOSED
+            if endpoint.latency is None:
+                endpoint.latency = elapsed
+            else:
+                endpoint.latency += LATENCY_ALPHA * (elapsed - endpoint.latency)
+
+    def _retry(self, method, tried, sent=True):
+        """Return the endpoint to retry a failed request on, None if there is none
+
+        Args:
+          sent (bool): False if the request certainly did not reach the
+              endpoint, so it can be retried whatever its method
+        """
+        if (sent and method.lower() != 'get') or len(tried) > self.retries:
+            return None
+        try:
+            return self._choose(tried)
+        except NoEndpointAvailable:
+            return None
+
+    @staticmethod
+    def _rewrite(url, endpoint):
+        # scheme://host:port/path -> endpoint/path
+        parts = url.split('/', 3)
+        return endpoint.url + '/' + (parts[3] if len(parts) > 3 else '')
+
+    @staticmethod
+    def _retry_timeout(timeout):
+        """Return the timeout of a retry within the current deadline, None if it passed"""
+        deadline = Deadline.current()
+        remaining = deadline.remaining() if deadline is not None else None
+        if remaining is None:
+            return timeout
+        if remaining <= 0:
+            return None
+        if timeout is None:
+            return (remaining, remaining)
+        return (min(timeout[0], remaining), min(timeout[1], remaining))
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get('auth') is not None:
+            self._last_auth = kwargs['auth']
+        endpoint = self._choose(())
+        tried = []
+        while True:
+            tried.append(endpoint)
+            start = time.time()
+            try:
+                response = self.transport.request(method, self._rewrite(url, endpoint), **kwargs)
+            except TransportTimeout as e:
+                self._record(endpoint, failed=True)
+                timeout = self._retry_timeout(kwargs.get('timeout'))
+                if timeout is None:
+                    raise
+                endpoint = self._retry(method, tried, sent=not e.connect)
+                if endpoint is None:
+                    raise
+                kwargs['timeout'] = timeout
+                continue
+            except Exception:
+                self._record(endpoint, failed=True)
+                endpoint = self._retry(method, tried)
+                if endpoint is None:
+                    raise
+                continue
+            if response.status_code not in FAILURE_STATUS_CODES:
+                if not kwargs.get('stream'):
+                    self._record(endpoint, elapsed=time.time() - start)
+                    return response
+                # The body of a streamed response is still being read, the
+                # request counts as outstanding until it is closed
+                self._record(endpoint, elapsed=time.time() - start, release=False)
+                response.call_on_close(lambda endpoint=endpoint: self._release(endpoint))
+                return response
+            self._record(endpoint, failed=True)
+            endpoint = self._retry(method, tried)
+            if endpoint is None:
+                return response
+            response.close()
+
+    def check_health(self):
+        """Check /api/status of every endpoint and close or open their breakers
+
+        Returns:
+          dict of endpoint URL to True if it answered
+        """
+        result = {}
+        for endpoint in self.endpoints:
+            try:
+                response = self.transport.request('get', endpoint.url + HEALTH_PATH,
+                                                  auth=self.auth or self._last_auth,
+                                                  timeout=(self.health_timeout, self.health_timeout))
+                response.close()
+                healthy = response.status_code in HEALTHY_STATUS_CODES
+            except Exception:
+                healthy = False
+            with self._lock:
+                if healthy:
+                    endpoint.failures = 0
+                    endpoint.state = CLOSED
+                else:
+                    endpoint.state = OPEN
+                    endpoint.opened_at = time.time()
+            result[endpoint.url] = healthy
+        return result
+
+    def _health_loop(self, interval):
+        while not self._stop.wait(interval):
+            self.check_health()
+
+    def stats(self):
+        """Return the state, requests in flight, latency and counters of each endpoint"""
+        with self._lock:
+            return [endpoint.to_dict() for endpoint in self.endpoints]
+
+    def close(self):
+        self._stop.set()
+        if self._health_thread is not None:
+            self._health_thread.join()
+            self._health_thread = None
+        self.transport.close()
@@ -0,0 +1,333 @@
+"""
+Bulk host provisioning
+
+:class:`BulkProvisioner` creates many hosts concurrently. References to
+hostgroups, domains, subnets and compute profiles are checked against
+lookups cached once per provisioner before any host is sent, so a typo does
+not surface after half the cluster has been built::
+
+    provisioner = BulkProvisioner(foreman, max_workers=16, retries=2, on_error=ROLLBACK)
+    result = provisioner.provision({'name': 'node{0:03d}'.format(i), 'hostgroup': 'k8s/worker',
+                                    'domain': 'example.com', 'subnet': 'cluster'} for i in range(500))
+    print(result.summary())
+
+References may be given by name (``'hostgroup': 'k8s/worker'``, hostgroups
+also match their title) or by id (``'hostgroup_id': 5``).
+
+A run started within a :class:`~foreman.deadline.Deadline` stops sending
+creates once it passed; hosts not sent yet stay skipped.
+
+A create that timed out or failed with a server error may still have been
+carried out by Foreman. Before such a create is retried the host is looked
+up by name, and reported as created if it exists. Hosts whose outcome is
+still unknown in the end are looked up again when rolling back.
+"""
+
+import threading
+import time
+from concurrent import futures
+
+from .deadline import Deadline, detached, propagate
+from .foreman import COMPUTE_PROFILES, DOMAINS, HOSTGROUPS, SUBNETS, ForemanError
+
+CONTINUE = 'continue'
+ROLLBACK = 'rollback'
+
+CREATED = 'created'
+FAILED = 'failed'
+INVALID = 'invalid'
+SKIPPED = 'skipped'
+ROLLED_BACK = 'rolled_back'
+
+# Reference name in a host definition and the resource type it points to
+REFERENCES = (
+    ('hostgroup', HOSTGROUPS),
+    ('domain', DOMAINS),
+    ('subnet', SUBNETS),
+    ('compute_profile', COMPUTE_PROFILES),
+)
+
+
+def _retryable(error):
+    """Server errors and connection problems are retried, validation errors are not"""
+    if isinstance(error, ForemanError):
+        return error.status_code is None or error.status_code >= 500
+    return True
+
+
+class HostResult(object):
+    """Outcome of provisioning one host
+
+    Attributes:
+      name (str): Host name
+      data (dict): Host data sent to Foreman, references resolved to ids
+      status (str): One of created, failed, invalid, skipped or rolled_back
+      host (dict): Host returned by Foreman if it was created
+      error (Exception): Last error, if any
+      attempts (int): Number of create requests sent
+      elapsed (float): Seconds spent on all attempts
+      uncertain (bool): A create failed in a way that may have created the
+          host anyway
+    """
+
+    __slots__ = ('name', 'data', 'status', 'host', 'error', 'attempts', 'elapsed', 'uncertain')
+
+    def __init__(self, name, data, status=SKIPPED, error=None):
+        self.name = name
+        self.data = data
+        self.status = status
+        self.host = None
+        self.error = error
+        self.attempts = 0
+        self.elapsed = 0.0
+        self.uncertain = False
+
+    def __repr__(self):
+        return '<HostResult {0} {1}>'.format(self.name, self.status)
+
+
+class BulkResult(list):
+    """List of HostResult in input order
+
+    Attributes:
+      elapsed (float): Wall clock seconds of the whole run
+      rolled_back (bool): True if created hosts were deleted again
+    """
+
+    def __init__(self, items=()):
+        super(BulkResult, self).__init__(items)
+        self.elapsed = 0.0
+        self.rolled_back = False
+
+    def with_status(self, status):
+        return [result for result in self if result.status == status]
+
+    @property
+    def succeeded(self):
+        return len(self) > 0 and all(result.status == CREATED for result in self)
+
+    def summary(self):
+        """Return counts per status plus timings as a dict"""
+        summary = {'total': len(self), 'elapsed': self.elapsed, 'rolled_back': self.rolled_back}
+        for result in self:
+            summary[result.status] = summary.get(result.status, 0) + 1
+        timings = sorted(result.elapsed for result in self if result.attempts)
+        if timings:
+            summary['max_host_time'] = timings[-1]
+            summary['median_host_time'] = timings[len(timings) // 2]
+        if self.elapsed:
+            summary['hosts_per_second'] = len(self.with_status(CREATED)) / self.elapsed
+        return summary
+
+
+class BulkProvisioner(object):
+    """Create hosts concurrently with reference checks and error handling
+
+    Args:
+      foreman (Foreman): Client used to create hosts
+      max_workers (int): Maximum number of concurrent create requests
+      on_error (str): CONTINUE creates all valid hosts regardless of failures,
+          ROLLBACK stops at the first failure and deletes the hosts created so
+          far. With ROLLBACK nothing is sent if any definition is invalid.
+      retries (int): How often a failed create is retried. Validation errors
+          (4xx) are never retried.
+      retry_delay (float): Seconds to wait before the first retry, doubled on
+          each further retry
+    """
+
+    def __init__(self, foreman, max_workers=8, on_error=CONTINUE, retries=0, retry_delay=1.0):
+        if on_error not in (CONTINUE, ROLLBACK):
+            raise ValueError('on_error must be {0} or {1}'.format(CONTINUE, ROLLBACK))
+        self.foreman = foreman
+        self.max_workers = max_workers
+        self.on_error = on_error
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._lookups = {}
+        self._lock = threading.Lock()
+
+    def _lookup(self, resource_type):
+        """Return ids and names of a resource type, fetched once"""
+        with self._lock:
+            lookup = self._lookups.get(resource_type)
+            if lookup is None:
+                by_name = {}
+                ids = set()
+                for item in self.foreman.get_resources(resource_type=resource_type):
+                    ids.add(item.get('id'))
+                    for key in ('name', 'title'):
+                        if item.get(key):
+                            by_name[item.get(key)] = item.get('id')
+                lookup = self._lookups[resource_type] = (ids, by_name)
+            return lookup
+
+    def refresh(self):
+        """Forget cached lookups, e.g. after hostgroups were added"""
+        with self._lock:
+            self._lookups.clear()
+
+    def resolve(self, definition):
+        """Replace references by name with ids and check they exist
+
+        Args:
+          definition (dict): Host definition
+        Returns:
+          dict ready to be posted
+        Raises:
+          ValueError: A reference is unknown
+        """
+        data = dict(definition)
+        if not data.get('name'):
+            raise ValueError('Host definition without name')
+        unknown = []
+        for reference, resource_type in REFERENCES:
+            id_key = reference + '_id'
+            if reference in data:
+                ids, by_name = self._lookup(resource_type)
+                value = data.pop(reference)
+                if value in by_name:
+                    data[id_key] = by_name[value]
+                else:
+                    unknown.append('{0} {1!r}'.format(reference, value))
+            elif data.get(id_key) is not None:
+                ids, by_name = self._lookup(resource_type)
+                if data[id_key] not in ids:
+                    unknown.append('{0} {1!r}'.format(id_key, data[id_key]))
+        if unknown:
+            raise ValueError('Unknown ' + ', '.join(unknown))
+        return data
+
+    def _find(self, name):
+        """Return the host named name, None if it does not exist
+
+        Raises:
+          ForemanError: The lookup itself failed
+        """
+        try:
+            return self.foreman.get_host(id=name)
+        except ForemanError as e:
+            if e.status_code == 404:
+                return None
+            raise
+
+    def _check_created(self, result):
+        """Look up a host whose create may have been carried out
+
+        Returns:
+          True if the host exists, result is then marked as created
+        """
+        try:
+            host = self._find(result.name)
+        except Exception:
+            return False
+        if host is None:
+            return False
+        result.host = host
+        result.status = CREATED
+        result.error = None
+        result.uncertain = False
+        return True
+
+    def _create(self, result, stop):
+        start = time.time()
+        delay = self.retry_delay
+        deadline = Deadline.current()
+        try:
+            while True:
+                result.attempts += 1
+                try:
+                    result.host = self.foreman.create_host(data=result.data)
+                    result.status = CREATED
+                    result.error = None
+                    result.uncertain = False
+                    return result
+                except Exception as e:
+                    result.error = e
+                    if _retryable(e):
+                        # Timeouts and server errors leave open whether the host was created
+                        result.uncertain = True
+                    # A create still running on the server makes a retry fail
+                    # as a duplicate, so the host is looked up in that case too
+                    if result.uncertain and self._check_created(result):
+                        return result
+                    if result.attempts > self.retries or not _retryable(e) or stop.is_set():
+                        result.status = FAILED
+                        return result
+                remaining = deadline.remaining() if deadline is not None else None
+                if remaining is not None and remaining < delay:
+                    # The retry could only fail on the deadline
+                    result.status = FAILED
+                    return result
+                time.sleep(delay)
+                delay *= 2
+        finally:
+            result.elapsed = time.time() - start
+
+    def _rollback(self, results):
+        for result in results:
+            if result.status == FAILED and result.uncertain:
+                self._check_created(result)
+            if result.status == CREATED:
+                try:
+                    self.foreman.delete_host(id=result.host.get('id'))
+                    result.status = ROLLED_BACK
+                except ForemanError as e:
+                    # Keep it marked as created so the caller sees what is left
+                    result.error = e
+
+    def provision(self, definitions):
+        """Create hosts from an iterable of host definitions
+
+        Args:
+          definitions (iterable): Host definitions as dicts
+        Returns:
+          BulkResult
+        """
+        start = time.time()
+        results = BulkResult()
+        for definition in definitions:
+            name = definition.get('name')
+            try:
+                results.append(HostResult(name, self.resolve(definition)))
+            except ValueError as e:
+                results.append(HostResult(name, definition, status=INVALID, error=e))
+
+        if self.on_error == ROLLBACK and results.with_status(INVALID):
+            results.elapsed = time.time() - start
+            return results
+
+        stop = threading.Event()
+        deadline = Deadline.current()
+        create = propagate(self._create)
+        executor = futures.ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            pending = set()
+            for result in results:
+                if result.status != SKIPPED:
+                    continue
+                if stop.is_set() or (deadline is not None and deadline.expired()):
+                    break
+                # Bounded submission keeps at most max_workers creates queued
+                while len(pending) >= self.max_workers:
+                    done, pending = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+                    self._check(done, stop)
+                pending.add(executor.submit(create, result, stop))
+            done, _ = futures.wait(pending)
+            self._check(done, stop)
+        finally:
+            executor.shutdown(wait=True)
+
+        if self.on_error == ROLLBACK and stop.is_set():
+            # Clean up even if the deadline passed
+            with detached():
+                self._rollback(results)
+            results.rolled_back = True
+        results.elapsed = time.time() - start
+        return results
+
+    def _check(self, done, stop):
+        if self.on_error != ROLLBACK:
+            return
+        for future in done:
+            if future.result().status == FAILED:
+                stop.set()
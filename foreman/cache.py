@@ -0,0 +1,185 @@
+"""
+On-disk cache of GET responses shared between processes
+
+Short-lived processes each building a new client refetch the same
+architectures, operating systems and hostgroups. A :class:`DiskCache` keeps
+decoded GET responses in a SQLite file, so the next process starts warm::
+
+    cache = DiskCache('/var/cache/foreman/api.db', ttls={'hosts': 30})
+    f = Foreman('foreman.example.com', 443, 'admin', 'secret', cache=cache)
+
+Every process opens the same file. SQLite in WAL mode serialises writers and
+lets readers go on while one writes, and the file is memory-mapped so large
+entries are read without copying them through read calls.
+
+Entries expire after the TTL of their resource type. When the total size of
+the entries exceeds ``max_size``, the least recently read ones are evicted.
+The time an entry was read is only written back once it is older than
+``touch_interval``, so cache hits rarely take the write lock.
+
+A cache that can not be read or written, e.g. because another process holds
+the lock for longer than ``timeout``, is treated as a miss; the request then
+goes to Foreman.
+Creating, updating or deleting a resource through a client using the cache
+drops all cached responses of that resource type. Changes made by other
+clients are only seen once the entries expired.
+"""
+
+import hashlib
+import json
+import threading
+import time
+
+DEFAULT_TTL = 300
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+DEFAULT_TOUCH_INTERVAL = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    resource_type TEXT NOT NULL,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_resource_type ON entries (resource_type);
+CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at);
+"""
+
+
+def cache_key(*parts):
+    """Return a stable key for JSON serialisable parts"""
+    text = json.dumps(parts, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class DiskCache(object):
+    """GET responses cached in a SQLite file
+
+    Args:
+      path (str): SQLite database file, created if missing
+      default_ttl (float): Seconds responses are served from the cache
+      ttls (dict): TTL per resource type overriding default_ttl. A TTL of 0
+          disables caching of that resource type.
+      max_size (int): Maximum total size of the cached responses in bytes
+      mmap_size (int): Bytes of the file SQLite maps into memory
+      timeout (float): Seconds to wait for a lock held by another process
+      touch_interval (float): Seconds after which reading an entry updates
+          its access time used for eviction
+    """
+
+    def __init__(self, path, default_ttl=DEFAULT_TTL, ttls=None, max_size=DEFAULT_MAX_SIZE,
+                 mmap_size=DEFAULT_MAX_SIZE * 2, timeout=10, touch_interval=DEFAULT_TOUCH_INTERVAL):
+        self.path = path
+        self.default_ttl = default_ttl
+        self.ttls = dict(ttls or {})
+        self.max_size = max_size
+        self.touch_interval = touch_interval
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._lock = threading.RLock()
+        # Imported here so clients without a cache do not load sqlite3
+        import sqlite3
+        self._sqlite3 = sqlite3
+        self._db = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA mmap_size={0:d}'.format(mmap_size))
+        with self._db:
+            self._db.executescript(SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def ttl(self, resource_type):
+        return self.ttls.get(resource_type, self.default_ttl)
+
+    def get(self, key):
+        """Return the cached response of a key, None if missing, expired or unreadable"""
+        now = time.time()
+        with self._lock:
+            try:
+                row = self._db.execute('SELECT body, expires_at, accessed_at FROM entries WHERE key = ?',
+                                       (key,)).fetchone()
+            except self._sqlite3.Error:
+                self.errors += 1
+                row = None
+            if row is None or row[1] <= now:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if now - row[2] >= self.touch_interval:
+                try:
+                    with self._db:
+                        self._db.execute('UPDATE entries SET accessed_at = ? WHERE key = ?', (now, key))
+                except self._sqlite3.Error:
+                    # Only the eviction order suffers
+                    self.errors += 1
+        return json.loads(bytes(row[0]).decode('utf-8'))
+
+    def set(self, key, resource_type, value):
+        """Cache a response, evicting the least recently read entries if the cache is full
+
+        Responses that can not be written are not cached.
+        """
+        ttl = self.ttl(resource_type)
+        if not ttl:
+            return
+        body = json.dumps(value, separators=(',', ':')).encode('utf-8')
+        if len(body) > self.max_size:
+            return
+        now = time.time()
+        with self._lock:
+            try:
+                with self._db:
+                    self._db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)',
+                                     (key, resource_type, self._sqlite3.Binary(body), len(body), now + ttl, now))
+                    self._evict(now)
+            except self._sqlite3.Error:
+                self.errors += 1
+
+    def _evict(self, now):
+        self._db.execute('DELETE FROM entries WHERE expires_at <= ?', (now,))
+        total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_size:
+            return
+        excess = total - self.max_size
+        evicted = []
+        for key, size in self._db.execute('SELECT key, size FROM entries ORDER BY accessed_at'):
+            if excess <= 0:
+                break
+            evicted.append((key,))
+            excess -= size
+        self._db.executemany('DELETE FROM entries WHERE key = ?', evicted)
+
+    def invalidate(self, resource_type=None):
+        """Drop the cached responses of a resource type, or all of them
+
+        Failures are only counted, so they never replace the outcome of the
+        write that triggered the invalidation. The entries then stay until
+        they expire.
+        """
+        with self._lock:
+            try:
+                with self._db:
+                    if resource_type is None:
+                        self._db.execute('DELETE FROM entries')
+                    else:
+                        self._db.execute('DELETE FROM entries WHERE resource_type = ?', (resource_type,))
+            except self._sqlite3.Error:
+                self.errors += 1
+
+    def size(self):
+        """Return the number of entries and their total size in bytes"""
+        with self._lock:
+            return tuple(self._db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone())
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'errors': self.errors}
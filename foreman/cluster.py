@@ -0,0 +1,189 @@
+"""
+Fan-out client for federated Foreman deployments
+
+:class:`ForemanCluster` sends the same read-only call (the ``get_*`` and
+``search_*`` methods listing or showing resources, see ``READ_ONLY_METHODS``)
+to several Foreman servers at once and merges the results. Each returned
+resource is tagged with the name of the server it came from. A slow or
+failing server does not block the others; its error is reported on the
+result. The requests of each member are bounded by a
+:class:`foreman.deadline.Deadline` of its timeout::
+
+    cluster = ForemanCluster({'eu': Foreman(...), 'us': Foreman(...)}, timeout=10)
+    hosts = cluster.search_host({'name': 'web01.example.com'})
+    for host in hosts:
+        print(host['foreman_origin'], host['id'])
+    if not hosts.complete:
+        print(hosts.errors)
+"""
+
+import time
+from concurrent import futures
+
+from .deadline import Deadline
+from .foreman import GET, LIST, RESOURCE_TYPES, SEARCH, ForemanError
+
+ORIGIN_KEY = 'foreman_origin'
+
+
+def _read_only_methods():
+    # Listed by name, a get_ prefix does not make a method safe: get_host_power sends a PUT
+    names = set(['get_resources', 'get_resource', 'search_resource', 'get_compute_attribute',
+                 'get_compute_resource_images', 'get_host_parameters', 'get_operatingsystem_default_templates',
+                 'get_operatingsystem_default_template'])
+    for resource_type, resource, plural, singular, operations in RESOURCE_TYPES:
+        if LIST in operations:
+            names.add('get_' + plural)
+        if GET in operations:
+            names.add('get_' + str(singular))
+        if SEARCH in operations:
+            names.add('search_' + str(singular))
+    return frozenset(names)
+
+
+# Only read-only calls are fanned out
+READ_ONLY_METHODS = _read_only_methods()
+
+
+class ClusterTimeoutError(Exception):
+    """A cluster member did not answer within its timeout"""
+
+    def __init__(self, name, timeout):
+        self.name = name
+        self.timeout = timeout
+        self.message = '{0} did not answer within {1}s'.format(name, timeout)
+        super(ClusterTimeoutError, self).__init__(self.message)
+
+
+class ClusterResult(list):
+    """Merged results of a fan-out call
+
+    Attributes:
+      errors (dict): Exception raised by each failed member, keyed by name
+      timings (dict): Seconds each answering member took, keyed by name
+    """
+
+    def __init__(self, items=()):
+        super(ClusterResult, self).__init__(items)
+        self.errors = {}
+        self.timings = {}
+
+    @property
+    def complete(self):
+        """True if all members answered"""
+        return not self.errors
+
+    @property
+    def timed_out(self):
+        return sorted(name for name, error in self.errors.items() if isinstance(error, ClusterTimeoutError))
+
+
+class ForemanCluster(object):
+    """Query several Foreman servers concurrently
+
+    Args:
+      members (dict or list): Foreman clients keyed by name. A list uses the
+          hostname of each client as its name.
+      timeout (float or dict): Seconds to wait for each member, either one
+          value for all or a dict keyed by member name. None waits forever.
+      max_workers (int): Size of the thread pool, defaults to two threads
+          per member so a hung call does not starve the next fan-out
+      origin_key (str): Key added to each result naming its origin
+    """
+
+    def __init__(self, members, timeout=None, max_workers=None, origin_key=ORIGIN_KEY):
+        if not isinstance(members, dict):
+            members = dict((member.hostname, member) for member in members)
+        if not members:
+            raise ValueError('A cluster needs at least one member')
+        self.members = members
+        self.timeout = timeout
+        self.origin_key = origin_key
+        self._executor = futures.ThreadPoolExecutor(max_workers=max_workers or 2 * len(members))
+
+    def _timeout(self, name):
+        if isinstance(self.timeout, dict):
+            return self.timeout.get(name)
+        return self.timeout
+
+    def _tag(self, name, result):
+        if result is None:
+            return []
+        if isinstance(result, dict):
+            result = [result]
+        for item in result:
+            if isinstance(item, dict):
+                item[self.origin_key] = name
+        return result
+
+    def _timed_call(self, name, method, args, kwargs, deadline):
+        start = time.time()
+        try:
+            # The deadline bounds the member's requests, so a hung member
+            # does not keep the pool thread once its timeout passed
+            with deadline:
+                result = getattr(self.members[name], method)(*args, **kwargs)
+                if result is not None and not isinstance(result, (dict, list)):
+                    # Consume iterators like the filter of get_compute_attribute within the timeout
+                    result = list(result)
+        except ForemanError as e:
+            if e.status_code == 404:
+                # Not existing on this member is an answer, not a failure
+                result = None
+            else:
+                raise
+        return result, time.time() - start
+
+    def call(self, method, *args, **kwargs):
+        """Call a method on all members and merge the results
+
+        Args:
+          method (str): Name of the Foreman method, e.g. 'get_hosts'
+        Returns:
+          ClusterResult
+        """
+        start = time.time()
+        pending = dict((name, self._executor.submit(self._timed_call, name, method, args, kwargs,
+                                                    Deadline(self._timeout(name))))
+                       for name in self.members)
+        result = ClusterResult()
+        # Collect the members with the shortest timeout first
+        order = sorted(pending, key=lambda name: (self._timeout(name) is None, self._timeout(name), name))
+        for name in order:
+            timeout = self._timeout(name)
+            remaining = None if timeout is None else max(0, start + timeout - time.time())
+            try:
+                items, elapsed = pending[name].result(timeout=remaining)
+            except futures.TimeoutError:
+                pending[name].cancel()
+                result.errors[name] = ClusterTimeoutError(name, timeout)
+                continue
+            except Exception as e:
+                result.errors[name] = e
+                continue
+            result.timings[name] = elapsed
+            result.extend(self._tag(name, items))
+        return result
+
+    def __getattr__(self, name):
+        if name not in READ_ONLY_METHODS:
+            raise AttributeError(name)
+        for member in self.members.values():
+            if not callable(getattr(member, name, None)):
+                raise AttributeError(name)
+
+        def fan_out(*args, **kwargs):
+            return self.call(name, *args, **kwargs)
+
+        fan_out.__name__ = name
+        return fan_out
+
+    def close(self):
+        """Stop the worker threads without waiting for hung calls"""
+        self._executor.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
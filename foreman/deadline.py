@@ -0,0 +1,126 @@
+"""
+Deadlines spanning several requests
+
+A deadline limits the total time of everything a thread does within it, e.g.
+all pages of a listing or all creates of a bulk run. Each request only gets
+the time left, and once the deadline passed or was cancelled no further
+request is sent::
+
+    with Deadline(30) as deadline:
+        for host in foreman.iter_resources(resource_type='hosts'):
+            if should_stop(host):
+                deadline.cancel()
+
+Deadlines are tracked per thread. Nested deadlines can only shorten the
+time left, never extend it. Work handed to other threads keeps the deadline
+of the submitting thread if it is wrapped with :func:`propagate`.
+"""
+
+import threading
+import time
+
+from .scheduler import INTERACTIVE, current_priority, priority
+
+_local = threading.local()
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+class Deadline(object):
+    """Point in time after which no more requests are sent
+
+    Args:
+      seconds (float): Time allowed from now on, None for no limit (the
+          deadline can still be cancelled)
+    """
+
+    def __init__(self, seconds=None):
+        self.expires = time.time() + seconds if seconds is not None else None
+        self.cancelled = False
+        self._parent = None
+
+    @classmethod
+    def current(cls):
+        """Return the innermost deadline of the calling thread, or None"""
+        stack = _stack()
+        return stack[-1] if stack else None
+
+    def remaining(self):
+        """Return the seconds left, None if there is no limit
+
+        Enclosing deadlines are taken into account.
+        """
+        if self.expired():
+            return 0.0
+        remaining = None
+        deadline = self
+        while deadline is not None:
+            if deadline.expires is not None:
+                left = deadline.expires - time.time()
+                remaining = left if remaining is None else min(remaining, left)
+            deadline = deadline._parent
+        return max(remaining, 0.0) if remaining is not None else None
+
+    def expired(self):
+        """Return True if this or an enclosing deadline passed or was cancelled"""
+        deadline = self
+        while deadline is not None:
+            if deadline.cancelled or (deadline.expires is not None and deadline.expires <= time.time()):
+                return True
+            deadline = deadline._parent
+        return False
+
+    def cancel(self):
+        """Stop all further requests made within this deadline"""
+        self.cancelled = True
+
+    def __enter__(self):
+        stack = _stack()
+        if stack and stack[-1] is not self and self._parent is None:
+            self._parent = stack[-1]
+        stack.append(self)
+        return self
+
+    def __exit__(self, *args):
+        _stack().pop()
+
+
+def propagate(function):
+    """Wrap function to run within the calling thread's current deadline
+
+    Used for work submitted to thread pools, which would otherwise run
+    without any deadline. The request priority class of the calling thread
+    is kept as well.
+    """
+    deadline = Deadline.current()
+    name = current_priority()
+    if deadline is None and name == INTERACTIVE:
+        return function
+
+    def wrapper(*args, **kwargs):
+        with priority(name):
+            if deadline is None:
+                return function(*args, **kwargs)
+            with deadline:
+                return function(*args, **kwargs)
+    return wrapper
+
+
+class detached(object):
+    """Run a block without the deadlines of the calling thread
+
+    For cleanup that has to happen even after a deadline passed, like
+    deleting hosts created by a bulk run that is rolled back.
+    """
+
+    def __enter__(self):
+        self._saved = _stack()[:]
+        del _stack()[:]
+
+    def __exit__(self, *args):
+        _stack()[:] = self._saved
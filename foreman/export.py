@@ -0,0 +1,221 @@
+"""
+Columnar export of Foreman collections
+
+Resources are fetched page by page with :meth:`Foreman.iter_resources` and
+each page is decoded while it is received, one resource at a time. Only the
+selected fields are kept, so memory grows with the selected columns and not
+with the full resource JSON.
+
+Example::
+
+    columns = to_numpy(foreman, HOSTS, ['name', 'hostgroup_name', 'operatingsystem_name'])
+    write_parquet(foreman, HOSTS, ['name', 'ip', 'subnet_name'], 'hosts.parquet')
+
+NumPy and PyArrow are optional and only imported by the matching functions.
+"""
+
+import csv
+import importlib
+
+
+def _require(module, package=None):
+    """Import an optional dependency on first use"""
+    try:
+        return importlib.import_module(module)
+    except ImportError:
+        raise ImportError('{0} is required for this export format, install it with pip install {0}'.format(
+            package or module))
+
+
+def _getter(field):
+    """Return a function extracting a possibly dotted field from a dict"""
+    if '.' not in field:
+        return lambda item: item.get(field)
+    path = field.split('.')
+
+    def get(item):
+        for key in path:
+            if not isinstance(item, dict):
+                return None
+            item = item.get(key)
+        return item
+
+    return get
+
+
+def iter_column_batches(foreman, resource_type, fields, per_page=1000, search=None):
+    """Yield the selected fields of each page as a dict of lists
+
+    Args:
+      foreman (Foreman): Client to fetch resources with
+      resource_type (str): Resource type, e.g. 'hosts'
+      fields (list): Names of the fields to export, nested keys joined by dots
+      per_page (int): Number of resources fetched per request
+      search (str): Optional search query
+    Returns:
+      generator of dict of field name to list
+    """
+    getters = [(field, _getter(field)) for field in fields]
+    batch = []
+    for item in foreman.iter_resources(resource_type=resource_type, per_page=per_page, search=search, stream=True):
+        batch.append(tuple(get(item) for _, get in getters))
+        if len(batch) >= per_page:
+            yield _columns(fields, batch)
+            batch = []
+    if batch:
+        yield _columns(fields, batch)
+
+
+def _columns(fields, rows):
+    return dict(zip(fields, (list(column) for column in zip(*rows))))
+
+
+def export_columns(foreman, resource_type, fields, per_page=1000, search=None):
+    """Return the selected fields of all resources as a dict of lists"""
+    columns = dict((field, []) for field in fields)
+    for batch in iter_column_batches(foreman, resource_type, fields, per_page=per_page, search=search):
+        for field in fields:
+            columns[field].extend(batch[field])
+    return columns
+
+
+def to_numpy(foreman, resource_type, fields, dtypes=None, per_page=1000, search=None):
+    """Return the selected fields of all resources as NumPy arrays
+
+    Each page is converted into arrays and the pages are concatenated at the
+    end, so no intermediate list of rows is built.
+
+    Args:
+      dtypes (dict): Optional NumPy dtype per field. Fields without a dtype
+          are inferred by NumPy, columns containing None become object arrays.
+    Returns:
+      dict of field name to numpy.ndarray
+    """
+    numpy = _require('numpy')
+    dtypes = dtypes or {}
+    chunks = dict((field, []) for field in fields)
+    for batch in iter_column_batches(foreman, resource_type, fields, per_page=per_page, search=search):
+        for field in fields:
+            chunks[field].append(numpy.asarray(batch[field], dtype=dtypes.get(field)))
+    result = {}
+    for field in fields:
+        if chunks[field]:
+            result[field] = numpy.concatenate(chunks[field])
+        else:
+            result[field] = numpy.empty(0, dtype=dtypes.get(field, object))
+    return result
+
+
+def iter_record_batches(foreman, resource_type, fields, schema=None, per_page=1000, search=None):
+    """Yield one pyarrow.RecordBatch per page"""
+    pyarrow = _require('pyarrow')
+    for batch in iter_column_batches(foreman, resource_type, fields, per_page=per_page, search=search):
+        if schema is not None:
+            yield pyarrow.RecordBatch.from_arrays([pyarrow.array(batch[f.name], type=f.type) for f in schema],
+                                                  schema=schema)
+        else:
+            yield pyarrow.RecordBatch.from_arrays([pyarrow.array(batch[field]) for field in fields], names=fields)
+
+
+def _infer_schema(batches):
+    """Return a schema taking each field's type from the first page where it is not all None"""
+    pyarrow = _require('pyarrow')
+    fields = []
+    for i, field in enumerate(batches[0].schema):
+        types = [batch.schema.field(i).type for batch in batches]
+        known = [field_type for field_type in types if not pyarrow.types.is_null(field_type)]
+        fields.append(pyarrow.field(field.name, known[0] if known else pyarrow.null()))
+    return pyarrow.schema(fields)
+
+
+def _cast(batch, schema):
+    pyarrow = _require('pyarrow')
+    if batch.schema == schema:
+        return batch
+    return pyarrow.RecordBatch.from_arrays(
+        [column.cast(field.type) for column, field in zip(batch.columns, schema)], schema=schema)
+
+
+def _has_null_fields(schema):
+    pyarrow = _require('pyarrow')
+    return any(pyarrow.types.is_null(field.type) for field in schema)
+
+
+def to_arrow(foreman, resource_type, fields, schema=None, per_page=1000, search=None):
+    """Return the selected fields of all resources as a pyarrow.Table
+
+    Args:
+      schema (pyarrow.Schema): Optional schema. If not given, the type of
+          each field is inferred from the first page where it is not None.
+    """
+    pyarrow = _require('pyarrow')
+    batches = list(iter_record_batches(foreman, resource_type, fields, schema=schema,
+                                       per_page=per_page, search=search))
+    if not batches:
+        return pyarrow.Table.from_arrays([pyarrow.array([]) for _ in fields], names=fields)
+    schema = schema or _infer_schema(batches)
+    return pyarrow.Table.from_batches([_cast(batch, schema) for batch in batches], schema=schema)
+
+
+def write_parquet(foreman, resource_type, fields, path, schema=None, per_page=1000, search=None):
+    """Stream the selected fields of all resources into a Parquet file
+
+    Each page is written as soon as it is fetched. Without a schema the
+    type of each field is inferred from the first page where it is not None;
+    pages are held back until every field has a type, so passing a schema
+    keeps memory low for fields that are None in most resources.
+
+    Returns:
+      int: Number of rows written
+    """
+    pyarrow = _require('pyarrow')
+    parquet = _require('pyarrow.parquet', 'pyarrow')
+    writer = None
+    pending = []
+    rows = 0
+
+    def write(batches, schema):
+        for batch in batches:
+            writer.write_table(pyarrow.Table.from_batches([_cast(batch, schema)]))
+
+    try:
+        for batch in iter_record_batches(foreman, resource_type, fields, schema=schema,
+                                         per_page=per_page, search=search):
+            rows += batch.num_rows
+            if writer is None:
+                pending.append(batch)
+                inferred = schema or _infer_schema(pending)
+                if _has_null_fields(inferred):
+                    continue
+                schema = inferred
+                writer = parquet.ParquetWriter(path, schema)
+                write(pending, schema)
+                pending = []
+            else:
+                write([batch], schema)
+        if writer is None and pending:
+            # Fields None in every resource stay of the null type
+            schema = _infer_schema(pending)
+            writer = parquet.ParquetWriter(path, schema)
+            write(pending, schema)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def write_csv(foreman, resource_type, fields, path, per_page=1000, search=None):
+    """Stream the selected fields of all resources into a CSV file
+
+    Returns:
+      int: Number of rows written
+    """
+    rows = 0
+    with open(path, 'w') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(fields)
+        for batch in iter_column_batches(foreman, resource_type, fields, per_page=per_page, search=search):
+            page = list(zip(*[batch[field] for field in fields]))
+            writer.writerows(page)
+            rows += len(page)
+    return rows
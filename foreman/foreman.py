@@ -6,10 +6,12 @@ Created on 04.03.2015
 
 import json
 
-import requests
-
-# from requests.auth import HTTPBasicAuth
-requests.packages.urllib3.disable_warnings()
+from .cache import cache_key
+from .deadline import Deadline
+from .scheduler import SchedulerTimeout
+from .singleflight import SingleFlight, WaitTimeout
+from .streaming import ResultStream
+from .transport import RequestsTransport, TransportTimeout
 
 FOREMAN_REQUEST_HEADERS = {
     'content-type': 'application/json',
@@ -17,6 +19,12 @@ FOREMAN_REQUEST_HEADERS = {
 }
 FOREMAN_API_VERSION = 'v2'
 
+# Seconds to wait for a connection and between two bytes of a response
+DEFAULT_TIMEOUT = (10, 300)
+
+# Bytes read from the socket at a time while streaming responses
+STREAM_CHUNK_SIZE = 64 * 1024
+
 ARCHITECTURES = 'architectures'
 ARCHITECTURE = 'architecture'
 COMMON_PARAMETERS = 'common_parameters'
@@ -63,6 +71,51 @@ TEMPLATE_KINDS = 'template_kinds'
 USERS = 'users'
 USER = 'user'
 
+LIST = 'list'
+GET = 'get'
+SEARCH = 'search'
+CREATE = 'create'
+UPDATE = 'update'
+DELETE = 'delete'
+ALL_OPERATIONS = (LIST, GET, SEARCH, CREATE, UPDATE, DELETE)
+
+# Resource types with generated accessors. Each entry consists of the
+# resource type, the resource name used when posting, the plural and the
+# singular name used in method names and the supported operations.
+# (ARCHITECTURES, ARCHITECTURE, 'architectures', 'architecture', ALL_OPERATIONS)
+# creates get_architectures, get_architecture, search_architecture,
+# create_architecture, update_architecture and delete_architecture.
+RESOURCE_TYPES = (
+    (ARCHITECTURES, ARCHITECTURE, 'architectures', 'architecture', ALL_OPERATIONS),
+    (COMMON_PARAMETERS, COMMON_PARAMETER, 'common_parameters', 'common_parameter', ALL_OPERATIONS),
+    (COMPUTE_PROFILES, COMPUTE_PROFILE, 'compute_profiles', 'compute_profile', ALL_OPERATIONS),
+    (COMPUTE_RESOURCES, COMPUTE_RESOURCE, 'compute_resources', 'compute_resource', ALL_OPERATIONS),
+    (CONFIG_TEMPLATES, CONFIG_TEMPLATE, 'config_templates', 'config_template', ALL_OPERATIONS),
+    (DOMAINS, DOMAIN, 'domains', 'domain', ALL_OPERATIONS),
+    (ENVIRONMENTS, ENVIRONMENT, 'environments', 'environment', ALL_OPERATIONS),
+    (HOSTS, HOST, 'hosts', 'host', ALL_OPERATIONS),
+    (HOSTGROUPS, HOSTGROUP, 'hostgroups', 'hostgroup', ALL_OPERATIONS),
+    (LOCATIONS, LOCATION, 'locations', 'location', ALL_OPERATIONS),
+    (MEDIA, MEDIUM, 'media', 'medium', ALL_OPERATIONS),
+    (OPERATINGSYSTEMS, OPERATINGSYSTEM, 'operatingsystems', 'operatingsystem', ALL_OPERATIONS),
+    (ORGANIZATIONS, ORGANIZATION, 'organizations', 'organization', ALL_OPERATIONS),
+    (PARTITION_TABLES, PARTITION_TABLE, 'partition_tables', 'partition_table', ALL_OPERATIONS),
+    (ROLES, ROLE, 'roles', 'role', ALL_OPERATIONS),
+    (SMART_PROXIES, SMART_PROXY, 'smart_proxies', 'smart_proxy', ALL_OPERATIONS),
+    (SUBNETS, SUBNET, 'subnets', 'subnet', ALL_OPERATIONS),
+    (TEMPLATE_KINDS, None, 'template_kinds', None, (LIST,)),
+    (USERS, USER, 'users', 'user', ALL_OPERATIONS),
+)
+
+
+def _scope(data, organization_id=None, location_id=None):
+    """Add the taxonomy scope parameters of a listing to its request data"""
+    if organization_id is not None:
+        data['organization_id'] = organization_id
+    if location_id is not None:
+        data['location_id'] = location_id
+    return data
+
 
 class ForemanError(Exception):
     """ForemanError Class
@@ -77,6 +130,13 @@ class ForemanError(Exception):
         super(ForemanError, self).__init__()
 
 
+class ForemanTimeoutError(ForemanError):
+    """A request timed out, or was not sent because its deadline passed"""
+
+    def __init__(self, url, message):
+        super(ForemanTimeoutError, self).__init__(url=url, status_code=None, message=message)
+
+
 class Foreman:
     """Foreman Class
 
@@ -84,17 +144,45 @@ class Foreman:
 
     """
 
-    def __init__(self, hostname, port, username, password):
+    def __init__(self, hostname, port, username, password, protocol='https', coalesce_requests=True,
+                 timeout=DEFAULT_TIMEOUT, transport=None, cache=None, scheduler=None):
         """Init
+
+        Args:
+          hostname (str): Foreman host name
+          port (int): Foreman port
+          username (str): API user
+          password (str): Password of the API user
+          protocol (str): URL scheme, either https or http
+          coalesce_requests (bool): Let identical GET requests issued
+              concurrently by several threads share one HTTP request
+          timeout (float or tuple): Seconds to wait for a connection and for
+              data from Foreman, either one value for both or a (connect,
+              read) tuple. None waits forever.
+          transport (Transport): HTTP transport, see foreman.transport.
+              Defaults to a RequestsTransport.
+          cache (DiskCache): Serve GET responses from an on-disk cache
+              shared with other processes, see foreman.cache
+          scheduler (RequestScheduler): Limit concurrent requests per
+              priority class, see foreman.scheduler
         """
         self.__auth = (username, password)
         self.hostname = hostname
         self.port = port
-        self.url = "https://{0}:{1}/api/{2}".format(
+        self.protocol = protocol
+        self.url = "{0}://{1}:{2}/api/{3}".format(
+            self.protocol,
             self.hostname,
             self.port,
             FOREMAN_API_VERSION,
         )
+        self.singleflight = SingleFlight() if coalesce_requests else None
+        if timeout is not None and not isinstance(timeout, tuple):
+            timeout = (timeout, timeout)
+        self.timeout = timeout
+        self.transport = transport if transport is not None else RequestsTransport()
+        self.cache = cache
+        self.scheduler = scheduler
 
     def _get_resource_url(self, resource_type, resource_id=None, component=None, component_id=None):
         """Create API URL path
@@ -144,6 +232,56 @@ class Foreman:
                            status_code=req.status_code,
                            message=error_message)
 
+    def _request_timeout(self, url):
+        """Return the timeout for the next request, limited by the current deadline
+
+        Raises:
+          ForemanTimeoutError: The deadline passed or was cancelled
+        """
+        deadline = Deadline.current()
+        if deadline is None:
+            return self.timeout
+        remaining = deadline.remaining()
+        if deadline.expired():
+            raise ForemanTimeoutError(url=url, message='Deadline exceeded')
+        if remaining is None:
+            return self.timeout
+        if self.timeout is None:
+            return (remaining, remaining)
+        return (min(self.timeout[0], remaining), min(self.timeout[1], remaining))
+
+    def _send(self, method, url, **kwargs):
+        """Send a request with timeouts, raising ForemanTimeoutError if one is hit
+
+        With a scheduler the request first waits for a slot of its priority
+        class. Streamed responses give the slot back once the headers are
+        received.
+        """
+        if self.scheduler is None:
+            return self._transport_request(method, url, **kwargs)
+        # Fails right away if the deadline already passed
+        self._request_timeout(url)
+        deadline = Deadline.current()
+        try:
+            slot = self.scheduler.acquire(timeout=deadline.remaining() if deadline is not None else None)
+        except SchedulerTimeout:
+            raise ForemanTimeoutError(url=url, message='Deadline exceeded')
+        try:
+            return self._transport_request(method, url, **kwargs)
+        finally:
+            self.scheduler.release(slot)
+
+    def _transport_request(self, method, url, **kwargs):
+        timeout = self._request_timeout(url)
+        try:
+            return self.transport.request(method, url, auth=self.__auth, timeout=timeout, **kwargs)
+        except TransportTimeout as e:
+            raise ForemanTimeoutError(url=url, message=str(e))
+
+    def close(self):
+        """Close the connections of the transport"""
+        self.transport.close()
+
     def _get_request(self, url, data=None):
         """Execute a GET request agains Foreman API
 
@@ -155,12 +293,90 @@ class Foreman:
         Returns:
           Dict
         """
-        req = requests.get(url=url,
-                           data=data,
-                           auth=self.__auth,
-                           verify=False)
+        if self.cache is None:
+            return self._coalesced_get_request(url=url, data=data)
+        key = cache_key(self.__auth[0], url, data)
+        result = self.cache.get(key)
+        if result is None:
+            result = self._coalesced_get_request(url=url, data=data)
+            self.cache.set(key, self._url_resource_type(url), result)
+        return result
+
+    def _coalesced_get_request(self, url, data=None):
+        if self.singleflight is None:
+            return self._do_get_request(url=url, data=data)
+        key = (url, json.dumps(data, sort_keys=True))
+        deadline = Deadline.current()
+        # Waiting for an identical request must not outlast our own deadline
+        wait = deadline.remaining() if deadline is not None else None
+        try:
+            return self.singleflight.do(key, lambda: self._do_get_request(url=url, data=data), timeout=wait)
+        except WaitTimeout:
+            raise ForemanTimeoutError(url=url, message='Deadline exceeded')
+
+    def _url_resource_type(self, url):
+        return url[len(self.url) + 1:].split('/', 1)[0]
+
+    def _invalidate(self, url):
+        """Drop cached responses of the resource type a write went to
+
+        Called after failed writes too, a write that timed out may still have
+        been applied.
+        """
+        if self.cache is not None:
+            self.cache.invalidate(self._url_resource_type(url))
+
+    def _do_get_request(self, url, data=None):
+        req = self._send('get', url=url, params=data)
         return self._handle_request(req)
 
+    def get_request_stats(self):
+        """Return counters of the GET requests sent and saved by coalescing
+
+        Returns:
+          dict with the number of GET requests sent ('calls') and the number
+          of requests answered by an identical request in flight ('coalesced')
+        """
+        if self.singleflight is None:
+            return {}
+        return self.singleflight.stats()
+
+    def _stream_request(self, url, data=None, with_text=False):
+        """Execute a GET request and decode its results array incrementally
+
+        The request is sent immediately, so errors are raised by this call.
+        Items are decoded while iterating over the returned stream.
+
+        Args:
+          url (str): URL of a collection
+          data (dict): Dictionary to specify detailed data
+          with_text (bool): Yield (dict, JSON text) pairs, see ResultStream
+        Returns:
+          ResultStream
+        """
+        req = self._send('get', url=url, params=data, stream=True)
+        if req.status_code != 200:
+            try:
+                self._handle_request(req)
+            finally:
+                req.close()
+        # Taken now, the stream may be consumed after the deadline's block was left
+        return ResultStream(self._iter_content(req, Deadline.current()), close=req.close, with_text=with_text)
+
+    def _iter_content(self, req, deadline):
+        """Yield the body of a streamed response, stopping at the deadline it was requested in"""
+        chunks = req.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+        while True:
+            if deadline is not None and deadline.expired():
+                raise ForemanTimeoutError(url=req.url, message='Deadline exceeded')
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+            except TransportTimeout as e:
+                raise ForemanTimeoutError(url=req.url, message=str(e))
+            yield chunk
+
     def _post_request(self, url, data):
         """Execute a POST request against Foreman API
 
@@ -171,12 +387,11 @@ class Foreman:
         Returns:
           Dict
         """
-        req = requests.post(url=url,
-                            data=json.dumps(data),
-                            headers=FOREMAN_REQUEST_HEADERS,
-                            auth=self.__auth,
-                            verify=False)
-        return self._handle_request(req)
+        try:
+            req = self._send('post', url=url, body=json.dumps(data), headers=FOREMAN_REQUEST_HEADERS)
+            return self._handle_request(req)
+        finally:
+            self._invalidate(url)
 
     def _put_request(self, url, data):
         """Execute a PUT request against Foreman API
@@ -188,12 +403,11 @@ class Foreman:
         Returns:
           Dict
         """
-        req = requests.put(url=url,
-                           data=json.dumps(data),
-                           headers=FOREMAN_REQUEST_HEADERS,
-                           auth=self.__auth,
-                           verify=False)
-        return self._handle_request(req)
+        try:
+            req = self._send('put', url=url, body=json.dumps(data), headers=FOREMAN_REQUEST_HEADERS)
+            return self._handle_request(req)
+        finally:
+            self._invalidate(url)
 
     def _delete_request(self, url):
         """Execute a DELETE request against Foreman API
@@ -204,13 +418,14 @@ class Foreman:
         Returns:
           Dict
         """
-        req = requests.delete(url=url,
-                              headers=FOREMAN_REQUEST_HEADERS,
-                              auth=self.__auth,
-                              verify=False)
-        return self._handle_request(req)
-
-    def get_resources(self, resource_type, resource_id=None, component=None):
+        try:
+            req = self._send('delete', url=url, headers=FOREMAN_REQUEST_HEADERS)
+            return self._handle_request(req)
+        finally:
+            self._invalidate(url)
+
+    def get_resources(self, resource_type, resource_id=None, component=None, stream=False,
+                      organization_id=None, location_id=None, with_text=False):
         """ Return a list of all resources of the defined resource type
 
         Args:
@@ -218,16 +433,85 @@ class Foreman:
            resource_id (str): Resource identified
            component (str): Component name to request
            component_id (int): Component id to request
+           stream (bool): Return an iterator decoding the resources one by
+               one while the response is received instead of a list
+           organization_id (int): Only return resources of this organization
+           location_id (int): Only return resources of this location
+           with_text (bool): With stream, yield (dict, JSON text) pairs
         Returns:
            list of dict
         """
         url = self._get_resource_url(resource_type=resource_type,
                                      resource_id=resource_id,
                                      component=component)
-        request_result = self._get_request(url=url,
-                                           data={'page': '1', 'per_page': 99999})
+        data = _scope({'page': '1', 'per_page': 99999}, organization_id, location_id)
+        if stream:
+            return iter(self._stream_request(url=url, data=data, with_text=with_text))
+        request_result = self._get_request(url=url, data=data)
         return request_result.get('results')
 
+    def count_resources(self, resource_type, search=None, organization_id=None, location_id=None):
+        """ Return the number of resources of a resource type
+
+        Args:
+           resource_type: Type of resources to count
+           search (str): Optional search query
+           organization_id (int): Only count resources of this organization
+           location_id (int): Only count resources of this location
+        Returns:
+           int
+        """
+        data = _scope({'page': '1', 'per_page': 1}, organization_id, location_id)
+        if search:
+            data['search'] = search
+        request_result = self._get_request(url=self._get_resource_url(resource_type=resource_type), data=data)
+        return request_result.get('subtotal', request_result.get('total'))
+
+    def iter_resources(self, resource_type, resource_id=None, component=None, per_page=1000, search=None,
+                       stream=False, organization_id=None, location_id=None):
+        """ Iterate over all resources of a resource type page by page
+
+        Only one page of results is held in memory at a time.
+
+        Args:
+           resource_type: Type of resources to get
+           resource_id (str): Resource identified
+           component (str): Component name to request
+           per_page (int): Number of resources fetched per request
+           search (str): Optional search query
+           stream (bool): Decode each page incrementally so only one
+               resource at a time is held in memory
+           organization_id (int): Only return resources of this organization
+           location_id (int): Only return resources of this location
+        Returns:
+           generator of dict
+        """
+        url = self._get_resource_url(resource_type=resource_type,
+                                     resource_id=resource_id,
+                                     component=component)
+        page = 1
+        seen = 0
+        while True:
+            data = _scope({'page': str(page), 'per_page': per_page}, organization_id, location_id)
+            if search:
+                data['search'] = search
+            if stream:
+                results = self._stream_request(url=url, data=data)
+                for item in results:
+                    yield item
+                count = results.count
+                request_result = results.meta
+            else:
+                request_result = self._get_request(url=url, data=data)
+                for item in request_result.get('results') or []:
+                    yield item
+                count = len(request_result.get('results') or [])
+            seen += count
+            total = request_result.get('subtotal', request_result.get('total'))
+            if count < per_page or (total is not None and seen >= total):
+                return
+            page += 1
+
     def get_resource(self, resource_type, resource_id, component=None, component_id=None):
         """ Get information about a resource
 
@@ -298,8 +582,21 @@ class Foreman:
                                      component=component, component_id=component_id)
         return self._delete_request(url=url)
 
-    def search_resource(self, resource_type, data):
-        search_data = {'search': ''}
+    def search_resource(self, resource_type, data, stream=False, organization_id=None, location_id=None):
+        """ Search resources by exact values of their attributes
+
+        Args:
+           resource_type (str): Resource type
+           data (dict): Attribute names and values, joined with AND
+           stream (bool): Return an iterator decoding the results one by one
+               while the response is received
+           organization_id (int): Only search resources of this organization
+           location_id (int): Only search resources of this location
+        Returns:
+           dict if exactly one resource matched, list of dict otherwise. An
+           iterator of dict if stream is set.
+        """
+        search_data = _scope({'search': ''}, organization_id, location_id)
 
         for key in data:
             if search_data['search']:
@@ -312,6 +609,8 @@ class Foreman:
                 search_data['search'] += ('"' + data[key] + '"')
 
         url = self._get_resource_url(resource_type=resource_type)
+        if stream:
+            return iter(self._stream_request(url=url, data=search_data))
         results = self._get_request(url=url, data=search_data)
         result = results.get('results')
 
@@ -320,38 +619,6 @@ class Foreman:
 
         return result
 
-    def get_architectures(self):
-        return self.get_resources(resource_type=ARCHITECTURES)
-
-    def get_architecture(self, id):
-        return self.get_resource(resource_type=ARCHITECTURES, resource_id=id)
-
-    def search_architecture(self, data):
-        return self.search_resource(resource_type=ARCHITECTURES, data=data)
-
-    def create_architecture(self, data):
-        return self.create_resource(resource_type=ARCHITECTURES, resource=ARCHITECTURE, data=data)
-
-    def delete_architecture(self, id):
-        return self.delete_resource(resource_type=ARCHITECTURES, resource_id=id)
-
-    def get_common_parameters(self):
-        return self.get_resources(resource_type=COMMON_PARAMETERS)
-
-    def get_common_parameter(self, id):
-        return self.get_resource(resource_type=COMMON_PARAMETERS, resource_id=id)
-
-    def search_common_parameter(self, data):
-        return self.search_resource(resource_type=COMMON_PARAMETERS, data=data)
-
-    def create_common_parameter(self, data):
-        return self.create_resource(resource_type=COMMON_PARAMETERS,
-                                    resource=COMMON_PARAMETER,
-                                    data=data)
-
-    def delete_common_parameter(self, id):
-        return self.delete_resource(resource_type=COMMON_PARAMETERS, resource_id=id)
-
     def get_compute_attribute(self, compute_resource_id, compute_profile_id):
         """
         Return the compute attributes of a compute profile assigned to a compute resource.
@@ -385,113 +652,11 @@ class Foreman:
                                     resource_id=id,
                                     data={'vm_attrs': data})
 
-    def get_compute_profiles(self):
-        return self.get_resources(resource_type=COMPUTE_PROFILES)
-
-    def get_compute_profile(self, id):
-        return self.get_resource(resource_type=COMPUTE_PROFILES, resource_id=id)
-
-    def search_compute_profile(self, data):
-        return self.search_resource(resource_type=COMPUTE_PROFILES, data=data)
-
-    def create_compute_profile(self, data):
-        return self.create_resource(resource_type=COMPUTE_PROFILES,
-                                    resource=COMPUTE_PROFILE,
-                                    data=data)
-
-    def delete_compute_profile(self, id):
-        return self.delete_resource(resource_type=COMPUTE_PROFILES, resource_id=id)
-
-    def get_compute_resources(self):
-        return self.get_resources(resource_type=COMPUTE_RESOURCES)
-
-    def get_compute_resource(self, id):
-        return self.get_resource(resource_type=COMPUTE_RESOURCES, resource_id=id)
-
-    def search_compute_resource(self, data):
-        return self.search_resource(resource_type=COMPUTE_RESOURCES, data=data)
-
-    def create_compute_resource(self, data):
-        return self.create_resource(resource_type=COMPUTE_RESOURCES,
-                                    resource=COMPUTE_RESOURCE,
-                                    data=data)
-
-    def delete_compute_resource(self, id):
-        return self.delete_resource(resource_type=COMPUTE_RESOURCES, resource_id=id)
-
     def get_compute_resource_images(self, compute_resource_id):
         return self.get_resources(resource_type=COMPUTE_RESOURCES,
                                   resource_id=compute_resource_id,
                                   component=IMAGES)
 
-    def get_config_templates(self):
-        return self.get_resources(resource_type=CONFIG_TEMPLATES)
-
-    def get_config_template(self, id):
-        return self.get_resource(resource_type=CONFIG_TEMPLATES, resource_id=id)
-
-    def search_config_template(self, data):
-        return self.search_resource(resource_type=CONFIG_TEMPLATES, data=data)
-
-    def create_config_template(self, data):
-        return self.create_resource(resource_type=CONFIG_TEMPLATES,
-                                    resource=CONFIG_TEMPLATE,
-                                    data=data)
-
-    def update_config_template(self, id, data):
-        return self.update_resource(resource_type=CONFIG_TEMPLATES, resource_id=id, data=data)
-
-    def delete_config_template(self, id):
-        return self.delete_resource(resource_type=CONFIG_TEMPLATES, resource_id=id)
-
-    def get_domains(self):
-        return self.get_resources(resource_type=DOMAINS)
-
-    def get_domain(self, id):
-        return self.get_resource(resource_type=DOMAINS, resource_id=id)
-
-    def search_domain(self, data):
-        return self.search_resource(resource_type=DOMAINS, data=data)
-
-    def create_domain(self, data):
-        return self.create_resource(resource_type=DOMAINS, resource=DOMAIN, data=data)
-
-    def update_domain(self, id, data):
-        return self.update_resource(resource_type=DOMAINS, resource_id=id, data=data)
-
-    def delete_domain(self, id):
-        return self.delete_resource(resource_type=DOMAINS, resource_id=id)
-
-    def get_environments(self):
-        return self.get_resources(resource_type=ENVIRONMENTS)
-
-    def get_environment(self, id):
-        return self.get_resource(resource_type=ENVIRONMENTS, resource_id=id)
-
-    def search_environment(self, data):
-        return self.search_resource(resource_type=ENVIRONMENTS, data=data)
-
-    def create_environment(self, data):
-        return self.create_resource(resource_type=ENVIRONMENTS, resource=ENVIRONMENT, data=data)
-
-    def delete_environment(self, id):
-        return self.delete_resource(resource_type=ENVIRONMENTS, resource_id=id)
-
-    def get_hosts(self):
-        return self.get_resources(resource_type=HOSTS)
-
-    def get_host(self, id):
-        return self.get_resource(resource_type=HOSTS, resource_id=id)
-
-    def search_host(self, data):
-        return self.search_resource(resource_type=HOSTS, data=data)
-
-    def create_host(self, data):
-        return self.create_resource(resource_type=HOSTS, resource=HOST, data=data)
-
-    def delete_host(self, id):
-        return self.delete_resource(resource_type=HOSTS, resource_id=id)
-
     def set_host_power(self, host_id, action):
         return self.update_resource(resource_type=HOSTS,
                                     resource_id=host_id,
@@ -510,15 +675,6 @@ class Foreman:
     def reboot_host(self, host_id):
         return self.set_host_power(host_id=host_id, action='reboot')
 
-    # def get_host_component(self, name, component, component_id=None):
-    # return self.get_host(name=name, component=component, component_id=component_id)
-
-    # def get_host_interfaces(self, name):
-    # return self.get_host_component(name=name, component='interfaces')
-
-    # def get_host_interface(self, name, interface_id):
-    # return self.get_host_component(name=name, component='interfaces', component_id=interface_id)
-
     def get_host_parameters(self, host_id):
         parameters = self.get_resource(resource_type=HOSTS, resource_id=host_id, component=PARAMETERS)
         if parameters and 'results' in parameters:
@@ -545,90 +701,6 @@ class Foreman:
                                     component=PARAMETERS,
                                     component_id=parameter_id)
 
-    def get_hostgroups(self):
-        return self.get_resources(resource_type=HOSTGROUPS)
-
-    def get_hostgroup(self, id):
-        return self.get_resource(resource_type=HOSTGROUPS, resource_id=id)
-
-    def search_hostgroup(self, data):
-        return self.search_resource(resource_type=HOSTGROUPS, data=data)
-
-    def create_hostgroup(self, data):
-        return self.create_resource(resource_type=HOSTGROUPS, resource=HOSTGROUP, data=data)
-
-    def update_hostgroup(self, id, data):
-        return self.update_resource(resource_type=HOSTGROUPS, resource_id=id, data=data)
-
-    def delete_hostgroup(self, id):
-        return self.delete_resource(resource_type=HOSTGROUPS, resource_id=id)
-
-    def get_locations(self):
-        return self.get_resources(resource_type=LOCATIONS)
-
-    def get_location(self, id):
-        return self.get_resource(resource_type=LOCATIONS, resource_id=id)
-
-    def search_location(self, data):
-        return self.search_resource(resource_type=LOCATIONS, data=data)
-
-    def create_location(self, data):
-        return self.create_resource(resource_type=LOCATIONS, resource=LOCATION, data=data)
-
-    def delete_location(self, id):
-        return self.delete_resource(resource_type=LOCATIONS, resource_id=id)
-
-    def get_media(self):
-        return self.get_resources(resource_type=MEDIA)
-
-    def get_medium(self, id):
-        return self.get_resource(resource_type=MEDIA, resource_id=id)
-
-    def search_medium(self, data):
-        return self.search_resource(resource_type=MEDIA, data=data)
-
-    def create_medium(self, data):
-        return self.create_resource(resource_type=MEDIA, resource=MEDIUM, data=data)
-
-    def delete_medium(self, id):
-        return self.delete_resource(resource_type=MEDIA, resource_id=id)
-
-    def update_medium(self, id, data):
-        return self.update_resource(resource_type=MEDIA, resource_id=id, data=data)
-
-    def get_organizations(self):
-        return self.get_resources(resource_type=ORGANIZATIONS)
-
-    def get_organization(self, id):
-        return self.get_resource(resource_type=ORGANIZATIONS, resource_id=id)
-
-    def search_organization(self, data):
-        return self.search_resource(resource_type=ORGANIZATIONS, data=data)
-
-    def create_organization(self, data):
-        return self.create_resource(resource_type=ORGANIZATIONS, resource=ORGANIZATION, data=data)
-
-    def delete_organization(self, id):
-        return self.delete_resource(resource_type=ORGANIZATIONS, resource_id=id)
-
-    def get_operatingsystems(self):
-        return self.get_resources(resource_type=OPERATINGSYSTEMS)
-
-    def get_operatingsystem(self, id):
-        return self.get_resource(resource_type=OPERATINGSYSTEMS, resource_id=id)
-
-    def search_operatingsystem(self, data):
-        return self.search_resource(resource_type=OPERATINGSYSTEMS, data=data)
-
-    def create_operatingsystem(self, data):
-        return self.create_resource(resource_type=OPERATINGSYSTEMS, resource=OPERATINGSYSTEM, data=data)
-
-    def update_operatingsystem(self, id, data):
-        return self.update_resource(resource_type=OPERATINGSYSTEMS, resource_id=id, data=data)
-
-    def delete_operatingsystem(self, id):
-        return self.delete_resource(resource_type=OPERATINGSYSTEMS, resource_id=id)
-
     def get_operatingsystem_default_templates(self, id):
         return self.get_resources(resource_type=OPERATINGSYSTEMS, resource_id=id, component=OS_DEFAULT_TEMPLATES)
 
@@ -643,98 +715,67 @@ class Foreman:
     def update_operatingsystem_default_template(self, id, template_id, data):
         return self.update_resource(resource_type=OPERATINGSYSTEMS, resource_id=id,
                                     component=OS_DEFAULT_TEMPLATES, component_id=template_id,
-                                    resource=OS_DEFAULT_TEMPLATE, data=data)
+                                    data=data)
 
     def delete_operatingsystem_default_template(self, id, template_id):
         return self.delete_resource(resource_type=OPERATINGSYSTEMS, resource_id=id,
                                     component=OS_DEFAULT_TEMPLATES, component_id=template_id)
 
-    def get_partition_tables(self):
-        return self.get_resources(resource_type=PARTITION_TABLES)
-
-    def get_partition_table(self, id):
-        return self.get_resource(resource_type=PARTITION_TABLES, resource_id=id)
-
-    def search_partition_table(self, data):
-        return self.search_resource(resource_type=PARTITION_TABLES, data=data)
-
-    def create_partition_table(self, data):
-        return self.create_resource(resource_type=PARTITION_TABLES, resource=PARTITION_TABLE, data=data)
-
     def update_parition_table(self, id, data):
-        return self.update_resource(self, resource_type=PARTITION_TABLES, resource_id=id, data=data)
-
-    def delete_partition_table(self, id):
-        return self.delete_resource(resource_type=PARTITION_TABLES, resource_id=id)
-
-    def get_roles(self):
-        return self.get_resources(resource_type=ROLES)
-
-    def get_role(self, id):
-        return self.get_resource(resource_type=ROLES, resource_id=id)
+        """Deprecated misspelled alias of update_partition_table"""
+        return self.update_partition_table(id=id, data=data)
 
-    def search_role(self, data):
-        return self.search_resource(resource_type=ROLES, data=data)
 
-    def create_role(self, data):
-        return self.create_resource(resource_type=ROLES, resource=ROLE, data=data)
+def _resource_methods(resource_type, resource, plural, singular, operations):
+    """Build the accessor methods of one entry of RESOURCE_TYPES
 
-    def delete_role(self, id):
-        return self.delete_resource(resource_type=ROLES, resource_id=id)
-
-    def get_smart_proxies(self):
-        return self.get_resources(resource_type=SMART_PROXIES)
-
-    def get_smart_proxy(self, id):
-        return self.get_resource(resource_type=SMART_PROXIES, resource_id=id)
-
-    def search_smart_proxy(self, data):
-        return self.search_resource(resource_type=SMART_PROXIES, data=data)
-
-    def create_smart_proxy(self, data):
-        return self.create_resource(resource_type=SMART_PROXIES, resource=SMART_PROXY, data=data)
-
-    def update_smart_proxy(self, id, data):
-        return self.update_resource(resource_type=SMART_PROXIES, resource_id=id, data=data)
-
-    def delete_smart_proxy(self, id):
-        return self.delete_resource(resource_type=SMART_PROXIES, resource_id=id)
-
-    def get_subnets(self):
-        return self.get_resources(resource_type=SUBNETS)
-
-    def get_subnet(self, id):
-        return self.get_resource(resource_type=SUBNETS, resource_id=id)
+    Returns:
+      dict of method name to function
+    """
+    methods = {}
 
-    def search_subnet(self, data):
-        return self.search_resource(resource_type=SUBNETS, data=data)
+    def get_all(self, organization_id=None, location_id=None):
+        return self.get_resources(resource_type=resource_type, organization_id=organization_id,
+                                  location_id=location_id)
 
-    def create_subnet(self, data):
-        return self.create_resource(resource_type=SUBNETS, resource=SUBNET, data=data)
+    def get_one(self, id):
+        return self.get_resource(resource_type=resource_type, resource_id=id)
 
-    def update_subnet(self, id, data):
-        return self.update_resource(resource_type=SUBNETS, resource_id=id, data=data)
+    def search(self, data, organization_id=None, location_id=None):
+        return self.search_resource(resource_type=resource_type, data=data, organization_id=organization_id,
+                                    location_id=location_id)
 
-    def delete_subnet(self, id):
-        return self.delete_resource(resource_type=SUBNETS, resource_id=id)
+    def create(self, data):
+        return self.create_resource(resource_type=resource_type, resource=resource, data=data)
 
-    def get_template_kinds(self):
-        return self.get_resources(resource_type=TEMPLATE_KINDS)
+    def update(self, id, data):
+        return self.update_resource(resource_type=resource_type, resource_id=id, data=data)
 
-    def get_users(self):
-        return self.get_resources(resource_type=USERS)
+    def delete(self, id):
+        return self.delete_resource(resource_type=resource_type, resource_id=id)
 
-    def get_user(self, id):
-        return self.get_resource(resource_type=USERS, resource_id=id)
+    for operation, name, function, doc in (
+            (LIST, 'get_' + plural, get_all, 'Return a list of all {0}'),
+            (GET, 'get_' + str(singular), get_one, 'Return one of {0} by id or name'),
+            (SEARCH, 'search_' + str(singular), search, 'Search {0}, see search_resource'),
+            (CREATE, 'create_' + str(singular), create, 'Create one of {0}'),
+            (UPDATE, 'update_' + str(singular), update, 'Update one of {0}'),
+            (DELETE, 'delete_' + str(singular), delete, 'Delete one of {0}')):
+        if operation in operations:
+            function.__name__ = name
+            function.__doc__ = doc.format(plural.replace('_', ' '))
+            methods[name] = function
+    return methods
 
-    def search_user(self, data):
-        return self.search_resource(resource_type=USERS, data=data)
 
-    def create_user(self, data):
-        return self.create_resource(resource_type=USERS, resource=USER, data=data)
+def _add_resource_methods(cls):
+    for entry in RESOURCE_TYPES:
+        for name, function in _resource_methods(*entry).items():
+            # Hand-written methods take precedence
+            if name not in cls.__dict__:
+                if hasattr(function, '__qualname__'):
+                    function.__qualname__ = cls.__name__ + '.' + name
+                setattr(cls, name, function)
 
-    def update_user(self, id, data):
-        return self.update_resource(resource_type=USERS, resource_id=id, data=data)
 
-    def delete_user(self, id):
-        return self.delete_resource(resource_type=USERS, resource_id=id)
+_add_resource_methods(Foreman)
@@ -0,0 +1,223 @@
+"""
+In-memory hostgroup hierarchy
+
+Resolving the effective settings of a host needs its whole hostgroup chain.
+:class:`HostgroupTree` loads all hostgroups with one paginated listing and
+answers ancestor, descendant and title lookups locally. Inherited
+attributes and parameters are computed locally too, so rendering many hosts
+no longer costs one ``get_hostgroup`` per ancestor per host::
+
+    tree = HostgroupTree.load(foreman, parameters=True)
+    for host in foreman.get_hosts():
+        attributes = tree.host_attributes(host)
+        parameters = tree.effective_parameters(host['hostgroup_id'])
+"""
+
+from .foreman import HOSTGROUPS, PARAMETERS
+
+# Attributes a hostgroup inherits from its parent if it does not set them.
+# Each one is stored as <attribute>_id and <attribute>_name.
+INHERITED_ATTRIBUTES = (
+    'architecture',
+    'compute_profile',
+    'domain',
+    'environment',
+    'medium',
+    'operatingsystem',
+    'ptable',
+    'puppet_ca_proxy',
+    'puppet_proxy',
+    'realm',
+    'subnet',
+)
+
+
+def _parameters(parameters):
+    return dict((parameter.get('name'), parameter.get('value')) for parameter in parameters or [])
+
+
+class HostgroupTree(object):
+    """Index of all hostgroups and their hierarchy
+
+    Args:
+      hostgroups (list): Hostgroup dicts as returned by get_hostgroups
+      parameters (dict): Optional parameters per hostgroup id, each a list
+          of dicts with name and value. Parameters included in the hostgroup
+          dicts are used otherwise.
+    """
+
+    def __init__(self, hostgroups, parameters=None):
+        self.by_id = {}
+        self.by_title = {}
+        self.children = {}
+        self._parameters = {}
+        self._attributes_cache = {}
+        self._parameters_cache = {}
+        for hostgroup in hostgroups:
+            self.by_id[hostgroup['id']] = hostgroup
+            self.by_title[hostgroup.get('title') or hostgroup.get('name')] = hostgroup
+            self._parameters[hostgroup['id']] = _parameters(
+                (parameters or {}).get(hostgroup['id'], hostgroup.get('parameters')))
+        for hostgroup in hostgroups:
+            self.children.setdefault(self._parent_id(hostgroup), []).append(hostgroup['id'])
+
+    @classmethod
+    def load(cls, foreman, parameters=False, per_page=1000):
+        """Build the tree from one paginated hostgroup listing
+
+        Args:
+          foreman (Foreman): Client to fetch hostgroups with
+          parameters (bool): Also fetch the parameters of each hostgroup, one
+              request per hostgroup. Not needed if the listing already
+              includes them.
+          per_page (int): Page size of the listing
+        """
+        hostgroups = list(foreman.iter_resources(resource_type=HOSTGROUPS, per_page=per_page))
+        group_parameters = None
+        if parameters:
+            group_parameters = {}
+            for hostgroup in hostgroups:
+                if 'parameters' in hostgroup:
+                    continue
+                group_parameters[hostgroup['id']] = foreman.get_resources(
+                    resource_type=HOSTGROUPS, resource_id=hostgroup['id'], component=PARAMETERS)
+        return cls(hostgroups, parameters=group_parameters)
+
+    def _parent_id(self, hostgroup):
+        if hostgroup.get('parent_id') is not None:
+            return hostgroup['parent_id']
+        ancestry = hostgroup.get('ancestry')
+        if ancestry:
+            return int(str(ancestry).split('/')[-1])
+        return None
+
+    def _id(self, hostgroup):
+        """Accept a hostgroup as id, title or dict"""
+        if isinstance(hostgroup, dict):
+            return hostgroup['id']
+        if hostgroup in self.by_id:
+            return hostgroup
+        if hostgroup in self.by_title:
+            return self.by_title[hostgroup]['id']
+        raise KeyError('Unknown hostgroup {0!r}'.format(hostgroup))
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def __contains__(self, hostgroup):
+        try:
+            self._id(hostgroup)
+        except KeyError:
+            return False
+        return True
+
+    def get(self, hostgroup):
+        """Return the hostgroup dict by id or title"""
+        return self.by_id[self._id(hostgroup)]
+
+    def find(self, title):
+        """Return the hostgroup with a title path like 'base/web', None if unknown"""
+        return self.by_title.get(title)
+
+    def parent(self, hostgroup):
+        parent_id = self._parent_id(self.get(hostgroup))
+        return self.by_id.get(parent_id) if parent_id is not None else None
+
+    def roots(self):
+        return [self.by_id[hostgroup_id] for hostgroup_id in self.children.get(None, [])]
+
+    def ancestors(self, hostgroup):
+        """Return the ancestors of a hostgroup, the root first"""
+        chain = []
+        parent = self.parent(hostgroup)
+        while parent is not None:
+            chain.append(parent)
+            parent = self.parent(parent['id'])
+        chain.reverse()
+        return chain
+
+    def chain(self, hostgroup):
+        """Return the ancestors followed by the hostgroup itself"""
+        return self.ancestors(hostgroup) + [self.get(hostgroup)]
+
+    def descendants(self, hostgroup):
+        """Return all hostgroups below a hostgroup, depth first"""
+        result = []
+        stack = list(reversed(self.children.get(self._id(hostgroup), [])))
+        while stack:
+            hostgroup_id = stack.pop()
+            result.append(self.by_id[hostgroup_id])
+            stack.extend(reversed(self.children.get(hostgroup_id, [])))
+        return result
+
+    def path(self, hostgroup):
+        """Return the title path built from the names of the chain"""
+        return '/'.join(group.get('name') for group in self.chain(hostgroup))
+
+    def effective_attributes(self, hostgroup):
+        """Return the inheritable attributes of a hostgroup after inheritance
+
+        Returns:
+          dict with <attribute>_id and <attribute>_name for each of
+          INHERITED_ATTRIBUTES
+        """
+        hostgroup_id = self._id(hostgroup)
+        cached = self._attributes_cache.get(hostgroup_id)
+        if cached is not None:
+            return dict(cached)
+        group = self.by_id[hostgroup_id]
+        parent = self.parent(hostgroup_id)
+        inherited = self.effective_attributes(parent['id']) if parent else {}
+        attributes = {}
+        for attribute in INHERITED_ATTRIBUTES:
+            id_key = attribute + '_id'
+            name_key = attribute + '_name'
+            if group.get(id_key) is not None:
+                attributes[id_key] = group.get(id_key)
+                attributes[name_key] = group.get(name_key)
+            else:
+                attributes[id_key] = inherited.get(id_key)
+                attributes[name_key] = inherited.get(name_key)
+        self._attributes_cache[hostgroup_id] = attributes
+        return dict(attributes)
+
+    def effective_parameters(self, hostgroup):
+        """Return the parameters of a hostgroup merged with its ancestors'
+
+        Returns:
+          dict of parameter name to value, the nearest hostgroup wins
+        """
+        hostgroup_id = self._id(hostgroup)
+        cached = self._parameters_cache.get(hostgroup_id)
+        if cached is None:
+            parent = self.parent(hostgroup_id)
+            cached = self.effective_parameters(parent['id']) if parent else {}
+            cached.update(self._parameters.get(hostgroup_id, {}))
+            self._parameters_cache[hostgroup_id] = cached
+        return dict(cached)
+
+    def host_attributes(self, host):
+        """Return the attributes of a host, unset ones taken from its hostgroups"""
+        if host.get('hostgroup_id') is None:
+            attributes = {}
+        else:
+            attributes = self.effective_attributes(host['hostgroup_id'])
+        for attribute in INHERITED_ATTRIBUTES:
+            for key in (attribute + '_id', attribute + '_name'):
+                if host.get(attribute + '_id') is not None:
+                    attributes[key] = host.get(key)
+        return attributes
+
+    def host_parameters(self, host, host_parameters=None):
+        """Return the hostgroup parameters of a host overridden by its own
+
+        Args:
+          host (dict): Host dict
+          host_parameters (list): Parameters of the host, taken from the host
+              dict if not given
+        """
+        parameters = {}
+        if host.get('hostgroup_id') is not None:
+            parameters = self.effective_parameters(host['hostgroup_id'])
+        parameters.update(_parameters(host_parameters if host_parameters is not None else host.get('parameters')))
+        return parameters
@@ -0,0 +1,138 @@
+"""
+Image catalog across all compute resources
+
+Foreman lists images per compute resource only. :class:`ImageCatalog` fetches
+the images of all compute resources concurrently and merges them into one
+index, cached for ``ttl`` seconds::
+
+    catalog = ImageCatalog(foreman, max_workers=8, ttl=300)
+    image = catalog.find('vsphere-dc1', 'centos-7')
+    for compute_resource, image in catalog.images():
+        print(compute_resource['name'], image['name'])
+    catalog.refresh()
+
+Concurrent callers finding the catalog expired share one refresh. If the
+images of a compute resource cannot be fetched, the images of the previous
+refresh are kept for it and the error is recorded in ``errors``.
+"""
+
+import threading
+import time
+from concurrent import futures
+
+from .deadline import propagate
+from .foreman import COMPUTE_RESOURCES, ForemanError
+from .singleflight import SingleFlight
+
+
+class ImageCatalog(object):
+    """Images of all compute resources, fetched concurrently and cached
+
+    Args:
+      foreman (Foreman): Client used to talk to Foreman
+      max_workers (int): Maximum number of compute resources queried at once
+      ttl (float): Seconds the catalog is served before it is fetched
+          again, None to keep it until refresh is called
+    """
+
+    def __init__(self, foreman, max_workers=8, ttl=300):
+        self.foreman = foreman
+        self.max_workers = max_workers
+        self.ttl = ttl
+        self.compute_resources = {}
+        self.errors = {}
+        self.refreshed_at = None
+        self._images = {}
+        # compute resource id -> {image name or uuid: image}
+        self._index = {}
+        self._by_name = {}
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+
+    def expired(self):
+        if self.refreshed_at is None:
+            return True
+        return self.ttl is not None and time.time() - self.refreshed_at >= self.ttl
+
+    def _fetch(self, compute_resource):
+        return self.foreman.get_compute_resource_images(compute_resource_id=compute_resource['id'])
+
+    def _refresh(self):
+        compute_resources = self.foreman.get_resources(resource_type=COMPUTE_RESOURCES)
+        images = {}
+        errors = {}
+        executor = futures.ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            pending = dict((executor.submit(propagate(self._fetch), compute_resource), compute_resource)
+                           for compute_resource in compute_resources)
+            for future in futures.as_completed(pending):
+                compute_resource = pending[future]
+                try:
+                    images[compute_resource['id']] = future.result()
+                except ForemanError as e:
+                    errors[compute_resource['id']] = e
+                    if compute_resource['id'] in self._images:
+                        images[compute_resource['id']] = self._images[compute_resource['id']]
+        finally:
+            executor.shutdown(wait=True)
+
+        index = {}
+        for compute_resource_id, items in images.items():
+            entries = index[compute_resource_id] = {}
+            for image in items:
+                for key in ('uuid', 'name'):
+                    if image.get(key) is not None:
+                        entries.setdefault(image[key], image)
+        with self._lock:
+            self.compute_resources = dict((cr['id'], cr) for cr in compute_resources)
+            self._by_name = dict((cr.get('name'), cr['id']) for cr in compute_resources)
+            self._images = images
+            self._index = index
+            self.errors = errors
+            self.refreshed_at = time.time()
+        return len(images)
+
+    def refresh(self):
+        """Fetch the images of all compute resources now
+
+        Returns:
+          Number of compute resources with images in the catalog
+        """
+        return self._flight.do('refresh', self._refresh)
+
+    def _ensure_fresh(self):
+        if self.expired():
+            self.refresh()
+
+    def _compute_resource_id(self, compute_resource):
+        """Accept a compute resource as id, name or dict"""
+        if isinstance(compute_resource, dict):
+            return compute_resource['id']
+        if compute_resource in self.compute_resources:
+            return compute_resource
+        if compute_resource in self._by_name:
+            return self._by_name[compute_resource]
+        raise KeyError('Unknown compute resource {0!r}'.format(compute_resource))
+
+    def find(self, compute_resource, image):
+        """Return an image of a compute resource by name or uuid, None if it is unknown
+
+        Args:
+          compute_resource: Compute resource id, name or dict
+          image (str): Image name or uuid
+        """
+        self._ensure_fresh()
+        with self._lock:
+            compute_resource_id = self._compute_resource_id(compute_resource)
+            return self._index.get(compute_resource_id, {}).get(image)
+
+    def images(self, compute_resource=None):
+        """Return (compute resource, image) tuples of one or all compute resources"""
+        self._ensure_fresh()
+        with self._lock:
+            if compute_resource is not None:
+                ids = [self._compute_resource_id(compute_resource)]
+            else:
+                ids = sorted(self._images)
+            return [(self.compute_resources[cr_id], image)
+                    for cr_id in ids for image in self._images.get(cr_id, [])]
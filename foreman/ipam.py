@@ -0,0 +1,313 @@
+"""
+Local index of subnets and used IP addresses
+
+Checking a requested address before provisioning used to cost a
+``search_host`` per address plus a ``get_subnet`` per network. :class:`IPAM`
+loads all subnets and one paginated host listing instead and answers
+locally::
+
+    ipam = IPAM.load(foreman)
+    subnet = ipam.subnet_for('10.0.3.17')
+    if not ipam.is_free('10.0.3.17'):
+        print(ipam.check('10.0.3.17'))
+    addresses = ipam.next_free('net3', count=5)
+    ipam.refresh()
+
+Subnets are indexed by prefix length and network address, so finding the
+most specific subnet of an address costs one dict lookup per distinct prefix
+length. Used addresses are kept in a dict of address to host name.
+
+Only the primary ``ip`` and ``ip6`` of each host are known, addresses of
+additional interfaces are not part of the host listing.
+"""
+
+import bisect
+import ipaddress
+import threading
+
+from .foreman import HOSTS, SUBNETS, ForemanError
+
+
+def _address(value):
+    """Return value as an ipaddress address object"""
+    if isinstance(value, bytes):
+        value = value.decode('ascii')
+    return ipaddress.ip_address(value)
+
+
+def _network(subnet):
+    """Return the network of a Foreman subnet dict, None if it has none"""
+    network = subnet.get('network')
+    if not network:
+        return None
+    if subnet.get('cidr') is not None:
+        prefix = subnet['cidr']
+    else:
+        prefix = subnet.get('mask') or (128 if ':' in network else 32)
+    text = u'{0}/{1}'.format(network, prefix)
+    return ipaddress.ip_network(text, strict=False)
+
+
+class IPAM(object):
+    """Subnets and used addresses of a Foreman, queried locally
+
+    Args:
+      subnets (list): Subnet dicts as returned by get_subnets
+      hosts (list): Host dicts with id, name, ip and ip6
+    """
+
+    def __init__(self, subnets=(), hosts=()):
+        self.foreman = None
+        self._lock = threading.RLock()
+        self._max_updated_at = None
+        self._load_subnets(subnets)
+        self._load_hosts(hosts)
+
+    @classmethod
+    def load(cls, foreman, per_page=1000):
+        """Build the index from the subnets and one paginated host listing"""
+        ipam = cls()
+        ipam.foreman = foreman
+        ipam.per_page = per_page
+        ipam.refresh(full=True)
+        return ipam
+
+    def _load_subnets(self, subnets):
+        with self._lock:
+            self.subnets = {}
+            self._by_name = {}
+            # (version, prefix length) -> {network address as int: subnet id}
+            self._prefixes = {}
+            self._networks = {}
+            for subnet in subnets:
+                network = _network(subnet)
+                if network is None:
+                    continue
+                self.subnets[subnet['id']] = subnet
+                self._by_name[subnet.get('name')] = subnet['id']
+                self._networks[subnet['id']] = network
+                key = (network.version, network.prefixlen)
+                self._prefixes.setdefault(key, {})[int(network.network_address)] = subnet['id']
+            # Most specific prefixes are tried first
+            self._prefix_order = sorted(self._prefixes, key=lambda key: -key[1])
+
+    def _load_hosts(self, hosts):
+        with self._lock:
+            # address as int -> host name, host id -> addresses as int
+            self.used = {}
+            self._host_addresses = {}
+            self._reserved = {}
+            for host in hosts:
+                self._add_host(host)
+
+    def _add_host(self, host):
+        self._remove_host(host['id'])
+        addresses = []
+        for key in ('ip', 'ip6'):
+            if host.get(key):
+                try:
+                    address = _address(host[key])
+                except ValueError:
+                    continue
+                self.used[(address.version, int(address))] = host.get('name')
+                addresses.append((address.version, int(address)))
+        self._host_addresses[host['id']] = addresses
+        updated_at = host.get('updated_at')
+        if updated_at and (self._max_updated_at is None or updated_at > self._max_updated_at):
+            self._max_updated_at = updated_at
+
+    def _remove_host(self, host_id):
+        for key in self._host_addresses.pop(host_id, ()):
+            if key not in self._reserved:
+                self.used.pop(key, None)
+
+    def refresh(self, full=False):
+        """Update the index from Foreman
+
+        Subnets are always reloaded, there are few of them. Hosts updated
+        since the last refresh are fetched with one search. If the number of
+        hosts differs afterwards hosts were deleted, and all hosts are
+        listed again.
+
+        Returns:
+          Number of hosts fetched
+        """
+        if self.foreman is None:
+            raise ValueError('IPAM was not loaded from a Foreman')
+        subnets = list(self.foreman.iter_resources(resource_type=SUBNETS, per_page=self.per_page))
+        self._load_subnets(subnets)
+        if not full and self._max_updated_at is not None:
+            try:
+                # >= so hosts changed within the same second are not missed
+                changed = list(self.foreman.iter_resources(
+                    resource_type=HOSTS, per_page=self.per_page,
+                    search='updated_at >= "{0}"'.format(self._max_updated_at)))
+                total = self.foreman.count_resources(resource_type=HOSTS)
+            except ForemanError as e:
+                # The search is not supported, server errors are raised
+                if e.status_code not in (400, 422):
+                    raise
+            else:
+                with self._lock:
+                    for host in changed:
+                        self._add_host(host)
+                    if total == len(self._host_addresses):
+                        return len(changed)
+        hosts = list(self.foreman.iter_resources(resource_type=HOSTS, per_page=self.per_page))
+        reserved = dict(self._reserved)
+        with self._lock:
+            self._max_updated_at = None
+            self._load_hosts(hosts)
+            for key, name in reserved.items():
+                self._reserved[key] = name
+                self.used.setdefault(key, name)
+        return len(hosts)
+
+    def _subnet_id(self, subnet):
+        """Accept a subnet as id, name or dict"""
+        if isinstance(subnet, dict):
+            return subnet['id']
+        if subnet in self.subnets:
+            return subnet
+        if subnet in self._by_name:
+            return self._by_name[subnet]
+        raise KeyError('Unknown subnet {0!r}'.format(subnet))
+
+    def subnet_for(self, ip):
+        """Return the most specific subnet containing an address, None if there is none"""
+        address = _address(ip)
+        value = int(address)
+        for version, prefixlen in self._prefix_order:
+            if version != address.version:
+                continue
+            bits = 32 if version == 4 else 128
+            network = value >> (bits - prefixlen) << (bits - prefixlen)
+            subnet_id = self._prefixes[(version, prefixlen)].get(network)
+            if subnet_id is not None:
+                return self.subnets[subnet_id]
+        return None
+
+    def used_by(self, ip):
+        """Return the name of the host using an address, None if it is unused"""
+        address = _address(ip)
+        return self.used.get((address.version, int(address)))
+
+    def is_used(self, ip):
+        address = _address(ip)
+        return (address.version, int(address)) in self.used
+
+    def _range(self, subnet_id):
+        """Return the first and last assignable address of a subnet as ints"""
+        network = self._networks[subnet_id]
+        subnet = self.subnets[subnet_id]
+        first = int(network.network_address)
+        last = int(network.broadcast_address)
+        if network.num_addresses > 2:
+            first += 1
+            if network.version == 4:
+                last -= 1
+        if subnet.get('from'):
+            first = max(first, int(_address(subnet['from'])))
+        if subnet.get('to'):
+            last = min(last, int(_address(subnet['to'])))
+        return first, last
+
+    def _excluded(self, subnet_id):
+        subnet = self.subnets[subnet_id]
+        excluded = set()
+        for key in ('gateway', 'dns_primary', 'dns_secondary'):
+            if subnet.get(key):
+                try:
+                    excluded.add(int(_address(subnet[key])))
+                except ValueError:
+                    pass
+        return excluded
+
+    def check(self, ip, subnet=None):
+        """Return why an address cannot be assigned, None if it is free
+
+        Args:
+          ip (str): Address to check
+          subnet: Subnet id, name or dict the address has to be in. Any known
+              subnet is accepted if not given.
+        """
+        address = _address(ip)
+        key = (address.version, int(address))
+        containing = self.subnet_for(ip)
+        if containing is None:
+            return '{0} is not in any subnet'.format(ip)
+        if subnet is not None:
+            subnet_id = self._subnet_id(subnet)
+            if not _address(ip) in self._networks[subnet_id]:
+                return '{0} is not in subnet {1}'.format(ip, self.subnets[subnet_id].get('name'))
+        else:
+            subnet_id = containing['id']
+        first, last = self._range(subnet_id)
+        if not first <= key[1] <= last:
+            return '{0} is outside the assignable range of subnet {1}'.format(ip, self.subnets[subnet_id].get('name'))
+        if key[1] in self._excluded(subnet_id):
+            return '{0} is a gateway or DNS server of subnet {1}'.format(ip, self.subnets[subnet_id].get('name'))
+        if key in self.used:
+            return '{0} is used by {1}'.format(ip, self.used[key])
+        return None
+
+    def is_free(self, ip, subnet=None):
+        return self.check(ip, subnet=subnet) is None
+
+    def next_free(self, subnet, count=1, start=None):
+        """Return the next free addresses of a subnet
+
+        Args:
+          subnet: Subnet id, name or dict
+          count (int): Number of addresses wanted
+          start (str): Address to start searching at, the beginning of the
+              assignable range by default
+        Returns:
+          list of at most count addresses as strings
+        """
+        subnet_id = self._subnet_id(subnet)
+        version = self._networks[subnet_id].version
+        # ip_address would take IPv6 addresses below 2**32 for IPv4 ones
+        address_class = ipaddress.IPv4Address if version == 4 else ipaddress.IPv6Address
+        first, last = self._range(subnet_id)
+        if start is not None:
+            first = max(first, int(_address(start)))
+        with self._lock:
+            taken = set(value for used_version, value in self.used
+                        if used_version == version and first <= value <= last)
+        taken.update(value for value in self._excluded(subnet_id) if first <= value <= last)
+        taken = sorted(taken)
+        # Jump over runs of taken addresses, so the walk is bounded by count
+        # and the taken addresses instead of the size of the range
+        result = []
+        value = first
+        index = bisect.bisect_left(taken, value)
+        while value <= last and len(result) < count:
+            if index < len(taken) and taken[index] == value:
+                index += 1
+            else:
+                result.append(str(address_class(value)))
+            value += 1
+        return result
+
+    def reserve(self, ip, name):
+        """Mark an address as used, e.g. for a host about to be created
+
+        Reservations survive refreshes until they are released.
+        """
+        address = _address(ip)
+        key = (address.version, int(address))
+        with self._lock:
+            if key in self.used and self._reserved.get(key) != name:
+                raise ValueError('{0} is used by {1}'.format(ip, self.used[key]))
+            self._reserved[key] = name
+            self.used[key] = name
+
+    def release(self, ip):
+        """Forget a reservation made with reserve"""
+        address = _address(ip)
+        key = (address.version, int(address))
+        with self._lock:
+            if self._reserved.pop(key, None) is not None:
+                if not any(key in addresses for addresses in self._host_addresses.values()):
+                    self.used.pop(key, None)
@@ -0,0 +1,290 @@
+"""
+Local SQLite mirror of the Foreman inventory
+
+Questions like "all hosts in hostgroup X on subnet Y with OS Z" are answered
+from an indexed SQLite database instead of a ``search_host`` call or a full
+``get_hosts()`` pulled into Python. The API is only used to refresh the
+mirror and for writes::
+
+    mirror = ForemanMirror(foreman, '/var/cache/foreman/inventory.db')
+    mirror.sync()
+    hosts = mirror.find(HOSTS, hostgroup='base/web', subnet='dmz', operatingsystem='CentOS 7')
+
+Refreshes are incremental: only resources updated since the last sync are
+fetched. Deleted resources are detected by comparing the number of
+resources on both sides, in which case the ids are reconciled with a full
+listing.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+
+from .foreman import LIST, RESOURCE_TYPES, ForemanError
+
+# Columns extracted from the resource JSON, each one gets an index
+INDEXED_COLUMNS = (
+    'name',
+    'title',
+    'hostgroup_id',
+    'hostgroup_name',
+    'hostgroup_title',
+    'domain_id',
+    'domain_name',
+    'subnet_id',
+    'subnet_name',
+    'operatingsystem_id',
+    'operatingsystem_name',
+    'environment_id',
+    'environment_name',
+)
+
+# Filter names accepted by find() and the columns they match. An integer
+# value is matched against the id column, anything else against the names.
+FILTERS = {
+    'hostgroup': ('hostgroup_id', ('hostgroup_name', 'hostgroup_title')),
+    'domain': ('domain_id', ('domain_name',)),
+    'subnet': ('subnet_id', ('subnet_name',)),
+    'operatingsystem': ('operatingsystem_id', ('operatingsystem_name',)),
+    'environment': ('environment_id', ('environment_name',)),
+    'name': ('id', ('name', 'title')),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS resources (
+    resource_type TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    {columns},
+    updated_at TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (resource_type, id)
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    resource_type TEXT PRIMARY KEY,
+    synced_at REAL,
+    max_updated_at TEXT
+);
+""".format(columns=',\n    '.join('{0} {1}'.format(column, 'INTEGER' if column.endswith('_id') else 'TEXT')
+                                  for column in INDEXED_COLUMNS))
+
+MIRRORED_TYPES = tuple(entry[0] for entry in RESOURCE_TYPES if LIST in entry[4])
+
+# Ids bound per query, below the limit of 999 variables of older SQLite builds
+MAX_VARIABLES = 900
+
+
+class ForemanMirror(object):
+    """Mirror Foreman resources into SQLite
+
+    Args:
+      foreman (Foreman): Client used to refresh the mirror
+      path (str): SQLite database file, ':memory:' keeps it in memory
+      resource_types (list): Resource types to mirror, defaults to all
+          listable types
+      per_page (int): Page size used while syncing
+    """
+
+    def __init__(self, foreman, path=':memory:', resource_types=MIRRORED_TYPES, per_page=1000):
+        self.foreman = foreman
+        self.path = path
+        self.resource_types = tuple(resource_types)
+        self.per_page = per_page
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        if path != ':memory:':
+            # Lets other processes read while the mirror is being synced
+            self._db.execute('PRAGMA journal_mode=WAL')
+        with self._db:
+            self._db.executescript(SCHEMA)
+            for column in INDEXED_COLUMNS + ('updated_at',):
+                self._db.execute('CREATE INDEX IF NOT EXISTS resources_{0} ON resources (resource_type, {0})'
+                                 .format(column))
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _row(self, resource_type, item):
+        return ((resource_type, item['id']) + tuple(item.get(column) for column in INDEXED_COLUMNS) +
+                (item.get('updated_at'), json.dumps(item, separators=(',', ':'))))
+
+    def _upsert(self, resource_type, items):
+        placeholders = ', '.join(['?'] * (len(INDEXED_COLUMNS) + 4))
+        rows = [self._row(resource_type, item) for item in items]
+        with self._lock, self._db:
+            self._db.executemany('INSERT OR REPLACE INTO resources VALUES ({0})'.format(placeholders), rows)
+        return len(rows)
+
+    def _changed(self, resource_type, items):
+        """Drop the items whose updated_at matches the mirrored copy"""
+        ids = [item['id'] for item in items]
+        known = {}
+        with self._lock:
+            for start in range(0, len(ids), MAX_VARIABLES):
+                chunk = ids[start:start + MAX_VARIABLES]
+                known.update(self._db.execute(
+                    'SELECT id, updated_at FROM resources WHERE resource_type = ? AND id IN ({0})'.format(
+                        ', '.join(['?'] * len(chunk))), [resource_type] + chunk).fetchall())
+        return [item for item in items if item['id'] not in known or known[item['id']] != item.get('updated_at')]
+
+    def _state(self, resource_type):
+        row = self._db.execute('SELECT synced_at, max_updated_at FROM sync_state WHERE resource_type = ?',
+                               (resource_type,)).fetchone()
+        return (row['synced_at'], row['max_updated_at']) if row else (None, None)
+
+    def _save_state(self, resource_type):
+        with self._lock, self._db:
+            max_updated_at = self._db.execute('SELECT MAX(updated_at) FROM resources WHERE resource_type = ?',
+                                              (resource_type,)).fetchone()[0]
+            self._db.execute('INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?)',
+                             (resource_type, time.time(), max_updated_at))
+
+    def _local_count(self, resource_type):
+        return self._db.execute('SELECT COUNT(*) FROM resources WHERE resource_type = ?',
+                                (resource_type,)).fetchone()[0]
+
+    def _batches(self, resource_type, search=None):
+        batch = []
+        for item in self.foreman.iter_resources(resource_type=resource_type, per_page=self.per_page,
+                                                search=search):
+            batch.append(item)
+            if len(batch) >= self.per_page:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _full_sync(self, resource_type):
+        seen = set()
+        updated = 0
+        for batch in self._batches(resource_type):
+            updated += self._upsert(resource_type, batch)
+            seen.update(item['id'] for item in batch)
+        deleted = self._delete_missing(resource_type, seen)
+        return updated, deleted
+
+    def _delete_missing(self, resource_type, seen):
+        with self._lock, self._db:
+            rows = self._db.execute('SELECT id FROM resources WHERE resource_type = ?', (resource_type,))
+            local = set(row[0] for row in rows)
+            missing = [(resource_type, resource_id) for resource_id in local - seen]
+            self._db.executemany('DELETE FROM resources WHERE resource_type = ? AND id = ?', missing)
+        return len(missing)
+
+    def sync_resource_type(self, resource_type, full=False):
+        """Refresh one resource type
+
+        Args:
+          resource_type (str): Resource type to refresh
+          full (bool): Fetch everything instead of only changed resources
+        Returns:
+          dict with the number of updated and deleted resources and whether
+          the sync was incremental
+        """
+        synced_at, max_updated_at = self._state(resource_type)
+        incremental = not full and synced_at is not None and max_updated_at is not None
+        updated = deleted = 0
+        if incremental:
+            try:
+                # >= so resources changed in the same second as the last sync
+                # are not missed, the ones already mirrored are skipped
+                for batch in self._batches(resource_type, search='updated_at >= "{0}"'.format(max_updated_at)):
+                    updated += self._upsert(resource_type, self._changed(resource_type, batch))
+                total = self.foreman.count_resources(resource_type=resource_type)
+            except ForemanError as e:
+                # Not every resource type can be searched by updated_at,
+                # server errors are not taken for that
+                if e.status_code not in (400, 422):
+                    raise
+                incremental = False
+            else:
+                if total != self._local_count(resource_type):
+                    seen = set()
+                    for batch in self._batches(resource_type):
+                        seen.update(item['id'] for item in batch)
+                    deleted = self._delete_missing(resource_type, seen)
+        if not incremental:
+            updated, deleted = self._full_sync(resource_type)
+        self._save_state(resource_type)
+        return {'updated': updated, 'deleted': deleted, 'incremental': incremental}
+
+    def sync(self, resource_types=None, full=False):
+        """Refresh the mirror
+
+        Returns:
+          dict of resource type to the result of sync_resource_type
+        """
+        return dict((resource_type, self.sync_resource_type(resource_type, full=full))
+                    for resource_type in (resource_types or self.resource_types))
+
+    def refresh_resource(self, resource_type, resource_id):
+        """Fetch one resource again, e.g. after changing it through the API
+
+        A resource that no longer exists is removed from the mirror.
+        """
+        try:
+            item = self.foreman.get_resource(resource_type=resource_type, resource_id=resource_id)
+        except ForemanError as e:
+            if e.status_code != 404:
+                raise
+            with self._lock, self._db:
+                self._db.execute('DELETE FROM resources WHERE resource_type = ? AND id = ?',
+                                 (resource_type, resource_id))
+            return None
+        self._upsert(resource_type, [item])
+        return item
+
+    def _where(self, resource_type, filters):
+        clauses = ['resource_type = ?']
+        args = [resource_type]
+        for key, value in filters.items():
+            if key in FILTERS:
+                id_column, name_columns = FILTERS[key]
+                if isinstance(value, int):
+                    clauses.append('{0} = ?'.format(id_column))
+                    args.append(value)
+                else:
+                    clauses.append('(' + ' OR '.join('{0} = ?'.format(c) for c in name_columns) + ')')
+                    args.extend([value] * len(name_columns))
+            elif key in INDEXED_COLUMNS or key in ('id', 'updated_at'):
+                clauses.append('{0} = ?'.format(key))
+                args.append(value)
+            else:
+                raise ValueError('Can not filter on {0}'.format(key))
+        return ' AND '.join(clauses), args
+
+    def find(self, resource_type, **filters):
+        """Return mirrored resources matching all filters
+
+        Filters are hostgroup, domain, subnet, operatingsystem, environment
+        and name, matched by id if the value is an integer and by name (or
+        title) otherwise, plus any of INDEXED_COLUMNS matched exactly.
+
+        Returns:
+          list of dict
+        """
+        where, args = self._where(resource_type, filters)
+        with self._lock:
+            rows = self._db.execute('SELECT data FROM resources WHERE {0} ORDER BY id'.format(where), args)
+            return [json.loads(row[0]) for row in rows]
+
+    def count(self, resource_type, **filters):
+        where, args = self._where(resource_type, filters)
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM resources WHERE {0}'.format(where), args).fetchone()[0]
+
+    def get(self, resource_type, id):
+        """Return one mirrored resource by id or name, None if unknown"""
+        result = self.find(resource_type, name=id)
+        return result[0] if result else None
+
+    def last_sync(self, resource_type):
+        """Return the time of the last sync of a resource type, None if never synced"""
+        return self._state(resource_type)[0]
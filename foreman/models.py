@@ -0,0 +1,285 @@
+"""
+Lightweight typed models of the main Foreman resources
+
+The client returns plain decoded dicts. For long listings this is expensive:
+every host dict carries dozens of keys. The models in this module keep the
+compact JSON text of a resource and decode it only when a field is first
+accessed. Declared fields are stored in ``__slots__``, the decoded dict is
+kept for the other keys, so the text is decoded at most once. Listings are streamed and each model keeps the JSON
+text it was received as.
+
+Related resources are resolved through the identity map of a
+:class:`ModelSession`, so ``host.hostgroup`` for a thousand hosts in the
+same hostgroup returns one shared object fetched at most once::
+
+    session = ModelSession(foreman)
+    for host in session.get_hosts():
+        print(host.name, host.hostgroup.title, host.domain.name)
+"""
+
+import json
+import threading
+
+from .foreman import DOMAINS, HOSTGROUPS, HOSTS, OPERATINGSYSTEMS, SUBNETS
+
+
+def _encode(data):
+    return json.dumps(data, separators=(',', ':'))
+
+
+class Relation(object):
+    """Descriptor resolving a related resource through the session
+
+    Args:
+      resource_type (str): Resource type of the related resource
+      key (str): Field holding the id of the related resource
+    """
+
+    def __init__(self, resource_type, key):
+        self.resource_type = resource_type
+        self.key = key
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        resource_id = getattr(instance, self.key)
+        if resource_id is None:
+            return None
+        return instance._session.get(self.resource_type, resource_id)
+
+
+class Resource(object):
+    """Base class of all models
+
+    Subclasses declare the resource type, the fields kept in slots and the
+    relations to other resources. Fields not declared are still reachable
+    with ``resource['key']`` or :meth:`get`.
+    """
+
+    __slots__ = ('_session', '_raw', '_data', '__weakref__')
+    resource_type = None
+    fields = ()
+
+    def __init__(self, session, raw):
+        """Init
+
+        Args:
+          session (ModelSession): Session owning the identity map
+          raw (str or dict): JSON text or decoded dict of the resource
+        """
+        self._session = session
+        self._set_raw(raw)
+
+    def _set_raw(self, raw):
+        if isinstance(raw, (dict, list)):
+            raw = _encode(raw)
+        self._raw = raw
+        self._data = None
+        for field in self.fields:
+            try:
+                delattr(self, field)
+            except AttributeError:
+                pass
+
+    def _decoded(self):
+        """Return the decoded dict, decoding the JSON text and filling the slots on first use only"""
+        data = self._data
+        if data is None:
+            data = self._data = json.loads(self._raw)
+            for field in self.fields:
+                object.__setattr__(self, field, data.get(field))
+        return data
+
+    def __getattr__(self, name):
+        # Only reached for declared fields whose slot has not been filled yet
+        if name in type(self).fields:
+            self._decoded()
+            return object.__getattribute__(self, name)
+        raise AttributeError(name)
+
+    def __getitem__(self, key):
+        return self._decoded()[key]
+
+    def get(self, key, default=None):
+        return self._decoded().get(key, default)
+
+    def to_dict(self):
+        """Return the resource as a newly decoded dict"""
+        return json.loads(self._raw)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.id == other.id
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.resource_type, self.id))
+
+    def __repr__(self):
+        return '<{0} id={1} name={2!r}>'.format(type(self).__name__, self.id, self.name)
+
+
+class Domain(Resource):
+    __slots__ = ('id', 'name', 'fullname', 'dns_id')
+    resource_type = DOMAINS
+    fields = __slots__
+
+
+class OperatingSystem(Resource):
+    __slots__ = ('id', 'name', 'title', 'major', 'minor', 'family', 'release_name')
+    resource_type = OPERATINGSYSTEMS
+    fields = __slots__
+
+
+class Subnet(Resource):
+    __slots__ = ('id', 'name', 'network', 'mask', 'cidr', 'gateway', 'dns_primary', 'vlanid', 'ipam',
+                 'boot_mode')
+    resource_type = SUBNETS
+    fields = __slots__
+
+
+class Hostgroup(Resource):
+    __slots__ = ('id', 'name', 'title', 'ancestry', 'parent_id', 'domain_id', 'subnet_id',
+                 'operatingsystem_id', 'environment_id', 'architecture_id')
+    resource_type = HOSTGROUPS
+    fields = __slots__
+
+    parent = Relation(HOSTGROUPS, 'parent_id')
+    domain = Relation(DOMAINS, 'domain_id')
+    subnet = Relation(SUBNETS, 'subnet_id')
+    operatingsystem = Relation(OPERATINGSYSTEMS, 'operatingsystem_id')
+
+    def __repr__(self):
+        return '<Hostgroup id={0} title={1!r}>'.format(self.id, self.title)
+
+
+class Host(Resource):
+    __slots__ = ('id', 'name', 'ip', 'mac', 'build', 'enabled', 'managed', 'comment', 'uuid', 'certname',
+                 'hostgroup_id', 'domain_id', 'subnet_id', 'operatingsystem_id', 'environment_id',
+                 'architecture_id', 'compute_resource_id', 'compute_profile_id', 'ptable_id', 'medium_id')
+    resource_type = HOSTS
+    fields = __slots__
+
+    hostgroup = Relation(HOSTGROUPS, 'hostgroup_id')
+    domain = Relation(DOMAINS, 'domain_id')
+    subnet = Relation(SUBNETS, 'subnet_id')
+    operatingsystem = Relation(OPERATINGSYSTEMS, 'operatingsystem_id')
+
+
+MODELS = dict((model.resource_type, model) for model in (Domain, Host, Hostgroup, OperatingSystem, Subnet))
+
+
+class ModelSession(object):
+    """Wrap a Foreman client and return models instead of dicts
+
+    All models created by a session are kept in its identity map, keyed by
+    resource type and id. Asking for a resource already known returns the
+    existing object instead of issuing a new GET.
+
+    Args:
+      foreman (Foreman): Client used to fetch resources
+    """
+
+    def __init__(self, foreman):
+        self.foreman = foreman
+        self._identity_map = {}
+        self._lock = threading.RLock()
+
+    def _register(self, resource_type, data, resource_id=None):
+        """Return the model of a resource, refreshing a known one in place
+
+        Args:
+          data (str or dict): JSON text or decoded dict of the resource
+          resource_id (int): Id of the resource, required with JSON text
+        """
+        model = MODELS[resource_type]
+        key = (resource_type, data.get('id') if isinstance(data, dict) else resource_id)
+        with self._lock:
+            instance = self._identity_map.get(key)
+            if instance is None:
+                instance = model(self, data)
+                self._identity_map[key] = instance
+            else:
+                instance._set_raw(data)
+        return instance
+
+    def get(self, resource_type, resource_id):
+        """Return one resource, fetching it only if not yet in the identity map
+
+        Args:
+          resource_type (str): Resource type, e.g. 'hosts'
+          resource_id (int): Resource identifier
+        Returns:
+          Resource
+        """
+        instance = self._identity_map.get((resource_type, resource_id))
+        if instance is not None:
+            return instance
+        data = self.foreman.get_resource(resource_type=resource_type, resource_id=resource_id)
+        with self._lock:
+            # Another thread may have registered it while we were fetching
+            instance = self._identity_map.get((resource_type, resource_id))
+            if instance is not None:
+                return instance
+            return self._register(resource_type, data)
+
+    def all(self, resource_type):
+        """Return all resources of a type, refreshing known objects in place
+
+        Models are built from the JSON text of each resource as it is
+        streamed, so the listing is not decoded and encoded again first.
+        """
+        return [self._register(resource_type, text, item.get('id'))
+                for item, text in self.foreman.get_resources(resource_type=resource_type, stream=True,
+                                                             with_text=True)]
+
+    def search(self, resource_type, data):
+        """Search resources and return a list of models"""
+        result = self.foreman.search_resource(resource_type=resource_type, data=data)
+        if isinstance(result, dict):
+            result = [result]
+        return [self._register(resource_type, item) for item in result]
+
+    def refresh(self, resource):
+        """Fetch a resource again and update the cached object in place"""
+        data = self.foreman.get_resource(resource_type=resource.resource_type, resource_id=resource.id)
+        return self._register(resource.resource_type, data)
+
+    def clear(self):
+        """Forget all cached objects"""
+        with self._lock:
+            self._identity_map.clear()
+
+    def __len__(self):
+        return len(self._identity_map)
+
+    def get_domains(self):
+        return self.all(DOMAINS)
+
+    def get_domain(self, id):
+        return self.get(DOMAINS, id)
+
+    def get_hosts(self):
+        return self.all(HOSTS)
+
+    def get_host(self, id):
+        return self.get(HOSTS, id)
+
+    def get_hostgroups(self):
+        return self.all(HOSTGROUPS)
+
+    def get_hostgroup(self, id):
+        return self.get(HOSTGROUPS, id)
+
+    def get_operatingsystems(self):
+        return self.all(OPERATINGSYSTEMS)
+
+    def get_operatingsystem(self, id):
+        return self.get(OPERATINGSYSTEMS, id)
+
+    def get_subnets(self):
+        return self.all(SUBNETS)
+
+    def get_subnet(self, id):
+        return self.get(SUBNETS, id)
@@ -0,0 +1,156 @@
+"""
+Priority classes for requests sharing one client
+
+A client used both for interactive lookups and for bulk jobs lets the lookups
+queue behind the bulk requests. With a :class:`RequestScheduler` every
+request takes a slot of its priority class first::
+
+    scheduler = RequestScheduler(max_concurrency=8, limits={BULK: 6})
+    foreman = Foreman('foreman.example.com', 443, 'admin', 'secret', scheduler=scheduler)
+
+    with priority(BULK):
+        mirror.sync()
+
+Requests outside of any ``priority`` block are interactive. When a slot
+frees up, waiting interactive requests get it before bulk ones, and within a
+class requests are served in arrival order. Bulk requests never take more
+than their limit, so the remaining slots stay available to interactive
+requests while bulk work uses all of its share.
+
+The priority class is tracked per thread like deadlines; work handed to
+thread pools keeps it if it is wrapped with :func:`foreman.deadline.propagate`.
+"""
+
+import collections
+import threading
+import time
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+# Highest priority first
+PRIORITIES = (INTERACTIVE, BULK)
+
+_local = threading.local()
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def current_priority():
+    """Return the priority class of the calling thread"""
+    stack = _stack()
+    return stack[-1] if stack else INTERACTIVE
+
+
+class priority(object):
+    """Send the requests of a block with a priority class"""
+
+    def __init__(self, name):
+        if name not in PRIORITIES:
+            raise ValueError('Unknown priority {0!r}'.format(name))
+        self.name = name
+
+    def __enter__(self):
+        _stack().append(self.name)
+        return self
+
+    def __exit__(self, *args):
+        _stack().pop()
+
+
+class SchedulerTimeout(Exception):
+    """Gave up waiting for a request slot"""
+
+
+class RequestScheduler(object):
+    """Concurrency budgets per priority class
+
+    Args:
+      max_concurrency (int): Requests in flight at most, all classes together
+      limits (dict): Requests in flight at most per class. Bulk requests are
+          limited to three quarters of max_concurrency by default, other
+          classes to max_concurrency.
+    """
+
+    def __init__(self, max_concurrency=8, limits=None):
+        self.max_concurrency = max_concurrency
+        self.limits = dict((name, max_concurrency) for name in PRIORITIES)
+        self.limits[BULK] = max(1, max_concurrency * 3 // 4)
+        self.limits.update(limits or {})
+        self._cond = threading.Condition()
+        self._queues = dict((name, collections.deque()) for name in PRIORITIES)
+        self._in_flight = dict((name, 0) for name in PRIORITIES)
+        self.reset_stats()
+
+    def _can_start(self, name, ticket):
+        if self._queues[name][0] is not ticket:
+            return False
+        if sum(self._in_flight.values()) >= self.max_concurrency or self._in_flight[name] >= self.limits[name]:
+            return False
+        for other in PRIORITIES[:PRIORITIES.index(name)]:
+            if self._queues[other] and self._in_flight[other] < self.limits[other]:
+                return False
+        return True
+
+    def acquire(self, timeout=None):
+        """Wait for a slot of the calling thread's priority class
+
+        Args:
+          timeout (float): Seconds to wait at most, None waits forever
+        Returns:
+          Name of the class, to be passed to release
+        Raises:
+          SchedulerTimeout: No slot became free within timeout
+        """
+        name = current_priority()
+        ticket = object()
+        start = time.time()
+        with self._cond:
+            self._queues[name].append(ticket)
+            try:
+                while not self._can_start(name, ticket):
+                    remaining = None if timeout is None else start + timeout - time.time()
+                    if remaining is not None and remaining <= 0:
+                        raise SchedulerTimeout('No {0} request slot within {1}s'.format(name, timeout))
+                    self._cond.wait(remaining)
+            except BaseException:
+                self._queues[name].remove(ticket)
+                self._cond.notify_all()
+                raise
+            self._queues[name].popleft()
+            self._in_flight[name] += 1
+            stats = self._stats[name]
+            waited = time.time() - start
+            stats['requests'] += 1
+            stats['wait_s'] += waited
+            stats['max_wait_s'] = max(stats['max_wait_s'], waited)
+            stats['max_in_flight'] = max(stats['max_in_flight'], self._in_flight[name])
+            # The next request in line may be able to start as well
+            self._cond.notify_all()
+        return name
+
+    def release(self, name):
+        with self._cond:
+            self._in_flight[name] -= 1
+            self._cond.notify_all()
+
+    def in_flight(self):
+        with self._cond:
+            return dict(self._in_flight)
+
+    def waiting(self):
+        with self._cond:
+            return dict((name, len(queue)) for name, queue in self._queues.items())
+
+    def stats(self):
+        """Return the requests, total and longest wait and peak concurrency per class"""
+        with self._cond:
+            return dict((name, dict(stats)) for name, stats in self._stats.items())
+
+    def reset_stats(self):
+        self._stats = dict((name, {'requests': 0, 'wait_s': 0.0, 'max_wait_s': 0.0, 'max_in_flight': 0})
+                           for name in PRIORITIES)
@@ -0,0 +1,86 @@
+"""
+Listings fetched per organization and location in parallel
+
+On multi-tenant instances a global listing is one huge request that Foreman
+authorises item by item. Fetching it per organization splits it into smaller
+requests that run concurrently::
+
+    hosts = fetch_scoped(foreman, 'hosts', max_workers=8)
+    hosts = fetch_scoped(foreman, 'hosts', organization_ids=shard_ids(foreman.get_organizations(), 0, 4))
+
+Resources assigned to several organizations are returned once. Resources
+not assigned to any of the organizations are not returned; fetch them with
+:func:`fetch_unassigned`.
+"""
+
+import itertools
+from concurrent import futures
+
+from .deadline import propagate
+from .foreman import ORGANIZATIONS
+
+
+def shard_ids(resources, index, count):
+    """Return the ids of the resources belonging to shard index of count
+
+    Resources are assigned round-robin in the order of their ids, so every
+    caller passing the same resources gets the same shards.
+    """
+    if not 0 <= index < count:
+        raise ValueError('Shard {0} out of range for {1} shards'.format(index, count))
+    ids = sorted(resource['id'] for resource in resources)
+    return ids[index::count]
+
+
+def fetch_scoped(foreman, resource_type, organization_ids=None, location_ids=None, search=None,
+                 per_page=1000, max_workers=8):
+    """Fetch a listing once per organization (and location) concurrently
+
+    Args:
+      foreman (Foreman): Client used to talk to Foreman
+      resource_type (str): Resource type to list
+      organization_ids (list): Organizations to list, all of them if None
+      location_ids (list): Also split each organization by these locations
+      search (str): Optional search query
+      per_page (int): Page size of each listing
+      max_workers (int): Maximum number of listings fetched at once
+    Returns:
+      list of dict ordered by id
+    """
+    if organization_ids is None:
+        organization_ids = [organization['id'] for organization in foreman.get_resources(ORGANIZATIONS)]
+    scopes = list(itertools.product(organization_ids, location_ids if location_ids is not None else [None]))
+
+    def fetch(organization_id, location_id):
+        return list(foreman.iter_resources(resource_type=resource_type, search=search, per_page=per_page,
+                                           organization_id=organization_id, location_id=location_id))
+
+    merged = {}
+    executor = futures.ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        pending = [executor.submit(propagate(fetch), organization_id, location_id)
+                   for organization_id, location_id in scopes]
+        for future in pending:
+            for item in future.result():
+                merged.setdefault(item['id'], item)
+    finally:
+        executor.shutdown(wait=True)
+    return [merged[key] for key in sorted(merged)]
+
+
+def fetch_unassigned(foreman, resource_type, scope='organization_id', per_page=1000):
+    """Fetch the resources not assigned to any organization (or location)
+
+    Foreman cannot filter for a missing taxonomy, so the whole listing is
+    paged through and only the unassigned resources are kept.
+
+    Args:
+      foreman (Foreman): Client used to talk to Foreman
+      resource_type (str): Resource type to list
+      scope (str): organization_id or location_id
+      per_page (int): Page size of the listing
+    Returns:
+      list of dict
+    """
+    return [item for item in foreman.iter_resources(resource_type=resource_type, per_page=per_page)
+            if item.get(scope) is None]
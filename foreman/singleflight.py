@@ -0,0 +1,109 @@
+"""
+Coalescing of identical concurrent calls
+
+When several threads ask for the same thing at the same time only the first
+one does the work. The others wait for it and receive its result, or its
+exception.
+"""
+
+import copy
+import threading
+
+
+class WaitTimeout(Exception):
+    """Gave up waiting for the result of an identical call"""
+
+
+class CallAborted(Exception):
+    """The identical call was interrupted, e.g. by KeyboardInterrupt, without a result"""
+
+
+class _Call(object):
+    __slots__ = ('event', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight(object):
+    """Share one in-flight call between callers using the same key
+
+    Attributes:
+      calls (int): Number of calls actually executed
+      coalesced (int): Number of calls saved by waiting for an identical one
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key, function, timeout=None):
+        """Call function unless a call with the same key is already running
+
+        Callers joining a running call get a deep copy of a snapshot of its
+        result taken before the caller that ran it gets it back, so all of
+        them can modify their result without affecting each other.
+
+        Args:
+          key: Hashable key identifying identical calls
+          function (callable): Function without arguments doing the work
+          timeout (float): Seconds to wait for an identical call already
+              running, None waits until it finished
+        Returns:
+          The return value of function
+        Raises:
+          WaitTimeout: The identical call did not finish within timeout
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+                leader = True
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            if not call.event.wait(timeout):
+                raise WaitTimeout()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        result = None
+        try:
+            result = function()
+            return result
+        except BaseException as e:
+            # Waiters get exceptions, but not the interrupt or exit of another thread
+            call.error = e if isinstance(e, Exception) else CallAborted(repr(e))
+            raise
+        finally:
+            with self._lock:
+                # No caller can join once the call is removed
+                del self._calls[key]
+                waiters = call.waiters
+            if waiters and call.error is None:
+                # Snapshot before the leader's caller gets to modify result
+                call.result = copy.deepcopy(result)
+            call.event.set()
+
+    def in_flight(self):
+        """Return the number of calls currently running"""
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self):
+        return {'calls': self.calls, 'coalesced': self.coalesced}
+
+    def reset_stats(self):
+        with self._lock:
+            self.calls = 0
+            self.coalesced = 0
@@ -0,0 +1,144 @@
+"""
+Incremental decoding of Foreman collection responses
+
+A collection response looks like::
+
+    {"total": 5000, "subtotal": 5000, "page": 1, "per_page": 5000, "search": null,
+     "sort": {"by": null, "order": null}, "results": [{...}, {...}, ...]}
+
+:class:`ResultStream` parses such a response chunk by chunk as it arrives
+and yields the items of ``results`` one by one. Only the item being decoded
+and the unparsed rest of the current chunk are held in memory, instead of
+the raw bytes, the decoded text and the complete object tree at once.
+All other top level keys are collected in ``meta``.
+"""
+
+import codecs
+import json
+import re
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+NUMBER_START = '-0123456789'
+
+
+class ResultStream(object):
+    """Iterate over the items of one array in a streamed JSON object
+
+    Args:
+      chunks (iterable): Chunks of the response body as bytes
+      key (str): Top level key of the array to stream
+      close (callable): Called once iteration ended, failed or was abandoned,
+          e.g. to release the connection
+      with_text (bool): Yield (item, JSON text of the item) pairs, so the
+          text can be kept without encoding the item again
+    Attributes:
+      meta (dict): All other top level keys. Keys preceding the array are
+          available once the first item was yielded, the rest once the
+          stream is exhausted.
+    """
+
+    def __init__(self, chunks, key='results', close=None, with_text=False):
+        self.key = key
+        self.with_text = with_text
+        self._close = close
+        self.meta = {}
+        self.count = 0
+        self._chunks = iter(chunks)
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self._decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self, min_chars=1):
+        """Append at least min_chars characters to the buffer
+
+        Returns:
+          False if the end of the stream was reached before
+        """
+        # Drop what has been consumed already
+        self._buffer = self._buffer[self._pos:]
+        self._pos = 0
+        target = len(self._buffer) + min_chars
+        parts = [self._buffer]
+        length = len(self._buffer)
+        while length < target:
+            try:
+                chunk = next(self._chunks)
+            except StopIteration:
+                parts.append(self._text.decode(b'', final=True))
+                self._eof = True
+                break
+            text = self._text.decode(chunk)
+            parts.append(text)
+            length += len(text)
+        self._buffer = ''.join(parts)
+        return len(self._buffer) >= target
+
+    def _peek(self):
+        """Skip whitespace and return the next character"""
+        while True:
+            self._pos = WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if self._eof or not self._fill():
+                raise ValueError('Unexpected end of JSON stream')
+
+    def _expect(self, characters):
+        character = self._peek()
+        if character not in characters:
+            raise ValueError('Expected {0!r} at position {1}, got {2!r}'.format(characters, self._pos, character))
+        self._pos += 1
+        return character
+
+    def _value(self, with_text=False):
+        """Decode the next complete JSON value, with its text if with_text is set"""
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except ValueError:
+                if self._eof:
+                    raise
+                # Grow the buffer geometrically so a large value is not
+                # parsed again for every chunk
+                self._fill(max(len(self._buffer) - self._pos, 1))
+                continue
+            if end == len(self._buffer) and not self._eof and self._buffer[self._pos] in NUMBER_START:
+                # A number at the end of the buffer may continue in the next chunk
+                self._fill()
+                continue
+            start, self._pos = self._pos, end
+            return (value, self._buffer[start:end]) if with_text else value
+
+    def __iter__(self):
+        try:
+            for item in self._parse():
+                yield item
+        finally:
+            if self._close is not None:
+                self._close()
+
+    def _parse(self):
+        self._expect('{')
+        if self._peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self._value()
+            self._expect(':')
+            if key == self.key and self._peek() == '[':
+                self._pos += 1
+                if self._peek() == ']':
+                    self._pos += 1
+                else:
+                    while True:
+                        item = self._value(self.with_text)
+                        self.count += 1
+                        yield item
+                        if self._expect(',]') == ']':
+                            break
+            else:
+                self.meta[key] = self._value()
+            if self._expect(',}') == '}':
+                return
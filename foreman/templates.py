@@ -0,0 +1,289 @@
+"""
+Sync config templates and partition tables with a local directory
+
+Templates are stored as one file per template below the directory::
+
+    <directory>/config_templates/<name>.erb
+    <directory>/ptables/<name>.erb
+    <directory>/.foreman-sync.json
+
+The state file records the id, ``updated_at`` and a SHA-256 hash of the
+content of each template as of the last sync. A template is only downloaded
+if Foreman reports a newer ``updated_at``, and only uploaded if the hash of
+the local file differs from the recorded one. Uploads and downloads run
+concurrently::
+
+    sync = TemplateSync(foreman, 'templates')
+    sync.pull()
+    # edit files ...
+    report = sync.push()
+    print(report.summary())
+"""
+
+import hashlib
+import json
+import os
+import threading
+from concurrent import futures
+
+from .deadline import propagate
+from .foreman import CONFIG_TEMPLATE, CONFIG_TEMPLATES, PARTITION_TABLE, PARTITION_TABLES, ForemanError
+
+STATE_FILE = '.foreman-sync.json'
+SUFFIX = '.erb'
+
+# Resource type, resource name and the key holding the template body
+TEMPLATE_TYPES = (
+    (CONFIG_TEMPLATES, CONFIG_TEMPLATE, 'template'),
+    (PARTITION_TABLES, PARTITION_TABLE, 'layout'),
+)
+
+
+def content_hash(content):
+    if not isinstance(content, bytes):
+        content = content.encode('utf-8')
+    return hashlib.sha256(content).hexdigest()
+
+
+def file_name(name):
+    return name.replace('/', '_') + SUFFIX
+
+
+class SyncReport(object):
+    """Outcome of a pull or push
+
+    Each attribute is a list of (resource type, template name) tuples, except
+    errors which is a list of (resource type, template name, exception).
+    """
+
+    KINDS = ('downloaded', 'uploaded', 'created', 'unchanged', 'conflicts', 'errors')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        for kind in self.KINDS:
+            setattr(self, kind, [])
+
+    def add(self, kind, *entry):
+        with self._lock:
+            getattr(self, kind).append(entry)
+
+    def summary(self):
+        return dict((kind, len(getattr(self, kind))) for kind in self.KINDS)
+
+
+class TemplateSync(object):
+    """Keep config templates and partition tables in sync with a directory
+
+    Args:
+      foreman (Foreman): Client used to talk to Foreman
+      directory (str): Local directory holding the templates
+      max_workers (int): Maximum number of concurrent uploads or downloads
+      resource_types (list): Template types to sync, defaults to config
+          templates and partition tables
+      create_defaults (dict): Extra attributes per resource type used when a
+          local template is created in Foreman, e.g. the template_kind_id of
+          config templates
+    """
+
+    def __init__(self, foreman, directory, max_workers=8, resource_types=None, create_defaults=None):
+        self.foreman = foreman
+        self.directory = directory
+        self.max_workers = max_workers
+        self.types = [entry for entry in TEMPLATE_TYPES if resource_types is None or entry[0] in resource_types]
+        self.create_defaults = create_defaults or {}
+        self._state_lock = threading.Lock()
+        self.state = self._load_state()
+
+    @property
+    def state_file(self):
+        return os.path.join(self.directory, STATE_FILE)
+
+    def _load_state(self):
+        if not os.path.exists(self.state_file):
+            return {}
+        with open(self.state_file) as f:
+            return json.load(f)
+
+    def _save_state(self):
+        tmp = self.state_file + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.state, f, indent=2, sort_keys=True)
+        os.rename(tmp, self.state_file)
+
+    def _record(self, resource_type, name, item, digest):
+        with self._state_lock:
+            self.state.setdefault(resource_type, {})[name] = {
+                'id': item.get('id'),
+                'updated_at': item.get('updated_at'),
+                'hash': digest,
+                'file': file_name(name),
+            }
+
+    def _path(self, resource_type, name):
+        return os.path.join(self.directory, resource_type, file_name(name))
+
+    def _read(self, path):
+        with open(path, 'rb') as f:
+            return f.read().decode('utf-8')
+
+    def _write(self, path, content):
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(content.encode('utf-8'))
+        os.rename(tmp, path)
+
+    def _run(self, jobs, report):
+        """Run (resource type, name, function) jobs concurrently"""
+        executor = futures.ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            pending = dict((executor.submit(propagate(function)), (resource_type, name))
+                           for resource_type, name, function in jobs)
+            for future in futures.as_completed(pending):
+                try:
+                    future.result()
+                except (ForemanError, IOError, OSError) as e:
+                    report.add('errors', pending[future][0], pending[future][1], e)
+        finally:
+            executor.shutdown(wait=True)
+
+    def _download(self, resource_type, body_key, item, report):
+        detail = self.foreman.get_resource(resource_type=resource_type, resource_id=item.get('id'))
+        content = detail.get(body_key) or ''
+        self._write(self._path(resource_type, item.get('name')), content)
+        self._record(resource_type, item.get('name'), detail, content_hash(content))
+        report.add('downloaded', resource_type, item.get('name'))
+
+    def pull(self, force=False):
+        """Download templates changed in Foreman
+
+        A template is downloaded if Foreman reports another updated_at than
+        recorded, or if the local file is missing. Local changes not pushed
+        yet are not overwritten unless force is set, they are reported as
+        conflicts instead.
+
+        Returns:
+          SyncReport
+        """
+        report = SyncReport()
+        jobs = []
+        for resource_type, _, body_key in self.types:
+            directory = os.path.join(self.directory, resource_type)
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            known = self.state.get(resource_type, {})
+            for item in self.foreman.get_resources(resource_type=resource_type):
+                name = item.get('name')
+                recorded = known.get(name)
+                path = self._path(resource_type, name)
+                exists = os.path.exists(path)
+                if recorded and exists and recorded.get('updated_at') == item.get('updated_at'):
+                    report.add('unchanged', resource_type, name)
+                    continue
+                if recorded and exists and not force and content_hash(self._read(path)) != recorded.get('hash'):
+                    report.add('conflicts', resource_type, name)
+                    continue
+                jobs.append((resource_type, name,
+                             lambda t=resource_type, k=body_key, i=item: self._download(t, k, i, report)))
+        self._run(jobs, report)
+        self._save_state()
+        return report
+
+    def _upload(self, resource_type, resource, body_key, name, content, digest, report):
+        recorded = self.state.get(resource_type, {}).get(name)
+        data = {resource: {body_key: content}}
+        if recorded:
+            result = self.foreman.update_resource(resource_type=resource_type, resource_id=recorded['id'],
+                                                  data=data)
+            kind = 'uploaded'
+        else:
+            data[resource].update(self.create_defaults.get(resource_type, {}))
+            data[resource]['name'] = name
+            result = self.foreman.create_resource(resource_type=resource_type, resource=resource,
+                                                  data=data[resource])
+            kind = 'created'
+        self._record(resource_type, name, result, digest)
+        report.add(kind, resource_type, name)
+
+    def _adopt(self, resource_type, resource, body_key, item, name, content, digest, report):
+        """Handle a local template never synced that also exists in Foreman"""
+        detail = self.foreman.get_resource(resource_type=resource_type, resource_id=item.get('id'))
+        self._record(resource_type, name, detail, content_hash(detail.get(body_key) or ''))
+        if self.state[resource_type][name]['hash'] == digest:
+            report.add('unchanged', resource_type, name)
+        else:
+            self._upload(resource_type, resource, body_key, name, content, digest, report)
+
+    def push(self, force=False):
+        """Upload local templates whose content changed since the last sync
+
+        Templates also changed in Foreman since the last sync are reported as
+        conflicts and not uploaded unless force is set.
+
+        Returns:
+          SyncReport
+        """
+        report = SyncReport()
+        jobs = []
+        for resource_type, resource, body_key in self.types:
+            directory = os.path.join(self.directory, resource_type)
+            if not os.path.isdir(directory):
+                continue
+            known = self.state.get(resource_type, {})
+            by_file = dict((entry['file'], name) for name, entry in known.items())
+            remote = None
+            for entry in sorted(os.listdir(directory)):
+                if not entry.endswith(SUFFIX):
+                    continue
+                name = by_file.get(entry, entry[:-len(SUFFIX)])
+                content = self._read(os.path.join(directory, entry))
+                digest = content_hash(content)
+                recorded = known.get(name)
+                if recorded and recorded.get('hash') == digest:
+                    report.add('unchanged', resource_type, name)
+                    continue
+                if remote is None:
+                    # Only listed if something changed locally
+                    remote = dict((item.get('name'), item)
+                                  for item in self.foreman.get_resources(resource_type=resource_type))
+                item = remote.get(name)
+                if recorded and item and item.get('updated_at') != recorded.get('updated_at') and not force:
+                    report.add('conflicts', resource_type, name)
+                    continue
+                if not recorded and item:
+                    function = (lambda t=resource_type, r=resource, k=body_key, i=item, n=name, c=content, d=digest:
+                                self._adopt(t, r, k, i, n, c, d, report))
+                else:
+                    if recorded and not item:
+                        # Deleted in Foreman, create it again
+                        with self._state_lock:
+                            del known[name]
+                    function = (lambda t=resource_type, r=resource, k=body_key, n=name, c=content, d=digest:
+                                self._upload(t, r, k, n, c, d, report))
+                jobs.append((resource_type, name, function))
+        self._run(jobs, report)
+        self._save_state()
+        return report
+
+    def status(self):
+        """Return the names of local templates changed since the last sync
+
+        Works offline, Foreman is not contacted.
+
+        Returns:
+          list of (resource type, template name) tuples
+        """
+        changed = []
+        for resource_type, _, _ in self.types:
+            directory = os.path.join(self.directory, resource_type)
+            if not os.path.isdir(directory):
+                continue
+            known = self.state.get(resource_type, {})
+            by_file = dict((entry['file'], name) for name, entry in known.items())
+            for entry in sorted(os.listdir(directory)):
+                if not entry.endswith(SUFFIX):
+                    continue
+                name = by_file.get(entry, entry[:-len(SUFFIX)])
+                recorded = known.get(name)
+                if not recorded or recorded.get('hash') != content_hash(self._read(os.path.join(directory, entry))):
+                    changed.append((resource_type, name))
+        return changed
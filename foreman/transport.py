@@ -0,0 +1,306 @@
+"""
+HTTP transports used by the Foreman client
+
+A transport sends one request and returns a :class:`Response`. Two are
+available:
+
+:class:`RequestsTransport`
+    The default. Uses a ``requests`` session, so connections are kept alive
+    and reused between calls instead of opening one per request.
+
+:class:`HTTP2Transport`
+    Uses ``httpx`` with HTTP/2, which multiplexes concurrent requests over a
+    few connections. Needs ``pip install httpx[http2]``. HTTP/2 is only
+    negotiated over TLS, plain http connections fall back to HTTP/1.1.
+
+Both ask for compressed responses and decode gzip, and brotli if the
+``brotli`` package is installed. Request bodies, e.g. template uploads, can
+be gzip compressed with ``compress_requests=True`` if the server or proxy in
+front of Foreman accepts ``Content-Encoding: gzip``::
+
+    foreman = Foreman('foreman.example.com', 443, 'admin', 'secret',
+                      transport=HTTP2Transport(max_connections=2, compress_requests=True))
+"""
+
+import json
+import threading
+import warnings
+import zlib
+
+# requests is imported on the first request, see _requests()
+_requests_module = None
+
+# Request bodies smaller than this are not worth compressing
+COMPRESS_MIN_SIZE = 1024
+
+
+def _requests():
+    """Import requests on first use
+
+    Importing requests is comparatively slow, so it is deferred until the
+    first request is made. Certificates are not verified, so the warning
+    urllib3 emits for each unverified request is silenced. Other urllib3
+    warnings are left alone.
+    """
+    global _requests_module
+    if _requests_module is None:
+        import requests
+        warnings.simplefilter('ignore', requests.packages.urllib3.exceptions.InsecureRequestWarning)
+        _requests_module = requests
+    return _requests_module
+
+
+def _httpx():
+    try:
+        import httpx
+    except ImportError:
+        raise ImportError('HTTP2Transport requires httpx, install it with: pip install httpx[http2]')
+    return httpx
+
+
+def gzip_compress(data):
+    """Return data gzip compressed"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+class TransportTimeout(Exception):
+    """Connecting to or reading from the server timed out
+
+    Attributes:
+      connect (bool): True if no connection was made, so the request was
+          not sent
+    """
+
+    def __init__(self, message, connect=False):
+        super(TransportTimeout, self).__init__(message)
+        self.connect = connect
+
+
+class Response(object):
+    """Transport independent view of a response
+
+    Attributes:
+      status_code (int): HTTP status code
+      url (str): URL of the request
+      headers (dict): Response headers
+    """
+
+    def __init__(self, status_code, url, headers, content=None, chunks=None, close=None):
+        self.status_code = status_code
+        self.url = url
+        self.headers = headers
+        self._content = content
+        self._chunks = chunks
+        self._close = close
+
+    @property
+    def content(self):
+        if self._content is None:
+            self._content = b''.join(self.iter_content())
+        return self._content
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8')
+
+    def json(self):
+        return json.loads(self.text)
+
+    def iter_content(self, chunk_size=None):
+        """Yield the decoded body in chunks, once"""
+        if self._content is not None:
+            yield self._content
+            return
+        chunks, self._chunks = self._chunks, None
+        for chunk in chunks or ():
+            yield chunk
+
+    def close(self):
+        if self._close is not None:
+            self._close()
+            self._close = None
+
+    def call_on_close(self, callback):
+        """Call callback once when the response is closed"""
+        close = self._close
+
+        def wrapper():
+            try:
+                if close is not None:
+                    close()
+            finally:
+                callback()
+        self._close = wrapper
+
+
+class Transport(object):
+    """Base class of transports
+
+    Args:
+      compress_requests (bool): gzip request bodies of at least
+          compress_min_size bytes
+      compress_min_size (int): Smallest body compressed
+    """
+
+    def __init__(self, compress_requests=False, compress_min_size=COMPRESS_MIN_SIZE):
+        self.compress_requests = compress_requests
+        self.compress_min_size = compress_min_size
+
+    def _body(self, body, headers):
+        """Return the body to send and its headers"""
+        if body is None:
+            return None, headers
+        if not isinstance(body, bytes):
+            body = body.encode('utf-8')
+        if self.compress_requests and len(body) >= self.compress_min_size:
+            headers = dict(headers or {}, **{'Content-Encoding': 'gzip'})
+            body = gzip_compress(body)
+        return body, headers
+
+    def request(self, method, url, auth=None, params=None, body=None, headers=None, timeout=None, stream=False):
+        """Send a request
+
+        Args:
+          method (str): HTTP method
+          url (str): URL
+          auth (tuple): User name and password for basic auth
+          params (dict): Parameters of a GET request
+          body (str): Body, e.g. JSON encoded data
+          headers (dict): Additional headers
+          timeout (tuple): Seconds to wait for a connection and for data, None
+              waits forever
+          stream (bool): Read the body only while iterating over
+              Response.iter_content
+        Returns:
+          Response
+        Raises:
+          TransportTimeout: Connecting or reading timed out
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Close all connections"""
+
+
+class RequestsTransport(Transport):
+    """Transport using a requests session
+
+    Args:
+      pool_maxsize (int): Connections kept open per host, should be at least
+          the number of threads using the client
+      compress_requests (bool): gzip request bodies
+      compress_min_size (int): Smallest body compressed
+    """
+
+    def __init__(self, pool_maxsize=10, compress_requests=False, compress_min_size=COMPRESS_MIN_SIZE):
+        super(RequestsTransport, self).__init__(compress_requests=compress_requests,
+                                                compress_min_size=compress_min_size)
+        self.pool_maxsize = pool_maxsize
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        # Created on first use so creating a client does not import requests
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    requests = _requests()
+                    session = requests.Session()
+                    adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.pool_maxsize)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._session = session
+        return self._session
+
+    def _chunks(self, req, chunk_size):
+        requests = _requests()
+        try:
+            for chunk in req.iter_content(chunk_size=chunk_size):
+                yield chunk
+        except requests.exceptions.ConnectionError as e:
+            # requests reports read timeouts of a streamed body this way
+            if e.args and isinstance(e.args[0], requests.packages.urllib3.exceptions.ReadTimeoutError):
+                raise TransportTimeout(str(e))
+            raise
+
+    def request(self, method, url, auth=None, params=None, body=None, headers=None, timeout=None, stream=False):
+        requests = _requests()
+        body, headers = self._body(body, headers)
+        try:
+            # GET parameters are sent form encoded in the body as always
+            req = self.session.request(method=method.upper(),
+                                       url=url,
+                                       data=params if body is None else body,
+                                       headers=headers,
+                                       auth=auth,
+                                       verify=False,
+                                       timeout=timeout,
+                                       stream=stream)
+        except requests.exceptions.Timeout as e:
+            raise TransportTimeout(str(e), connect=isinstance(e, requests.exceptions.ConnectTimeout))
+        if not stream:
+            return Response(req.status_code, req.url, req.headers, content=req.content)
+        return Response(req.status_code, req.url, req.headers,
+                        chunks=self._chunks(req, 64 * 1024), close=req.close)
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+class HTTP2Transport(Transport):
+    """Transport using httpx with HTTP/2
+
+    Args:
+      max_connections (int): Connections opened per host at most. With
+          HTTP/2 each of them carries many concurrent requests.
+      http2 (bool): Negotiate HTTP/2, HTTP/1.1 is used otherwise
+      compress_requests (bool): gzip request bodies
+      compress_min_size (int): Smallest body compressed
+    """
+
+    def __init__(self, max_connections=4, http2=True, compress_requests=False,
+                 compress_min_size=COMPRESS_MIN_SIZE):
+        super(HTTP2Transport, self).__init__(compress_requests=compress_requests,
+                                             compress_min_size=compress_min_size)
+        httpx = _httpx()
+        self._httpx = httpx
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._client = httpx.Client(http2=http2, verify=False, limits=limits)
+
+    def _timeout(self, timeout):
+        if timeout is None:
+            return self._httpx.Timeout(None)
+        connect, read = timeout
+        return self._httpx.Timeout(connect=connect, read=read, write=read, pool=connect)
+
+    def _chunks(self, response):
+        try:
+            for chunk in response.iter_bytes():
+                yield chunk
+        except self._httpx.TimeoutException as e:
+            raise TransportTimeout(str(e))
+
+    def request(self, method, url, auth=None, params=None, body=None, headers=None, timeout=None, stream=False):
+        body, headers = self._body(body, headers)
+        request = self._client.build_request(method.upper(), url,
+                                             params=params,
+                                             content=body,
+                                             headers=headers,
+                                             timeout=self._timeout(timeout))
+        try:
+            response = self._client.send(request, auth=auth, stream=stream)
+            if not stream:
+                return Response(response.status_code, str(response.url), response.headers,
+                                content=response.content)
+        except self._httpx.TimeoutException as e:
+            connect = isinstance(e, (self._httpx.ConnectTimeout, self._httpx.PoolTimeout))
+            raise TransportTimeout(str(e), connect=connect)
+        return Response(response.status_code, str(response.url), response.headers,
+                        chunks=self._chunks(response), close=response.close)
+
+    def close(self):
+        self._client.close()
@@ -0,0 +1,732 @@
+"""
+Local stand-in for the Foreman API v2
+
+Serves the endpoints used by :class:`foreman.foreman.Foreman` from a
+synthetic in-memory dataset so the client can be tested and benchmarked
+without a live Foreman. Latency and errors can be injected.
+
+Example::
+
+    with MockForeman(dataset=generate_dataset(hosts=5000), latency=0.002) as server:
+        f = server.client()
+        hosts = f.get_hosts()
+
+It lives with the tests rather than in the installed package. It can also
+be started standalone::
+
+    python tests/mockserver.py --hosts 5000 --port 3000
+"""
+
+import base64
+import json
+import random
+import re
+import socket
+import sys
+import threading
+import time
+import zlib
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qsl
+except ImportError:  # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qsl
+
+API_PREFIX = '/api/v2/'
+STATUS_PATH = '/api/status'
+
+TIMESTAMP = '2015-03-04T12:00:00Z'
+
+# Keys only returned when a single resource is requested, as Foreman does
+# for large fields.
+DETAIL_ONLY_KEYS = ['template', 'layout', 'parameters', 'interfaces']
+
+# Singular name used as the wrapper key of POST/PUT bodies
+SINGULAR = {
+    'architectures': 'architecture',
+    'common_parameters': 'common_parameter',
+    'compute_attributes': 'compute_attribute',
+    'compute_profiles': 'compute_profile',
+    'compute_resources': 'compute_resource',
+    'config_templates': 'config_template',
+    'domains': 'domain',
+    'environments': 'environment',
+    'hosts': 'host',
+    'hostgroups': 'hostgroup',
+    'images': 'image',
+    'locations': 'location',
+    'media': 'medium',
+    'operatingsystems': 'operatingsystem',
+    'organizations': 'organization',
+    'os_default_templates': 'os_default_template',
+    'parameters': 'parameter',
+    'ptables': 'ptable',
+    'roles': 'role',
+    'smart_proxies': 'smart_proxy',
+    'subnets': 'subnet',
+    'users': 'user',
+}
+
+SEARCH_RE = re.compile(r'\s*([\w.]+)\s*(==|!=|>=|<=|=|>|<|~)\s*("(?:[^"\\]|\\.)*"|\S+)\s*')
+
+
+def _ref(item, prefix, target):
+    item[prefix + '_id'] = target['id']
+    item[prefix + '_name'] = target['name']
+
+
+def _text(rnd, size):
+    words = ['<%= @host.name %>', 'echo', 'install', 'part', '/boot', '--size', 'repo', 'network', '%end']
+    lines = []
+    length = 0
+    while length < size:
+        line = ' '.join(rnd.choice(words) for _ in range(8))
+        lines.append(line)
+        length += len(line) + 1
+    return '\n'.join(lines)
+
+
+def generate_dataset(hosts=100, hostgroups=10, subnets=5, domains=3, operatingsystems=3,
+                     environments=2, compute_resources=2, images_per_compute_resource=3,
+                     config_templates=5, partition_tables=2, organizations=1, locations=1,
+                     parameters_per_host=2, template_size=4096, seed=0):
+    """Generate a synthetic Foreman dataset
+
+    Resources reference each other by id and carry the denormalised
+    ``*_name`` keys the real API returns, so a host looks roughly like a host
+    from Foreman.
+
+    Args:
+      hosts (int): Number of hosts to generate
+      hostgroups (int): Number of hostgroups, nested up to three levels deep
+      seed (int): Seed of the random generator so datasets are reproducible
+    Returns:
+      dict of resource type to list of dict
+    """
+    rnd = random.Random(seed)
+    data = {}
+
+    def simple(resource_type, count, name_format, **extra):
+        items = []
+        for i in range(1, count + 1):
+            item = {'id': i, 'name': name_format.format(i), 'created_at': TIMESTAMP, 'updated_at': TIMESTAMP}
+            item.update(extra)
+            items.append(item)
+        data[resource_type] = items
+        return items
+
+    simple('architectures', 2, 'arch{0}')
+    data['architectures'][0]['name'] = 'x86_64'
+    data['architectures'][1]['name'] = 'i386'
+    simple('common_parameters', 3, 'common_param{0}', value='value')
+    simple('compute_profiles', 3, '{0}-Small', )
+    simple('environments', environments, 'env{0}')
+    simple('media', 2, 'mirror{0}', path='http://mirror.example.com/$version', os_family='Redhat')
+    simple('roles', 3, 'role{0}', builtin=0)
+    simple('smart_proxies', 2, 'proxy{0}.example.com', url='https://proxy.example.com:8443')
+    simple('organizations', organizations, 'org{0}', title='org')
+    simple('locations', locations, 'loc{0}', title='loc')
+    for item in data['organizations'] + data['locations']:
+        item['title'] = item['name']
+    simple('template_kinds', 4, 'kind{0}')
+    users = simple('users', 3, 'user{0}', firstname='First', lastname='Last', admin=False)
+    for user in users:
+        user['login'] = user['name']
+    domains_ = simple('domains', domains, 'domain{0}.example.com', fullname='Domain', dns_id=1)
+    oses = simple('operatingsystems', operatingsystems, 'OS{0}', major='7', minor='1', family='Redhat',
+                  release_name='', password_hash='SHA256')
+    for os_ in oses:
+        os_['title'] = os_['name'] + ' 7.1'
+    crs = simple('compute_resources', compute_resources, 'compute{0}', provider='VMware',
+                 url='vsphere.example.com', user='admin', datacenter='DC1')
+
+    nets = []
+    for i in range(1, subnets + 1):
+        nets.append({
+            'id': i,
+            'name': 'net{0}'.format(i),
+            'network': '10.{0}.{1}.0'.format(i // 256, i % 256),
+            'mask': '255.255.255.0',
+            'cidr': 24,
+            'gateway': '10.{0}.{1}.1'.format(i // 256, i % 256),
+            'from': '10.{0}.{1}.10'.format(i // 256, i % 256),
+            'to': '10.{0}.{1}.250'.format(i // 256, i % 256),
+            'dns_primary': '10.0.0.2',
+            'vlanid': None,
+            'ipam': 'DHCP',
+            'boot_mode': 'Static',
+            'created_at': TIMESTAMP,
+            'updated_at': TIMESTAMP,
+        })
+    data['subnets'] = nets
+
+    groups = []
+    for i in range(1, hostgroups + 1):
+        group = {'id': i, 'name': 'hg{0}'.format(i), 'created_at': TIMESTAMP, 'updated_at': TIMESTAMP,
+                 'parameters': [{'id': i * 10, 'name': 'hg_param', 'value': 'hg{0}'.format(i)}]}
+        parent = groups[rnd.randrange(len(groups))] if groups and rnd.random() < 0.6 else None
+        if parent and parent['ancestry'] and parent['ancestry'].count('/') >= 1:
+            parent = None
+        if parent:
+            group['parent_id'] = parent['id']
+            group['ancestry'] = (parent['ancestry'] + '/' if parent['ancestry'] else '') + str(parent['id'])
+            group['title'] = parent['title'] + '/' + group['name']
+            for key in ('domain', 'subnet', 'operatingsystem', 'environment', 'architecture'):
+                group[key + '_id'] = None
+                group[key + '_name'] = None
+        else:
+            group['parent_id'] = None
+            group['ancestry'] = None
+            group['title'] = group['name']
+            _ref(group, 'domain', rnd.choice(domains_))
+            _ref(group, 'subnet', rnd.choice(nets))
+            _ref(group, 'operatingsystem', rnd.choice(oses))
+            _ref(group, 'environment', rnd.choice(data['environments']))
+            _ref(group, 'architecture', data['architectures'][0])
+        groups.append(group)
+    data['hostgroups'] = groups
+
+    data['config_templates'] = [
+        {'id': i, 'name': 'template{0}'.format(i), 'snippet': False, 'locked': False,
+         'template_kind_id': 1, 'template_kind_name': 'provision',
+         'template': _text(rnd, template_size), 'created_at': TIMESTAMP, 'updated_at': TIMESTAMP}
+        for i in range(1, config_templates + 1)]
+    data['ptables'] = [
+        {'id': i, 'name': 'ptable{0}'.format(i), 'os_family': 'Redhat',
+         'layout': _text(rnd, template_size), 'created_at': TIMESTAMP, 'updated_at': TIMESTAMP}
+        for i in range(1, partition_tables + 1)]
+
+    host_list = []
+    used_ips = {}
+    for i in range(1, hosts + 1):
+        group = rnd.choice(groups)
+        net = rnd.choice(nets)
+        prefix = net['network'].rsplit('.', 1)[0]
+        offset = used_ips.get(net['id'], 10)
+        used_ips[net['id']] = offset + 1
+        domain = rnd.choice(domains_)
+        name = 'host{0:06d}.{1}'.format(i, domain['name'])
+        host = {
+            'id': i,
+            'name': name,
+            'certname': name,
+            'ip': '{0}.{1}'.format(prefix, offset % 240 + 10) if offset < 250 else None,
+            'mac': '52:54:00:{0:02x}:{1:02x}:{2:02x}'.format((i >> 16) & 255, (i >> 8) & 255, i & 255),
+            'build': False,
+            'enabled': True,
+            'managed': True,
+            'provision_method': 'build',
+            'comment': '',
+            'uuid': '4206{0:028x}'.format(i),
+            'model_id': None,
+            'model_name': None,
+            'owner_id': 1,
+            'owner_type': 'User',
+            'puppet_proxy_id': 1,
+            'puppet_ca_proxy_id': 1,
+            'last_report': TIMESTAMP,
+            'global_status': 0,
+            'global_status_label': 'OK',
+            'hostgroup_title': group['title'],
+            'created_at': TIMESTAMP,
+            'updated_at': TIMESTAMP,
+            'parameters': [{'id': i * 100 + p, 'name': 'param{0}'.format(p), 'value': str(p)}
+                           for p in range(parameters_per_host)],
+        }
+        _ref(host, 'hostgroup', group)
+        _ref(host, 'domain', domain)
+        _ref(host, 'subnet', net)
+        _ref(host, 'operatingsystem', rnd.choice(oses))
+        _ref(host, 'environment', rnd.choice(data['environments']))
+        _ref(host, 'architecture', data['architectures'][0])
+        _ref(host, 'compute_resource', rnd.choice(crs))
+        _ref(host, 'compute_profile', rnd.choice(data['compute_profiles']))
+        _ref(host, 'ptable', rnd.choice(data['ptables']) if data['ptables'] else {'id': None, 'name': None})
+        _ref(host, 'medium', data['media'][0])
+        _ref(host, 'organization', rnd.choice(data['organizations']))
+        _ref(host, 'location', rnd.choice(data['locations']))
+        host_list.append(host)
+    data['hosts'] = host_list
+
+    images = []
+    for cr in crs:
+        for n in range(images_per_compute_resource):
+            images.append({'id': len(images) + 1, 'name': 'image{0}'.format(n), 'compute_resource_id': cr['id'],
+                           'compute_resource_name': cr['name'], 'uuid': 'img-{0}-{1}'.format(cr['id'], n),
+                           'username': 'root', 'operatingsystem_id': oses[0]['id'],
+                           'architecture_id': 1, 'created_at': TIMESTAMP, 'updated_at': TIMESTAMP})
+    data['images'] = images
+    data['compute_attributes'] = []
+    data['os_default_templates'] = []
+    return data
+
+
+class MockForemanError(Exception):
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+        super(MockForemanError, self).__init__(status_code)
+
+
+def _error(status_code, message):
+    return MockForemanError(status_code, {'error': {'message': message}})
+
+
+def _not_found(path):
+    return MockForemanError(404, {'message': 'Resource {0} not found'.format(path)})
+
+
+def _unquote(value):
+    if value.startswith('"') and value.endswith('"'):
+        return value[1:-1].replace('\\"', '"')
+    return value
+
+
+def _compare(actual, op, expected):
+    if actual is None:
+        return op == '!='
+    if isinstance(actual, bool):
+        actual = str(actual).lower()
+    elif isinstance(actual, (int, float)) and op in ('>', '<', '>=', '<=', '==', '=', '!='):
+        try:
+            expected = type(actual)(expected)
+        except ValueError:
+            actual = str(actual)
+    else:
+        actual = str(actual)
+    if op in ('==', '='):
+        return actual == expected
+    if op == '!=':
+        return actual != expected
+    if op == '~':
+        return str(expected).lower() in str(actual).lower()
+    if op == '>':
+        return actual > expected
+    if op == '<':
+        return actual < expected
+    if op == '>=':
+        return actual >= expected
+    return actual <= expected
+
+
+def parse_search(search):
+    """Parse a scoped search string of ``key op value`` terms joined by AND
+
+    Returns:
+      list of (key, operator, value) tuples
+    """
+    terms = []
+    if not search:
+        return terms
+    for part in re.split(r'\s+and\s+', search.strip(), flags=re.IGNORECASE):
+        match = SEARCH_RE.match(part)
+        if not match:
+            raise _error(422, 'Invalid search query: {0}'.format(search))
+        terms.append((match.group(1), match.group(2), _unquote(match.group(3))))
+    return terms
+
+
+def match_search(item, terms):
+    for key, op, value in terms:
+        for candidate in (key, key + '_title', key + '_name', key.replace('.', '_')):
+            if candidate in item:
+                break
+        else:
+            return False
+        if not _compare(item.get(candidate), op, value):
+            return False
+    return True
+
+
+class MockForeman(object):
+    """In-process Foreman API v2 server
+
+    Args:
+      dataset (dict): Resources to serve, see :func:`generate_dataset`
+      host (str): Address to bind to
+      port (int): Port to bind to, 0 picks a free one
+      username (str): If set, requests must authenticate with this user
+      password (str): Password of username
+      latency (float): Seconds to sleep before answering each request
+      latency_jitter (float): Additional random delay of up to this many seconds
+      error_rate (float): Fraction of requests answered with error_status
+      error_status (int): HTTP status code of injected errors
+      seed (int): Seed of the random generator used for jitter and errors
+      compress (bool): gzip responses of at least 1 KiB to clients accepting
+          it. gzip compressed request bodies are always accepted.
+    """
+
+    def __init__(self, dataset=None, host='127.0.0.1', port=0, username=None, password=None,
+                 latency=0.0, latency_jitter=0.0, error_rate=0.0, error_status=500, seed=0, compress=False):
+        self.dataset = dataset if dataset is not None else generate_dataset()
+        self.address = host
+        self.requested_port = port
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.compress = compress
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._index = {}
+        self._next_id = {}
+        self._server = None
+        self._thread = None
+        self.reset_stats()
+        self._build_index()
+
+    def _build_index(self):
+        for resource_type, items in self.dataset.items():
+            self._index[resource_type] = dict((item['id'], item) for item in items)
+            self._next_id[resource_type] = max([item['id'] for item in items] or [0]) + 1
+
+    def reset_stats(self):
+        """Reset the request counters"""
+        self.request_count = 0
+        self.bytes_sent = 0
+        self.requests_by_method = {}
+        self.injected_errors = 0
+        self.compressed_requests = 0
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    @property
+    def url(self):
+        return 'http://{0}:{1}'.format(self.address, self.port)
+
+    def client(self, **kwargs):
+        """Return a Foreman client talking to this server"""
+        from foreman.foreman import Foreman
+        return Foreman(self.address, self.port, self.username or 'admin', self.password or 'changeme',
+                       protocol='http', **kwargs)
+
+    def start(self):
+        self._server = _ThreadingHTTPServer((self.address, self.requested_port), _Handler)
+        self._server.mock = self
+        self._thread = threading.Thread(target=self._server.serve_forever, kwargs={'poll_interval': 0.05},
+                                        name='mock-foreman')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def serve_forever(self):
+        self._server = _ThreadingHTTPServer((self.address, self.requested_port), _Handler)
+        self._server.mock = self
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _inject(self):
+        delay = self.latency
+        with self._lock:
+            if self.latency_jitter:
+                delay += self._random.random() * self.latency_jitter
+            fail = self.error_rate and self._random.random() < self.error_rate
+            if fail:
+                self.injected_errors += 1
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise _error(self.error_status, 'Injected error')
+
+    def _check_auth(self, header):
+        if self.username is None:
+            return
+        expected = 'Basic ' + base64.b64encode(
+            '{0}:{1}'.format(self.username, self.password).encode('utf-8')).decode('ascii')
+        if header != expected:
+            raise _error(401, 'Unable to authenticate user {0}'.format(self.username))
+
+    def _find(self, resource_type, resource_id, path):
+        index = self._index.get(resource_type)
+        if index is None:
+            raise _not_found(path)
+        try:
+            item = index.get(int(resource_id))
+        except ValueError:
+            item = None
+            for candidate in index.values():
+                if candidate.get('name') == resource_id:
+                    item = candidate
+                    break
+        if item is None:
+            raise _not_found(path)
+        return item
+
+    def _list(self, items, params):
+        terms = parse_search(params.get('search'))
+        if terms:
+            items = [item for item in items if match_search(item, terms)]
+        for scope in ('organization_id', 'location_id'):
+            if params.get(scope):
+                items = [item for item in items
+                         if scope not in item or str(item.get(scope)) == str(params[scope])]
+        page = int(params.get('page') or 1)
+        per_page = int(params.get('per_page') or 20)
+        start = (page - 1) * per_page
+        results = [dict((k, v) for k, v in item.items() if k not in DETAIL_ONLY_KEYS)
+                   for item in items[start:start + per_page]]
+        return {
+            'total': len(items),
+            'subtotal': len(items),
+            'page': page,
+            'per_page': per_page,
+            'search': params.get('search'),
+            'sort': {'by': None, 'order': None},
+            'results': results,
+        }
+
+    def _validate_new(self, resource_type, data):
+        name = data.get('name')
+        if name is not None:
+            for item in self._index.get(resource_type, {}).values():
+                if item.get('name') == name:
+                    raise MockForemanError(422, {'error': {
+                        'id': None,
+                        'errors': {'name': ['has already been taken']},
+                        'full_messages': ['Name has already been taken']}})
+
+    def _create(self, resource_type, body, parent=None):
+        singular = SINGULAR.get(resource_type, resource_type)
+        data = dict(body.get(singular) or {})
+        for key, value in body.items():
+            if key != singular and not isinstance(value, dict):
+                data[key] = value
+        if parent is None:
+            self._validate_new(resource_type, data)
+        items = self.dataset.setdefault(resource_type, [])
+        index = self._index.setdefault(resource_type, {})
+        item_id = self._next_id.get(resource_type, 1)
+        self._next_id[resource_type] = item_id + 1
+        data['id'] = item_id
+        data.setdefault('created_at', TIMESTAMP)
+        data['updated_at'] = TIMESTAMP
+        for key, value in list(data.items()):
+            if key.endswith('_id') and value is not None and key[:-3] + 's' in self._index:
+                target = self._index[key[:-3] + 's'].get(value)
+                if target is not None:
+                    data[key[:-3] + '_name'] = target.get('name')
+        if parent is not None:
+            parent.setdefault(resource_type, []).append(data)
+        else:
+            items.append(data)
+            index[item_id] = data
+        return data
+
+    def _update(self, item, resource_type, body):
+        singular = SINGULAR.get(resource_type, resource_type)
+        data = body.get(singular) if isinstance(body.get(singular), dict) else body
+        item.update(data)
+        item['updated_at'] = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        return item
+
+    def _delete(self, resource_type, item):
+        self.dataset[resource_type].remove(item)
+        del self._index[resource_type][item['id']]
+        return item
+
+    def _component(self, method, resource_type, item, component, component_id, body, params, path):
+        if component == 'power':
+            action = body.get('power_action')
+            if action == 'state':
+                return {'power': 'on' if item.get('power', 'on') == 'on' else 'off'}
+            item['power'] = 'off' if action == 'stop' else 'on'
+            return {'power': True}
+        if component == 'images':
+            children = [image for image in self.dataset.get('images', [])
+                        if image.get('compute_resource_id') == item['id']]
+        else:
+            children = item.setdefault(component, [])
+        if component_id is None:
+            if method == 'GET':
+                return self._list(children, params)
+            if method == 'POST':
+                if component == 'images':
+                    body = dict(body)
+                    body['compute_resource_id'] = item['id']
+                    return self._create('images', body)
+                return self._create(component, body, parent=item)
+            raise _error(405, 'Method not allowed')
+        for child in children:
+            if str(child.get('id')) == str(component_id) or child.get('name') == component_id:
+                break
+        else:
+            raise _not_found(path)
+        if method == 'GET':
+            return child
+        if method == 'PUT':
+            return self._update(child, component, body)
+        if method == 'DELETE':
+            children.remove(child)
+            return child
+        raise _error(405, 'Method not allowed')
+
+    def handle(self, method, path, params, body, auth=None):
+        """Answer one API request
+
+        Returns:
+          tuple of (status code, decoded response body)
+        """
+        try:
+            self._check_auth(auth)
+            self._inject()
+            if path.rstrip('/') == STATUS_PATH and method == 'GET':
+                return 200, {'result': 'ok', 'status': 200, 'version': '1.7.3', 'api_version': 2}
+            if not path.startswith(API_PREFIX):
+                raise _not_found(path)
+            parts = [part for part in path[len(API_PREFIX):].split('/') if part]
+            if not parts:
+                raise _not_found(path)
+            with self._lock:
+                return self._dispatch(method, parts, params, body, path)
+        except MockForemanError as e:
+            return e.status_code, e.body
+
+    def _dispatch(self, method, parts, params, body, path):
+        resource_type = parts[0]
+        if resource_type not in self._index and not (method == 'POST' and resource_type in SINGULAR):
+            raise _not_found(path)
+        if len(parts) == 1:
+            if method == 'GET':
+                return 200, self._list(self.dataset.get(resource_type, []), params)
+            if method == 'POST':
+                return 201, self._create(resource_type, body)
+            raise _error(405, 'Method not allowed')
+        item = self._find(resource_type, parts[1], path)
+        if len(parts) == 2:
+            if method == 'GET':
+                return 200, item
+            if method == 'PUT':
+                return 200, self._update(item, resource_type, body)
+            if method == 'DELETE':
+                return 200, self._delete(resource_type, item)
+            raise _error(405, 'Method not allowed')
+        status = 201 if method == 'POST' else 200
+        component_id = parts[3] if len(parts) > 3 else None
+        return status, self._component(method, resource_type, item, parts[2], component_id, body, params, path)
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        # Clients that timed out close the connection before the answer
+        if isinstance(sys.exc_info()[1], socket.error):
+            return
+        HTTPServer.handle_error(self, request, client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, with Nagle's algorithm a
+    # reused connection waits for the delayed ACK in between
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        if body and self.headers.get('Content-Encoding') == 'gzip':
+            body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+            with self.server.mock._lock:
+                self.server.mock.compressed_requests += 1
+        return body
+
+    def _params(self, query, raw_body):
+        params = dict(parse_qsl(query, keep_blank_values=True))
+        content_type = self.headers.get('Content-Type') or ''
+        if raw_body and 'json' not in content_type:
+            # requests sends the data of GET requests form encoded in the body
+            params.update(parse_qsl(raw_body.decode('utf-8'), keep_blank_values=True))
+        return params
+
+    def _handle(self, method):
+        mock = self.server.mock
+        parsed = urlparse(self.path)
+        raw_body = self._read_body()
+        params = self._params(parsed.query, raw_body)
+        body = {}
+        if raw_body and 'json' in (self.headers.get('Content-Type') or ''):
+            body = json.loads(raw_body.decode('utf-8'))
+        status, data = mock.handle(method, parsed.path, params, body, auth=self.headers.get('Authorization'))
+        payload = json.dumps(data).encode('utf-8')
+        compressed = (mock.compress and len(payload) >= 1024 and
+                      'gzip' in (self.headers.get('Accept-Encoding') or ''))
+        if compressed:
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            payload = compressor.compress(payload) + compressor.flush()
+        with mock._lock:
+            mock.request_count += 1
+            mock.bytes_sent += len(payload)
+            mock.requests_by_method[method] = mock.requests_by_method.get(method, 0) + 1
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        if compressed:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Serve a synthetic Foreman API v2')
+    parser.add_argument('--address', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=3000)
+    parser.add_argument('--hosts', type=int, default=1000)
+    parser.add_argument('--hostgroups', type=int, default=50)
+    parser.add_argument('--subnets', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--latency-jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--compress', action='store_true', help='gzip responses')
+    args = parser.parse_args(argv)
+    dataset = generate_dataset(hosts=args.hosts, hostgroups=args.hostgroups, subnets=args.subnets, seed=args.seed)
+    server = MockForeman(dataset=dataset, host=args.address, port=args.port, latency=args.latency,
+                         latency_jitter=args.latency_jitter, error_rate=args.error_rate, seed=args.seed,
+                         compress=args.compress)
+    print('Serving Foreman API v2 mock on http://{0}:{1}'.format(args.address, args.port))
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+import json
+import os
+import pstats
+import runpy
+import shutil
+import tempfile
+import unittest
+
+from foreman.backup import MANIFEST_FILE, STAGES, diff_backups, diff_live, merge_backups, structural_diff
+from mockserver import MockForeman, generate_dataset
+
+BACKUP_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin', 'backup_foreman')
+
+
+class BackupTestCase(unittest.TestCase):
+    def setUp(self):
+        self.script = runpy.run_path(BACKUP_SCRIPT, run_name='backup_foreman')
+        self.server = MockForeman(dataset=generate_dataset(hosts=20, hostgroups=4)).start()
+        self.directory = tempfile.mkdtemp(prefix='foreman-backup-')
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    def backup(self, backup_class='ForemanBackup', **kwargs):
+        backup = self.script[backup_class](hostname='127.0.0.1', port=self.server.port, username='admin',
+                                           password='changeme', backup_dir=os.path.join(self.directory, 'backup'),
+                                           **kwargs)
+        backup.foreman = self.server.client()
+        return backup
+
+    def read_tree(self, directory):
+        tree = {}
+        for root, _, files in os.walk(directory):
+            for name in files:
+                with open(os.path.join(root, name), 'rb') as f:
+                    tree[os.path.relpath(os.path.join(root, name), directory)] = f.read()
+        return tree
+
+
+class BackupStatsTest(BackupTestCase):
+    def test_stats(self):
+        stats_file = os.path.join(self.directory, 'stats.json')
+        profile_file = os.path.join(self.directory, 'backup.prof')
+        self.backup(stats_file=stats_file, profile_file=profile_file).run()
+        with open(stats_file) as f:
+            report = json.load(f)
+        self.assertEqual(report['requests'], self.server.request_count)
+        self.assertEqual(report['bytes_received'], self.server.bytes_sent)
+        hosts = report['resource_types']['hosts']
+        self.assertEqual(hosts['items'], 20)
+        self.assertEqual(hosts['requests'], 21)
+        self.assertEqual(sorted(hosts['stages']), sorted(STAGES))
+        self.assertGreater(hosts['stages']['detail'], 0)
+        self.assertGreater(hosts['items_per_s'], 0)
+        self.assertEqual(len(os.listdir(os.path.join(self.directory, 'backup', 'hosts'))), 20)
+        self.assertTrue(pstats.Stats(profile_file).total_calls)
+
+    def test_ansible_stats(self):
+        stats_file = os.path.join(self.directory, 'stats.json')
+        self.backup('AnsibleBackup', stats_file=stats_file).run()
+        with open(stats_file) as f:
+            report = json.load(f)
+        self.assertGreater(report['resource_types']['hosts']['stages']['clear'], 0)
+        with open(os.path.join(self.directory, 'backup', 'hosts')) as f:
+            self.assertTrue(f.read().startswith('---\nforeman_hosts:\n'))
+
+
+class BackupWorkersTest(BackupTestCase):
+    def test_workers(self):
+        self.server.stop()
+        self.server = MockForeman(dataset=generate_dataset(hosts=150, hostgroups=4)).start()
+        for backup_class in ('ForemanBackup', 'AnsibleBackup'):
+            trees = []
+            for workers in (0, 2):
+                backup = self.backup(backup_class, workers=workers)
+                backup.backup_dir = os.path.join(self.directory, '{0}-{1}'.format(backup_class, workers))
+                backup.run()
+                trees.append(self.read_tree(backup.backup_dir))
+            self.assertEqual(trees[0], trees[1])
+            self.assertGreaterEqual(len(trees[0]), 16)
+
+    def test_batches_streamed(self):
+        self.server.stop()
+        self.server = MockForeman(dataset=generate_dataset(hosts=150, hostgroups=4)).start()
+        backup = self.backup()
+        events = []
+        get_resource, written = backup.get_resource, backup.written
+
+        def record_detail(type, id):
+            events.append('detail')
+            return get_resource(type=type, id=id)
+
+        def record_written(type, result):
+            events.append('written')
+            written(type, result)
+        backup.get_resource, backup.written = record_detail, record_written
+        backup.backup(resource_type='hosts', resource_function=backup.foreman.get_hosts)
+        # The first batch is written before the remaining details are fetched
+        self.assertEqual(events, ['detail'] * 100 + ['written'] + ['detail'] * 50 + ['written'])
+
+
+class BackupShardTest(BackupTestCase):
+    def test_shards(self):
+        self.server.stop()
+        dataset = generate_dataset(hosts=30, hostgroups=4, organizations=3)
+        dataset['hosts'][4]['organization_id'] = None
+        self.server = MockForeman(dataset=dataset).start()
+        full = self.backup(katello_support=True)
+        full.run()
+        shards = []
+        for index in range(2):
+            backup = self.backup(katello_support=True, shard=(index, 2))
+            backup.backup_dir = os.path.join(self.directory, 'shard{0}'.format(index))
+            backup.run()
+            shards.append(backup.backup_dir)
+        self.assertEqual(sorted(os.listdir(shards[1])), ['hosts', MANIFEST_FILE])
+        merged = os.path.join(self.directory, 'merged')
+        self.assertEqual(merge_backups(merged, shards), [])
+        self.assertEqual(self.read_tree(merged), self.read_tree(full.backup_dir))
+        self.assertFalse(diff_backups(full.backup_dir, merged))
+
+
+class BackupDiffTest(BackupTestCase):
+    def test_diff(self):
+        old = os.path.join(self.directory, 'backup')
+        self.backup().run()
+        self.assertTrue(os.path.exists(os.path.join(old, MANIFEST_FILE)))
+        foreman = self.server.client()
+        hosts = foreman.get_hosts()
+        foreman.update_host(id=hosts[0]['id'], data={'host': {'ip': '192.0.2.1'}})
+        foreman.delete_host(id=hosts[1]['id'])
+        foreman.create_host(data={'name': 'new.example.com'})
+
+        report = diff_live(old, foreman, resource_types=['hosts', 'domains'])
+        changes = dict((path, (before, after)) for path, before, after in report.changed['hosts'][hosts[0]['name']])
+        self.assertEqual(changes['ip'], (hosts[0]['ip'], '192.0.2.1'))
+        self.assertEqual(report.added, {'hosts': ['new.example.com']})
+        self.assertEqual(report.removed, {'hosts': [hosts[1]['name']]})
+        self.assertEqual(report.loaded, 1)
+
+        new = os.path.join(self.directory, 'new')
+        backup = self.backup()
+        backup.backup_dir = new
+        backup.run()
+        report = diff_backups(old, new)
+        self.assertEqual(list(report.changed['hosts']), [hosts[0]['name']])
+        self.assertEqual(report.loaded, 1)
+        self.assertIn('+ new.example.com', report.format())
+        self.assertFalse(diff_backups(old, old))
+
+    def test_structural_diff(self):
+        old = {'name': 'a', 'interfaces': [{'id': 1, 'ip': '10.0.0.1'}, {'id': 2, 'ip': '10.0.0.2'}],
+               'tags': ['x', 'y']}
+        new = {'name': 'a', 'interfaces': [{'id': 2, 'ip': '10.0.0.3'}], 'tags': ['x'], 'comment': 'c'}
+        self.assertEqual(structural_diff(old, new), [
+            ('comment', None, 'c'),
+            ('interfaces[id=1]', {'id': 1, 'ip': '10.0.0.1'}, None),
+            ('interfaces[id=2].ip', '10.0.0.2', '10.0.0.3'),
+            ('tags[1]', 'y', None),
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+import time
+import unittest
+
+from foreman.balancer import CLOSED, LATENCY, OPEN, LoadBalancer, NoEndpointAvailable
+from foreman.deadline import Deadline
+from foreman.foreman import ForemanError, ForemanTimeoutError
+from mockserver import MockForeman, generate_dataset
+from foreman.transport import RequestsTransport, TransportTimeout
+
+
+class ConnectTimeoutTransport(RequestsTransport):
+    """Transport whose first connection times out"""
+
+    def __init__(self):
+        super(ConnectTimeoutTransport, self).__init__()
+        self.failed = False
+
+    def request(self, method, url, **kwargs):
+        if not self.failed:
+            self.failed = True
+            raise TransportTimeout('Connect timed out', connect=True)
+        return super(ConnectTimeoutTransport, self).request(method, url, **kwargs)
+
+
+class LoadBalancerTest(unittest.TestCase):
+    def setUp(self):
+        self.servers = [MockForeman(dataset=generate_dataset(hosts=5)).start() for _ in range(3)]
+
+    def tearDown(self):
+        for server in self.servers:
+            server.stop()
+
+    def client(self, **kwargs):
+        self.balancer = LoadBalancer(['http://127.0.0.1:{0}'.format(server.port) for server in self.servers],
+                                     **kwargs)
+        return self.servers[0].client(transport=self.balancer)
+
+    def states(self):
+        return [endpoint['state'] for endpoint in self.balancer.stats()]
+
+    def test_spread(self):
+        foreman = self.client()
+        for _ in range(30):
+            self.assertEqual(len(foreman.get_domains()), 3)
+        self.assertEqual([server.request_count for server in self.servers], [10, 10, 10])
+
+    def test_latency_strategy(self):
+        self.servers[1].latency = 0.02
+        foreman = self.client(strategy=LATENCY)
+        for _ in range(30):
+            foreman.get_domains()
+        self.assertLess(self.servers[1].request_count, 3)
+
+    def test_circuit_breaker(self):
+        self.servers[1].error_rate = 1.0
+        self.servers[1].error_status = 503
+        foreman = self.client(failure_threshold=2, reset_timeout=60)
+        for _ in range(30):
+            # Failed GETs are retried on another endpoint
+            self.assertEqual(len(foreman.get_domains()), 3)
+        self.assertEqual(self.servers[1].request_count, 2)
+        self.assertEqual(self.states(), [CLOSED, OPEN, CLOSED])
+
+        # Writes are not retried
+        self.servers[0].error_rate = 1.0
+        self.servers[0].error_status = 503
+        self.balancer._next = 2
+        self.assertRaises(ForemanError, foreman.create_domain, data={'name': 'new.example.com'})
+
+        # After reset_timeout one probe is sent, its failure opens the breaker again
+        self.servers[0].error_rate = 0.0
+        self.balancer.endpoints[1].opened_at -= 60
+        for _ in range(5):
+            foreman.get_domains()
+        self.assertEqual(self.servers[1].request_count, 3)
+        self.assertEqual(self.states()[1], OPEN)
+
+        # A passing health check closes it
+        self.servers[1].error_rate = 0.0
+        self.assertEqual(self.balancer.check_health(), dict((e.url, True) for e in self.balancer.endpoints))
+        self.assertEqual(self.states(), [CLOSED, CLOSED, CLOSED])
+
+    def test_endpoint_down(self):
+        foreman = self.client(failure_threshold=1)
+        self.servers[2].stop()
+        for _ in range(10):
+            self.assertEqual(len(foreman.get_domains()), 3)
+        self.assertEqual(self.states(), [CLOSED, CLOSED, OPEN])
+        self.assertEqual(list(self.balancer.check_health().values()).count(False), 1)
+
+        balancer = LoadBalancer([self.balancer.endpoints[2].url])
+        self.assertEqual(balancer.check_health(), {balancer.endpoints[0].url: False})
+        self.assertRaises(NoEndpointAvailable, self.servers[0].client(transport=balancer).get_domains)
+
+    def test_stream_outstanding(self):
+        foreman = self.client()
+        hosts = foreman.get_resources(resource_type='hosts', stream=True)
+        next(hosts)
+        # The body is still being read
+        self.assertEqual(sorted(endpoint['outstanding'] for endpoint in self.balancer.stats()), [0, 0, 1])
+        foreman.get_domains()
+        foreman.get_domains()
+        # The endpoint streaming is skipped while the others are free
+        self.assertEqual(sorted(server.request_count for server in self.servers), [1, 1, 1])
+        self.assertEqual(len(list(hosts)), 4)
+        self.assertEqual([endpoint['outstanding'] for endpoint in self.balancer.stats()], [0, 0, 0])
+
+    def test_timeout_failover(self):
+        self.servers[0].latency = 0.5
+        self.client(retries=2)
+        foreman = self.servers[0].client(transport=self.balancer, timeout=0.2)
+        self.balancer._next = 2
+        start = time.time()
+        self.assertEqual(len(foreman.get_domains()), 3)
+        self.assertLess(time.time() - start, 0.5)
+        self.assertEqual(self.states()[0], CLOSED)
+        self.assertEqual(self.balancer.endpoints[0].errors, 1)
+
+        # Writes that may have been sent are not retried
+        self.balancer._next = 2
+        self.assertRaises(ForemanTimeoutError, foreman.create_domain, data={'name': 'new.example.com'})
+
+        # Retries stay within the deadline
+        for server in self.servers:
+            server.latency = 0.5
+        with Deadline(0.3):
+            start = time.time()
+            self.assertRaises(ForemanTimeoutError, foreman.get_domains)
+        self.assertLess(time.time() - start, 0.45)
+
+    def test_connect_timeout_failover(self):
+        self.balancer = LoadBalancer(['http://127.0.0.1:{0}'.format(server.port) for server in self.servers],
+                                     transport=ConnectTimeoutTransport())
+        foreman = self.servers[0].client(transport=self.balancer)
+        # The request was never sent, so even a create is retried
+        foreman.create_domain(data={'name': 'new.example.com'})
+        self.assertEqual(sum(server.requests_by_method.get('POST', 0) for server in self.servers), 1)
+
+    def test_health_check_auth(self):
+        for server in self.servers:
+            server.username, server.password = 'admin', 'secret'
+        foreman = self.client()
+        seen = []
+        handle = self.servers[0].handle
+
+        def record(method, path, params, body, auth=None):
+            seen.append(auth)
+            return handle(method, path, params, body, auth=auth)
+        self.servers[0].handle = record
+
+        # Rejected credentials still mean the endpoint is up
+        self.assertTrue(all(self.balancer.check_health().values()))
+        self.assertEqual(seen, [None])
+        foreman.get_domains()
+        del seen[:]
+        self.balancer.check_health()
+        self.assertEqual(len(seen), 1)
+        self.assertTrue(seen[0].startswith('Basic '))
+        self.assertEqual(self.states(), [CLOSED, CLOSED, CLOSED])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import time
+import unittest
+
+from foreman.bulk import CREATED, FAILED, INVALID, ROLLBACK, ROLLED_BACK, BulkProvisioner
+from foreman.foreman import ForemanError
+from mockserver import MockForeman, generate_dataset
+
+
+def definitions(count, **extra):
+    for i in range(count):
+        definition = {'name': 'node{0:03d}.example.com'.format(i), 'hostgroup': 'hg1', 'domain': 'domain1.example.com',
+                      'subnet': 'net1', 'compute_profile_id': 1}
+        definition.update(extra)
+        yield definition
+
+
+class BulkProvisionerTest(unittest.TestCase):
+    def setUp(self):
+        self.server = MockForeman(dataset=generate_dataset(hosts=0)).start()
+        self.foreman = self.server.client()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_provision(self):
+        result = BulkProvisioner(self.foreman, max_workers=4).provision(definitions(20))
+        self.assertTrue(result.succeeded)
+        self.assertEqual(len(self.server.dataset['hosts']), 20)
+        self.assertEqual(result[0].host['hostgroup_id'], 1)
+        self.assertEqual(result.summary()[CREATED], 20)
+        # Lookups are fetched once, not per host
+        self.assertEqual(self.server.requests_by_method['GET'], 4)
+
+    def test_invalid_references(self):
+        hosts = list(definitions(3)) + [{'name': 'bad.example.com', 'hostgroup': 'missing', 'subnet_id': 99}]
+        result = BulkProvisioner(self.foreman).provision(hosts)
+        self.assertEqual(len(result.with_status(CREATED)), 3)
+        self.assertEqual(result[3].status, INVALID)
+        self.assertIn("hostgroup 'missing'", str(result[3].error))
+        self.assertIn('subnet_id 99', str(result[3].error))
+
+    def test_rollback_sends_nothing_if_invalid(self):
+        hosts = list(definitions(3)) + [{'name': 'bad.example.com', 'domain': 'missing'}]
+        result = BulkProvisioner(self.foreman, on_error=ROLLBACK).provision(hosts)
+        self.assertNotIn('POST', self.server.requests_by_method)
+        self.assertFalse(result.succeeded)
+
+    def test_rollback_on_failure(self):
+        hosts = list(definitions(5)) + list(definitions(1))
+        result = BulkProvisioner(self.foreman, max_workers=1, on_error=ROLLBACK).provision(hosts)
+        self.assertTrue(result.rolled_back)
+        self.assertEqual(result[5].status, FAILED)
+        self.assertEqual(len(result.with_status(ROLLED_BACK)), 5)
+        self.assertEqual(self.server.dataset['hosts'], [])
+
+    def test_retry(self):
+        provisioner = BulkProvisioner(self.foreman, max_workers=2, retries=10, retry_delay=0.001)
+        provisioner.resolve(next(definitions(1)))
+        self.server.error_rate = 0.5
+        result = provisioner.provision(definitions(10))
+        self.assertTrue(result.succeeded)
+        self.assertGreater(sum(r.attempts for r in result), 10)
+
+
+    def slow_posts(self, delay, before=True):
+        """Delay POST requests before or after the host is created"""
+        handle = self.server.handle
+
+        def slow(method, *args, **kwargs):
+            if method == 'POST' and before:
+                time.sleep(delay)
+            result = handle(method, *args, **kwargs)
+            if method == 'POST' and not before:
+                time.sleep(delay)
+            return result
+        self.server.handle = slow
+
+    def test_timed_out_create_is_looked_up(self):
+        foreman = self.server.client(timeout=0.1)
+        provisioner = BulkProvisioner(foreman, retries=1, retry_delay=0.3)
+        provisioner.resolve(next(definitions(1)))
+        # The first create finishes on the server after the client gave up
+        self.slow_posts(0.3)
+        result = provisioner.provision(definitions(1))
+        self.assertEqual(result[0].status, CREATED)
+        self.assertEqual(result[0].attempts, 2)
+        self.assertEqual(len(self.server.dataset['hosts']), 1)
+
+    def test_rollback_of_uncertain_create(self):
+        foreman = self.server.client(timeout=0.1)
+        provisioner = BulkProvisioner(foreman, max_workers=1, on_error=ROLLBACK)
+        provisioner.resolve(next(definitions(1)))
+        self.slow_posts(0.2, before=False)
+        find = provisioner._find
+        lookups = []
+
+        def failing_find(name):
+            lookups.append(name)
+            if len(lookups) == 1:
+                raise ForemanError('url', 503, 'unavailable')
+            return find(name)
+        provisioner._find = failing_find
+        result = provisioner.provision(definitions(1))
+        self.assertTrue(result.rolled_back)
+        self.assertEqual(result[0].status, ROLLED_BACK)
+        self.assertEqual(self.server.dataset['hosts'], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
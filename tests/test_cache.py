@@ -0,0 +1,139 @@
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+
+from foreman.cache import DiskCache
+from foreman.foreman import Foreman
+from mockserver import MockForeman, generate_dataset
+
+
+def _list_domains(path, port, queue):
+    foreman = Foreman('127.0.0.1', port, 'admin', 'changeme', protocol='http', cache=DiskCache(path))
+    queue.put([domain['name'] for domain in foreman.get_domains()])
+
+
+class DiskCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_ttl(self):
+        cache = DiskCache(self.path, default_ttl=60, ttls={'hosts': 0})
+        cache.set('a', 'domains', {'results': [1]})
+        cache.set('b', 'hosts', {'results': [2]})
+        self.assertEqual(cache.get('a'), {'results': [1]})
+        self.assertIsNone(cache.get('b'))
+        cache._db.execute('UPDATE entries SET expires_at = 0')
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 2, 'errors': 0})
+
+    def test_eviction(self):
+        cache = DiskCache(self.path, max_size=250, touch_interval=0)
+        for key in 'abc':
+            cache.set(key, 'domains', {'results': ['x' * 80]})
+            cache.get('a')
+        # b was read least recently
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('c'))
+        self.assertLessEqual(cache.size()[1], 250)
+
+    def test_touch_interval(self):
+        cache = DiskCache(self.path, touch_interval=60)
+        cache.set('a', 'domains', {'results': [1]})
+        cache._db.execute('UPDATE entries SET accessed_at = 100')
+        cache._db.commit()
+        cache.get('a')
+        self.assertGreater(cache._db.execute('SELECT accessed_at FROM entries').fetchone()[0], 100)
+        # Read recently enough, the access time is left alone
+        cache._db.execute('UPDATE entries SET accessed_at = ?', (time.time() - 1,))
+        cache._db.commit()
+        before = cache._db.execute('SELECT accessed_at FROM entries').fetchone()[0]
+        cache.get('a')
+        self.assertEqual(cache._db.execute('SELECT accessed_at FROM entries').fetchone()[0], before)
+
+    def test_locked(self):
+        cache = DiskCache(self.path, timeout=0.05, touch_interval=0)
+        cache.set('a', 'domains', {'results': [1]})
+        other = sqlite3.connect(self.path)
+        other.execute('BEGIN EXCLUSIVE')
+        try:
+            # Reads go on while another process writes, failed writes are skipped
+            self.assertEqual(cache.get('a'), {'results': [1]})
+            cache.set('b', 'domains', {'results': [2]})
+        finally:
+            other.rollback()
+            other.close()
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1, 'errors': 2})
+        cache._db.close()
+        # A closed or broken database is a miss
+        self.assertIsNone(cache.get('a'))
+        cache.set('a', 'domains', {'results': [1]})
+        self.assertEqual(cache.stats()['errors'], 4)
+
+
+class ClientCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.server = MockForeman(dataset=generate_dataset(hosts=5)).start()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache.db')
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    def client(self):
+        return self.server.client(cache=DiskCache(self.path))
+
+    def test_shared_between_clients(self):
+        self.assertEqual(len(self.client().get_domains()), 3)
+        self.assertEqual(len(self.client().get_domains()), 3)
+        self.assertEqual(self.server.request_count, 1)
+
+    def test_shared_between_processes(self):
+        names = [domain['name'] for domain in self.client().get_domains()]
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_list_domains, args=(self.path, self.server.port, queue))
+        process.start()
+        self.assertEqual(queue.get(timeout=30), names)
+        process.join()
+        self.assertEqual(self.server.request_count, 1)
+
+    def test_writes_invalidate(self):
+        foreman = self.client()
+        domains = foreman.get_domains()
+        foreman.update_domain(id=domains[0]['id'], data={'domain': {'fullname': 'changed'}})
+        self.assertEqual(foreman.get_domains()[0]['fullname'], 'changed')
+        foreman.get_hosts()
+        foreman.create_domain(data={'name': 'new.example.com'})
+        self.server.reset_stats()
+        foreman.get_hosts()
+        self.assertEqual(self.server.request_count, 0)
+        self.assertEqual(len(foreman.get_domains()), 4)
+        self.assertEqual(self.server.request_count, 1)
+
+    def test_locked_during_write(self):
+        foreman = self.server.client(cache=DiskCache(self.path, timeout=0.05))
+        foreman.get_domains()
+        other = sqlite3.connect(self.path)
+        other.execute('BEGIN EXCLUSIVE')
+        try:
+            # The cache can not be invalidated, the create still succeeds
+            domain = foreman.create_domain(data={'name': 'new.example.com'})
+        finally:
+            other.rollback()
+            other.close()
+        self.assertEqual(domain['name'], 'new.example.com')
+        self.assertEqual(foreman.cache.stats()['errors'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
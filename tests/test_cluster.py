@@ -0,0 +1,79 @@
+import unittest
+
+from foreman.cluster import ClusterTimeoutError, ForemanCluster
+from foreman.foreman import ForemanError
+from mockserver import MockForeman, generate_dataset
+
+
+class ForemanClusterTest(unittest.TestCase):
+    def setUp(self):
+        self.servers = {
+            'eu': MockForeman(dataset=generate_dataset(hosts=10, seed=1)).start(),
+            'us': MockForeman(dataset=generate_dataset(hosts=20, seed=2)).start(),
+        }
+        self.cluster = ForemanCluster(dict((name, server.client()) for name, server in self.servers.items()),
+                                      timeout=5)
+
+    def tearDown(self):
+        self.cluster.close()
+        for server in self.servers.values():
+            server.stop()
+
+    def test_merge_and_tag(self):
+        hosts = self.cluster.get_hosts()
+        self.assertTrue(hosts.complete)
+        self.assertEqual(len(hosts), 30)
+        self.assertEqual(sum(1 for host in hosts if host['foreman_origin'] == 'eu'), 10)
+        self.assertEqual(sorted(hosts.timings), ['eu', 'us'])
+
+    def test_not_found_is_not_an_error(self):
+        self.servers['eu'].dataset['hosts'][0]['name'] = 'only-eu.example.com'
+        hosts = self.cluster.search_host({'name': 'only-eu.example.com'})
+        self.assertTrue(hosts.complete)
+        self.assertEqual([host['foreman_origin'] for host in hosts], ['eu'])
+        hosts = self.cluster.get_host(15)
+        self.assertTrue(hosts.complete)
+        self.assertEqual([host['foreman_origin'] for host in hosts], ['us'])
+
+    def test_partial_failure(self):
+        self.servers['us'].error_rate = 1.0
+        hosts = self.cluster.get_hosts()
+        self.assertFalse(hosts.complete)
+        self.assertEqual(len(hosts), 10)
+        self.assertIsInstance(hosts.errors['us'], ForemanError)
+
+    def test_timeout(self):
+        self.servers['us'].latency = 1.0
+        self.cluster.timeout = {'eu': 5, 'us': 0.1}
+        hosts = self.cluster.get_domains()
+        self.assertEqual(hosts.timed_out, ['us'])
+        self.assertIsInstance(hosts.errors['us'], ClusterTimeoutError)
+        self.assertEqual(set(host['foreman_origin'] for host in hosts), set(['eu']))
+
+    def test_only_reads_fan_out(self):
+        self.assertRaises(AttributeError, getattr, self.cluster, 'delete_host')
+        # Sends a PUT despite its name
+        self.assertRaises(AttributeError, getattr, self.cluster, 'get_host_power')
+
+    def test_iterators_are_consumed(self):
+        for server in self.servers.values():
+            server.dataset['compute_resources'][0]['compute_attributes'] = [
+                {'id': 1, 'compute_profile_id': 1}, {'id': 2, 'compute_profile_id': 2}]
+        # get_compute_attribute returns a lazy filter
+        attributes = self.cluster.get_compute_attribute(1, 1)
+        self.assertTrue(attributes.complete)
+        self.assertEqual(sorted((a['foreman_origin'], a['id']) for a in attributes), [('eu', 1), ('us', 1)])
+
+    def test_repeated_timeouts(self):
+        self.servers['us'].latency = 2.0
+        self.cluster.timeout = {'eu': 0.5, 'us': 0.1}
+        # Each hung call would keep a pool thread for 2s without a deadline,
+        # the calls to eu would then queue behind them
+        for _ in range(8):
+            hosts = self.cluster.get_domains()
+            self.assertEqual(sorted(hosts.errors), ['us'])
+            self.assertEqual(len(hosts), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
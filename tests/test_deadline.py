@@ -0,0 +1,98 @@
+import threading
+import time
+import unittest
+
+from foreman.bulk import CREATED, FAILED, ROLLBACK, SKIPPED, BulkProvisioner
+from foreman.deadline import Deadline, detached, propagate
+from foreman.foreman import ForemanError, ForemanTimeoutError
+from mockserver import MockForeman, generate_dataset
+
+
+class DeadlineTest(unittest.TestCase):
+    def test_nesting(self):
+        self.assertIsNone(Deadline.current())
+        with Deadline(0.05) as outer:
+            with Deadline(10) as inner:
+                self.assertIs(Deadline.current(), inner)
+                self.assertLessEqual(inner.remaining(), 0.05)
+                time.sleep(0.06)
+                self.assertTrue(inner.expired())
+            self.assertTrue(outer.expired())
+            with detached():
+                self.assertIsNone(Deadline.current())
+            self.assertIs(Deadline.current(), outer)
+        self.assertIsNone(Deadline.current())
+
+    def test_cancel_and_propagate(self):
+        seen = []
+        with Deadline() as deadline:
+            self.assertIsNone(deadline.remaining())
+            function = propagate(lambda: seen.append(Deadline.current()))
+            deadline.cancel()
+            self.assertEqual(deadline.remaining(), 0.0)
+        thread = threading.Thread(target=function)
+        thread.start()
+        thread.join()
+        self.assertEqual(seen, [deadline])
+
+
+class ForemanTimeoutTest(unittest.TestCase):
+    def setUp(self):
+        self.server = MockForeman(dataset=generate_dataset(hosts=30, hostgroups=2)).start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_read_timeout(self):
+        self.server.latency = 0.3
+        foreman = self.server.client(timeout=0.1)
+        with self.assertRaises(ForemanTimeoutError) as context:
+            foreman.get_hosts()
+        self.assertIsInstance(context.exception, ForemanError)
+        self.assertIsNone(context.exception.status_code)
+
+    def test_deadline_stops_pagination(self):
+        self.server.latency = 0.05
+        foreman = self.server.client()
+        seen = []
+        with self.assertRaises(ForemanTimeoutError):
+            with Deadline(0.12):
+                for host in foreman.iter_resources(resource_type='hosts', per_page=5):
+                    seen.append(host)
+        self.assertTrue(5 <= len(seen) < 30)
+        self.assertLess(self.server.request_count, 6)
+
+    def test_cancel_stops_pagination(self):
+        foreman = self.server.client()
+        with self.assertRaises(ForemanTimeoutError):
+            with Deadline() as deadline:
+                for _ in foreman.iter_resources(resource_type='hosts', per_page=5):
+                    deadline.cancel()
+        self.assertEqual(self.server.request_count, 1)
+
+    def test_stream_keeps_deadline(self):
+        foreman = self.server.client()
+        with Deadline(0.05):
+            hosts = foreman.get_resources(resource_type='hosts', stream=True)
+        time.sleep(0.06)
+        # Consumed outside the block, the stream still stops at its deadline
+        with self.assertRaises(ForemanTimeoutError):
+            list(hosts)
+
+    def test_bulk_deadline(self):
+        foreman = self.server.client()
+        provisioner = BulkProvisioner(foreman, max_workers=2, on_error=ROLLBACK)
+        hostgroup_id = foreman.get_hostgroups()[0]['id']
+        provisioner.resolve({'name': 'warmup', 'hostgroup_id': hostgroup_id})
+        self.server.latency = 0.05
+        with Deadline(0.08):
+            result = provisioner.provision({'name': 'node{0}'.format(i), 'hostgroup_id': hostgroup_id}
+                                           for i in range(20))
+        self.assertTrue(result.rolled_back)
+        self.assertTrue(result.with_status(SKIPPED))
+        self.assertFalse(result.with_status(CREATED))
+        self.assertTrue(any(isinstance(r.error, ForemanTimeoutError) for r in result.with_status(FAILED)))
+
+
+if __name__ == '__main__':
+    unittest.main()
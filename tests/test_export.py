@@ -0,0 +1,103 @@
+import csv
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from foreman import export
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+from foreman.foreman import HOSTS
+from mockserver import MockForeman, generate_dataset
+
+
+class ExportTest(unittest.TestCase):
+    fields = ['id', 'name', 'hostgroup_name']
+
+    def setUp(self):
+        self.server = MockForeman(dataset=generate_dataset(hosts=45)).start()
+        self.foreman = self.server.client()
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmp)
+
+    def test_iter_resources_pages(self):
+        hosts = list(self.foreman.iter_resources(resource_type=HOSTS, per_page=10))
+        self.assertEqual([host.get('id') for host in hosts], list(range(1, 46)))
+        self.assertEqual(self.server.requests_by_method['GET'], 5)
+
+    def test_export_columns(self):
+        columns = export.export_columns(self.foreman, HOSTS, self.fields, per_page=20)
+        self.assertEqual(sorted(columns), sorted(self.fields))
+        self.assertEqual(columns['id'], list(range(1, 46)))
+
+    def test_write_csv(self):
+        path = os.path.join(self.tmp, 'hosts.csv')
+        self.assertEqual(export.write_csv(self.foreman, HOSTS, self.fields, path, per_page=20), 45)
+        with open(path) as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], self.fields)
+        self.assertEqual(len(rows), 46)
+
+    def test_streams_pages(self):
+        calls = []
+        iter_resources = self.foreman.iter_resources
+
+        def record(**kwargs):
+            calls.append(kwargs)
+            return iter_resources(**kwargs)
+        self.foreman.iter_resources = record
+        self.assertEqual(export.export_columns(self.foreman, HOSTS, self.fields, per_page=20)['id'],
+                         list(range(1, 46)))
+        self.assertTrue(calls[0]['stream'])
+
+    def test_optional_imports(self):
+        root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+        output = subprocess.check_output(
+            [sys.executable, '-c', "import sys; from foreman import export; print(sorted(set(sys.modules) & "
+                                   "set(['numpy', 'pyarrow'])))"], cwd=root)
+        self.assertEqual(output.strip(), b'[]')
+
+    @unittest.skipIf(numpy is None, 'numpy not installed')
+    def test_to_numpy(self):
+        columns = export.to_numpy(self.foreman, HOSTS, self.fields, per_page=20)
+        self.assertEqual(columns['id'].shape, (45,))
+        self.assertEqual(int(columns['id'].sum()), sum(range(1, 46)))
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow not installed')
+    def test_write_parquet(self):
+        path = os.path.join(self.tmp, 'hosts.parquet')
+        self.assertEqual(export.write_parquet(self.foreman, HOSTS, self.fields, path, per_page=20), 45)
+        table = pyarrow.parquet.read_table(path)
+        self.assertEqual(table.num_rows, 45)
+        self.assertEqual(table.column_names, self.fields)
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow not installed')
+    def test_write_parquet_null_first_page(self):
+        for host in self.server.dataset['hosts']:
+            host['comment'] = None if host['id'] <= 20 else 'rack {0}'.format(host['id'])
+        path = os.path.join(self.tmp, 'hosts.parquet')
+        fields = ['id', 'comment']
+        self.assertEqual(export.write_parquet(self.foreman, HOSTS, fields, path, per_page=20), 45)
+        table = pyarrow.parquet.read_table(path)
+        self.assertEqual(table.num_rows, 45)
+        self.assertEqual(table.schema.field('comment').type, pyarrow.string())
+        self.assertEqual(table.column('comment').to_pylist()[19:21], [None, 'rack 21'])
+        self.assertEqual(export.to_arrow(self.foreman, HOSTS, fields, per_page=20).num_rows, 45)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+
+from foreman.hostgroups import HostgroupTree
+from mockserver import MockForeman, generate_dataset
+
+HOSTGROUPS = [
+    {'id': 1, 'name': 'base', 'title': 'base', 'parent_id': None, 'ancestry': None,
+     'domain_id': 1, 'domain_name': 'example.com', 'subnet_id': 1, 'subnet_name': 'lan',
+     'parameters': [{'name': 'ntp', 'value': 'ntp1'}, {'name': 'role', 'value': 'base'}]},
+    {'id': 2, 'name': 'web', 'title': 'base/web', 'ancestry': '1', 'subnet_id': 2, 'subnet_name': 'dmz',
+     'parameters': [{'name': 'role', 'value': 'web'}]},
+    {'id': 3, 'name': 'nginx', 'title': 'base/web/nginx', 'ancestry': '1/2', 'parameters': []},
+    {'id': 4, 'name': 'db', 'title': 'base/db', 'parent_id': 1, 'ancestry': '1'},
+]
+
+
+class HostgroupTreeTest(unittest.TestCase):
+    def setUp(self):
+        self.tree = HostgroupTree(HOSTGROUPS)
+
+    def test_hierarchy(self):
+        self.assertEqual([g['id'] for g in self.tree.ancestors(3)], [1, 2])
+        self.assertEqual([g['id'] for g in self.tree.descendants(1)], [2, 3, 4])
+        self.assertEqual(self.tree.find('base/web/nginx')['id'], 3)
+        self.assertEqual(self.tree.path(3), 'base/web/nginx')
+        self.assertEqual([g['id'] for g in self.tree.roots()], [1])
+        self.assertIn('base/db', self.tree)
+        self.assertNotIn('missing', self.tree)
+
+    def test_inheritance(self):
+        attributes = self.tree.effective_attributes('base/web/nginx')
+        self.assertEqual(attributes['domain_name'], 'example.com')
+        self.assertEqual(attributes['subnet_name'], 'dmz')
+        self.assertIsNone(attributes['operatingsystem_id'])
+        self.assertEqual(self.tree.effective_parameters(3), {'ntp': 'ntp1', 'role': 'web'})
+
+    def test_host(self):
+        host = {'hostgroup_id': 3, 'domain_id': 9, 'domain_name': 'other.com', 'subnet_id': None,
+                'parameters': [{'name': 'ntp', 'value': 'local'}]}
+        attributes = self.tree.host_attributes(host)
+        self.assertEqual(attributes['domain_name'], 'other.com')
+        self.assertEqual(attributes['subnet_id'], 2)
+        self.assertEqual(self.tree.host_parameters(host), {'ntp': 'local', 'role': 'web'})
+
+
+class HostgroupTreeLoadTest(unittest.TestCase):
+    def test_load(self):
+        with MockForeman(dataset=generate_dataset(hosts=0, hostgroups=30)) as server:
+            tree = HostgroupTree.load(server.client(), per_page=10)
+            self.assertEqual(server.request_count, 3)
+            self.assertEqual(len(tree), 30)
+            for hostgroup in server.dataset['hostgroups']:
+                self.assertEqual(tree.path(hostgroup['id']), hostgroup['title'])
+                self.assertIsNotNone(tree.effective_attributes(hostgroup['id'])['domain_id'])
+            tree = HostgroupTree.load(server.client(), parameters=True)
+            self.assertEqual(tree.effective_parameters(1), {'hg_param': 'hg1'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import time
+import unittest
+
+from foreman.foreman import ForemanError
+from foreman.images import ImageCatalog
+from mockserver import MockForeman, generate_dataset
+
+
+class ImageCatalogTest(unittest.TestCase):
+    def setUp(self):
+        self.server = MockForeman(dataset=generate_dataset(hosts=0, compute_resources=8,
+                                                           images_per_compute_resource=3),
+                                  latency=0.05).start()
+        self.foreman = self.server.client()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_catalog(self):
+        catalog = ImageCatalog(self.foreman, max_workers=8)
+        start = time.time()
+        self.assertEqual(catalog.refresh(), 8)
+        # One listing plus eight concurrent image requests
+        self.assertLess(time.time() - start, 8 * 0.05)
+        self.assertEqual(self.server.request_count, 9)
+        self.assertEqual(len(catalog.images()), 24)
+        self.assertEqual(len(catalog.images('compute3')), 3)
+        image = catalog.find('compute3', 'image1')
+        self.assertEqual(image['compute_resource_name'], 'compute3')
+        self.assertIs(catalog.find(image['compute_resource_id'], image['uuid']), image)
+        self.assertIsNone(catalog.find('compute3', 'missing'))
+        self.assertRaises(KeyError, catalog.find, 'missing', 'image1')
+
+    def test_ttl(self):
+        catalog = ImageCatalog(self.foreman, ttl=60)
+        catalog.images()
+        catalog.find('compute1', 'image0')
+        self.assertEqual(self.server.request_count, 9)
+        catalog.refreshed_at -= 60
+        catalog.find('compute1', 'image0')
+        self.assertEqual(self.server.request_count, 18)
+
+    def test_errors_keep_previous_images(self):
+        catalog = ImageCatalog(self.foreman)
+        catalog.refresh()
+        fetch = catalog._fetch
+
+        def failing(compute_resource):
+            if compute_resource['name'] == 'compute2':
+                raise ForemanError('url', 500, 'failed')
+            return fetch(compute_resource)
+        catalog._fetch = failing
+        catalog.refresh()
+        self.assertEqual(list(catalog.errors), [2])
+        self.assertEqual(len(catalog.images('compute2')), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
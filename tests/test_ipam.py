@@ -0,0 +1,98 @@
+import unittest
+
+from foreman.foreman import HOSTS, ForemanError
+from foreman.ipam import IPAM
+from mockserver import MockForeman, generate_dataset
+
+
+class IPAMTest(unittest.TestCase):
+    def setUp(self):
+        self.server = MockForeman(dataset=generate_dataset(hosts=30, subnets=3)).start()
+        self.foreman = self.server.client()
+        self.ipam = IPAM.load(self.foreman, per_page=10)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def fail_searches(self, status):
+        handle = self.server.handle
+
+        def failing(method, path, params, body, auth=None):
+            if params and params.get('search'):
+                return status, {'error': {'message': 'Search failed'}}
+            return handle(method, path, params, body, auth=auth)
+        self.server.handle = failing
+
+    def test_lookup(self):
+        hosts = list(self.foreman.iter_resources(resource_type=HOSTS))
+        for host in hosts:
+            self.assertTrue(self.ipam.is_used(host['ip']))
+            self.assertEqual(self.ipam.used_by(host['ip']), host['name'])
+            self.assertEqual(self.ipam.subnet_for(host['ip'])['id'], host['subnet_id'])
+        self.assertIsNone(self.ipam.subnet_for('192.0.2.1'))
+        self.assertEqual(self.ipam.check(hosts[0]['ip']), '{0} is used by {1}'.format(hosts[0]['ip'], hosts[0]['name']))
+        self.assertIn('not in any subnet', self.ipam.check('192.0.2.1'))
+        self.assertIn('outside the assignable range', self.ipam.check('10.0.1.5'))
+        self.assertIn('not in subnet net2', self.ipam.check('10.0.1.200', subnet='net2'))
+        self.assertTrue(self.ipam.is_free('10.0.1.200', subnet=1))
+
+    def test_most_specific_subnet(self):
+        subnets = [{'id': 1, 'name': 'wide', 'network': '10.0.0.0', 'cidr': 16},
+                   {'id': 2, 'name': 'narrow', 'network': '10.0.4.0', 'cidr': 24, 'gateway': '10.0.4.2'},
+                   {'id': 3, 'name': 'v6', 'network': '2001:db8::', 'cidr': 64}]
+        ipam = IPAM(subnets, [{'id': 1, 'name': 'a', 'ip': '10.0.4.1', 'ip6': '2001:db8::1'}])
+        self.assertEqual(ipam.subnet_for('10.0.4.7')['name'], 'narrow')
+        self.assertEqual(ipam.subnet_for('10.0.5.7')['name'], 'wide')
+        self.assertEqual(ipam.subnet_for('2001:db8::5')['name'], 'v6')
+        self.assertIn('gateway', ipam.check('10.0.4.2'))
+        self.assertEqual(ipam.next_free('narrow', count=2), ['10.0.4.3', '10.0.4.4'])
+        self.assertEqual(ipam.next_free('v6'), ['2001:db8::2'])
+
+    def test_next_free_low_ipv6(self):
+        subnets = [{'id': 1, 'name': 'mapped', 'network': '::ffff:0:0', 'cidr': 96},
+                   {'id': 2, 'name': 'low', 'network': '::', 'cidr': 120}]
+        ipam = IPAM(subnets, [{'id': 1, 'name': 'a', 'ip6': '::ffff:0:1'}])
+        self.assertEqual(ipam.next_free('mapped', count=2), ['::ffff:0:2', '::ffff:0:3'])
+        self.assertEqual(ipam.next_free('low'), ['::1'])
+
+    def test_next_free_large_range(self):
+        hosts = [{'id': i, 'name': 'h{0}'.format(i), 'ip6': '2001:db8::{0:x}'.format(i)} for i in range(1, 5001)]
+        ipam = IPAM([{'id': 1, 'name': 'v6', 'network': '2001:db8::', 'cidr': 64}], hosts)
+        self.assertEqual(ipam.next_free('v6', count=2), ['2001:db8::1389', '2001:db8::138a'])
+        self.assertEqual(ipam.next_free('v6', start='2001:db8::ffff:ffff:ffff:fffe', count=5),
+                         ['2001:db8::ffff:ffff:ffff:fffe', '2001:db8::ffff:ffff:ffff:ffff'])
+
+    def test_next_free_and_reserve(self):
+        free = self.ipam.next_free('net1', count=3)
+        self.assertEqual(len(free), 3)
+        for ip in free:
+            self.assertTrue(self.ipam.is_free(ip, subnet='net1'))
+        self.ipam.reserve(free[0], 'pending.example.com')
+        self.assertEqual(self.ipam.next_free('net1', count=2), free[1:])
+        self.assertRaises(ValueError, self.ipam.reserve, free[0], 'other.example.com')
+        self.ipam.refresh(full=True)
+        self.assertEqual(self.ipam.used_by(free[0]), 'pending.example.com')
+        self.ipam.release(free[0])
+        self.assertTrue(self.ipam.is_free(free[0]))
+
+    def test_refresh(self):
+        hosts = list(self.foreman.iter_resources(resource_type=HOSTS))
+        self.foreman.update_host(id=hosts[0]['id'], data={'host': {'ip': '10.0.1.240'}})
+        self.ipam.refresh()
+        self.assertEqual(self.ipam.used_by('10.0.1.240'), hosts[0]['name'])
+        self.assertFalse(self.ipam.is_used(hosts[0]['ip']))
+
+        self.foreman.delete_host(id=hosts[1]['id'])
+        self.assertEqual(self.ipam.refresh(), 29)
+        self.assertFalse(self.ipam.is_used(hosts[1]['ip']))
+
+    def test_refresh_server_error(self):
+        self.fail_searches(400)
+        self.assertEqual(self.ipam.refresh(), 30)
+        del self.server.handle
+        self.fail_searches(500)
+        self.assertRaises(ForemanError, self.ipam.refresh)
+
+
+if __name__ == '__main__':
+    unittest.main()
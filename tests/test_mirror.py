@@ -0,0 +1,85 @@
+import unittest
+
+from foreman.foreman import DOMAINS, HOSTGROUPS, HOSTS, ForemanError
+from foreman.mirror import MAX_VARIABLES, ForemanMirror
+from mockserver import MockForeman, generate_dataset
+
+
+class ForemanMirrorTest(unittest.TestCase):
+    def setUp(self):
+        self.server = MockForeman(dataset=generate_dataset(hosts=60)).start()
+        self.foreman = self.server.client()
+        self.mirror = ForemanMirror(self.foreman, resource_types=[HOSTS, HOSTGROUPS, DOMAINS], per_page=25)
+        self.mirror.sync()
+
+    def tearDown(self):
+        self.mirror.close()
+        self.server.stop()
+
+    def fail_searches(self, status):
+        handle = self.server.handle
+
+        def failing(method, path, params, body, auth=None):
+            if params and params.get('search'):
+                return status, {'error': {'message': 'Search failed'}}
+            return handle(method, path, params, body, auth=auth)
+        self.server.handle = failing
+
+    def test_find(self):
+        host = self.foreman.get_host(id=5)
+        hosts = self.mirror.find(HOSTS, hostgroup=host['hostgroup_title'], subnet=host['subnet_name'],
+                                 operatingsystem=host['operatingsystem_id'])
+        expected = [h['id'] for h in self.server.dataset['hosts']
+                    if (h['hostgroup_id'], h['subnet_id'], h['operatingsystem_id']) ==
+                    (host['hostgroup_id'], host['subnet_id'], host['operatingsystem_id'])]
+        self.assertEqual([h['id'] for h in hosts], expected)
+        self.assertEqual(self.mirror.count(HOSTS), 60)
+        self.assertEqual(self.mirror.get(HOSTS, host['name'])['id'], 5)
+        self.assertRaises(ValueError, self.mirror.find, HOSTS, bogus=1)
+
+    def test_incremental_sync(self):
+        self.foreman.update_host(id=3, data={'host': {'comment': 'changed'}})
+        result = self.mirror.sync_resource_type(HOSTS)
+        self.assertTrue(result['incremental'])
+        self.assertEqual(result['updated'], 1)
+        self.assertEqual(result['deleted'], 0)
+        self.assertEqual(self.mirror.get(HOSTS, 3)['comment'], 'changed')
+        # Only resources changed since the last sync are fetched now
+        self.server.reset_stats()
+        self.assertEqual(self.mirror.sync_resource_type(HOSTS)['updated'], 0)
+        self.assertEqual(self.server.request_count, 2)
+
+    def test_deletions(self):
+        self.foreman.delete_host(id=7)
+        result = self.mirror.sync_resource_type(HOSTS)
+        self.assertEqual(result['deleted'], 1)
+        self.assertIsNone(self.mirror.get(HOSTS, 7))
+        self.assertEqual(self.mirror.count(HOSTS), 59)
+
+    def test_refresh_resource(self):
+        self.foreman.update_domain(id=1, data={'domain': {'fullname': 'New'}})
+        self.mirror.refresh_resource(DOMAINS, 1)
+        self.assertEqual(self.mirror.get(DOMAINS, 1)['fullname'], 'New')
+        self.foreman.delete_domain(id=1)
+        self.assertIsNone(self.mirror.refresh_resource(DOMAINS, 1))
+        self.assertIsNone(self.mirror.get(DOMAINS, 1))
+
+    def test_unsupported_search(self):
+        self.fail_searches(422)
+        self.assertFalse(self.mirror.sync_resource_type(HOSTS)['incremental'])
+        del self.server.handle
+        self.fail_searches(500)
+        # A failing server is not mistaken for an unsupported search
+        self.assertRaises(ForemanError, self.mirror.sync_resource_type, HOSTS)
+
+    def test_changed_many_ids(self):
+        items = [dict(host, id=host['id'] + offset) for offset in range(0, 2 * MAX_VARIABLES, 60)
+                 for host in self.server.dataset['hosts']]
+        self.mirror._upsert(HOSTS, items)
+        for item in items[::7]:
+            item['updated_at'] = '2030-01-01T00:00:00Z'
+        self.assertEqual(self.mirror._changed(HOSTS, items), items[::7])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+
+from foreman.foreman import ForemanError, HOSTS
+from mockserver import MockForeman, generate_dataset
+
+
+class MockForemanTest(unittest.TestCase):
+    def setUp(self):
+        self.server = MockForeman(dataset=generate_dataset(hosts=50), username='admin', password='secret').start()
+        self.foreman = self.server.client()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_get_resources(self):
+        hosts = self.foreman.get_hosts()
+        self.assertEqual(len(hosts), 50)
+        self.assertNotIn('parameters', hosts[0])
+
+    def test_get_resource(self):
+        host = self.foreman.get_host(id=3)
+        self.assertEqual(host.get('id'), 3)
+        self.assertIn('parameters', host)
+
+    def test_search_resource(self):
+        name = self.foreman.get_host(id=7).get('name')
+        host = self.foreman.search_host(data={'name': name})
+        self.assertEqual(host.get('id'), 7)
+
+    def test_create_update_delete(self):
+        domain = self.foreman.create_domain(data={'name': 'new.example.com'})
+        self.foreman.update_domain(id=domain.get('id'), data={'domain': {'fullname': 'New'}})
+        self.assertEqual(self.foreman.get_domain(id=domain.get('id')).get('fullname'), 'New')
+        self.foreman.delete_domain(id=domain.get('id'))
+        with self.assertRaises(ForemanError) as cm:
+            self.foreman.get_domain(id=domain.get('id'))
+        self.assertEqual(cm.exception.status_code, 404)
+
+    def test_generated_update(self):
+        self.foreman.update_architecture(id=1, data={'architecture': {'name': 'aarch64'}})
+        self.assertEqual(self.foreman.get_architecture(id=1).get('name'), 'aarch64')
+        self.foreman.update_partition_table(id=1, data={'ptable': {'layout': 'part /'}})
+        self.assertEqual(self.foreman.get_partition_table(id=1).get('layout'), 'part /')
+
+    def test_validation_error(self):
+        name = self.foreman.get_domains()[0].get('name')
+        with self.assertRaises(ForemanError) as cm:
+            self.foreman.create_domain(data={'name': name})
+        self.assertEqual(cm.exception.status_code, 422)
+        self.assertEqual(cm.exception.message, 'Name has already been taken')
+
+    def test_components(self):
+        images = self.foreman.get_compute_resource_images(compute_resource_id=1)
+        self.assertEqual(len(images), 3)
+        parameters = self.foreman.get_host_parameters(host_id=1)
+        self.assertEqual(len(parameters), 2)
+
+    def test_authentication(self):
+        foreman = self.server.client()
+        foreman._Foreman__auth = ('admin', 'wrong')
+        with self.assertRaises(ForemanError) as cm:
+            foreman.get_resources(resource_type=HOSTS)
+        self.assertEqual(cm.exception.status_code, 401)
+
+    def test_injected_errors(self):
+        self.server.error_rate = 1.0
+        with self.assertRaises(ForemanError) as cm:
+            self.foreman.get_architectures()
+        self.assertEqual(cm.exception.status_code, 500)
+        self.assertEqual(self.server.injected_errors, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+
+from mockserver import MockForeman, generate_dataset
+from foreman.models import Host, Hostgroup, ModelSession
+
+
+class ModelSessionTest(unittest.TestCase):
+    def setUp(self):
+        self.server = MockForeman(dataset=generate_dataset(hosts=40, hostgroups=3)).start()
+        self.session = ModelSession(self.server.client())
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_lazy_fields(self):
+        host = self.session.get_hosts()[0]
+        self.assertIsInstance(host, Host)
+        self.assertRaises(AttributeError, object.__getattribute__, host, 'name')
+        self.assertEqual(host.id, 1)
+        self.assertEqual(object.__getattribute__(host, 'name'), host.name)
+        self.assertEqual(host['hostgroup_name'], host.get('hostgroup_name'))
+        self.assertFalse(hasattr(host, '__dict__'))
+
+    def test_undeclared_keys_decoded_once(self):
+        host = self.session.get_hosts()[0]
+        host.name
+        # Reading a declared field keeps the dict for the other keys
+        data = host._data
+        self.assertIsNotNone(data)
+        host.get('hostgroup_name')
+        self.assertIs(host._data, data)
+        self.assertEqual(host['hostgroup_name'], self.server.dataset['hosts'][0]['hostgroup_name'])
+        self.assertIs(host._decoded(), host._decoded())
+        self.session.get_hosts()
+        # Refreshed in place, the next access decodes the new text
+        self.assertIsNone(host._data)
+        self.assertEqual(host.get('hostgroup_name'), self.server.dataset['hosts'][0]['hostgroup_name'])
+
+    def test_all_streams(self):
+        calls = []
+        get_resources = self.session.foreman.get_resources
+
+        def record(**kwargs):
+            calls.append(kwargs)
+            return get_resources(**kwargs)
+        self.session.foreman.get_resources = record
+        self.server.dataset['hosts'][0]['comment'] = u'h\u00f6st'
+        hosts = self.session.get_hosts()
+        self.assertTrue(calls[0]['stream'])
+        self.assertEqual(len(hosts), 40)
+        self.assertEqual(hosts[0].comment, u'h\u00f6st')
+
+    def test_identity_map(self):
+        hosts = self.session.get_hosts()
+        self.server.reset_stats()
+        groups = set(id(host.hostgroup) for host in hosts)
+        self.assertLessEqual(len(groups), 3)
+        self.assertEqual(self.server.request_count, len(groups))
+        self.assertIsInstance(hosts[0].hostgroup, Hostgroup)
+        self.assertIs(hosts[0].hostgroup, self.session.get_hostgroup(hosts[0].hostgroup_id))
+
+    def test_refresh_in_place(self):
+        host = self.session.get_host(2)
+        self.server.client().update_resource(resource_type='hosts', resource_id=2, data={'host': {'comment': 'x'}})
+        self.assertEqual(host.comment, '')
+        self.assertIs(self.session.refresh(host), host)
+        self.assertEqual(host.comment, 'x')
+
+
+if __name__ == '__main__':
+    unittest.main()
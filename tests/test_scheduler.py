@@ -0,0 +1,103 @@
+import threading
+import time
+import unittest
+from concurrent import futures
+
+from foreman.deadline import Deadline, propagate
+from foreman.foreman import ForemanTimeoutError
+from mockserver import MockForeman, generate_dataset
+from foreman.scheduler import BULK, INTERACTIVE, RequestScheduler, SchedulerTimeout, current_priority, priority
+
+
+class RequestSchedulerTest(unittest.TestCase):
+    def test_priority_context(self):
+        self.assertEqual(current_priority(), INTERACTIVE)
+        with priority(BULK):
+            self.assertEqual(current_priority(), BULK)
+            function = propagate(current_priority)
+        executor = futures.ThreadPoolExecutor(max_workers=1)
+        self.assertEqual(executor.submit(function).result(), BULK)
+        executor.shutdown()
+        self.assertRaises(ValueError, priority, 'urgent')
+
+    def test_interactive_first(self):
+        scheduler = RequestScheduler(max_concurrency=1)
+        order = []
+        held = scheduler.acquire()
+
+        def request(name, label):
+            with priority(name):
+                slot = scheduler.acquire()
+                order.append(label)
+                scheduler.release(slot)
+
+        threads = []
+        for name, label in ((BULK, 'bulk1'), (BULK, 'bulk2'), (INTERACTIVE, 'interactive')):
+            thread = threading.Thread(target=request, args=(name, label))
+            thread.start()
+            threads.append(thread)
+            while scheduler.waiting()[name] < (2 if label == 'bulk2' else 1):
+                time.sleep(0.001)
+        scheduler.release(held)
+        for thread in threads:
+            thread.join()
+        self.assertEqual(order, ['interactive', 'bulk1', 'bulk2'])
+
+    def test_bulk_limit_and_timeout(self):
+        scheduler = RequestScheduler(max_concurrency=4, limits={BULK: 2})
+        with priority(BULK):
+            slots = [scheduler.acquire(), scheduler.acquire()]
+            self.assertRaises(SchedulerTimeout, scheduler.acquire, timeout=0.01)
+        # Interactive requests still get the remaining slots
+        slots += [scheduler.acquire(timeout=0.01), scheduler.acquire(timeout=0.01)]
+        self.assertEqual(scheduler.in_flight(), {INTERACTIVE: 2, BULK: 2})
+        self.assertEqual(scheduler.waiting(), {INTERACTIVE: 0, BULK: 0})
+        for slot in slots:
+            scheduler.release(slot)
+
+
+class ScheduledClientTest(unittest.TestCase):
+    def setUp(self):
+        self.server = MockForeman(dataset=generate_dataset(hosts=10), latency=0.02).start()
+        self.scheduler = RequestScheduler(max_concurrency=4, limits={BULK: 3})
+        self.foreman = self.server.client(scheduler=self.scheduler)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_interactive_under_bulk_load(self):
+        stop = threading.Event()
+
+        def bulk(i):
+            with priority(BULK):
+                while not stop.is_set():
+                    self.foreman.get_host(id=i % 10 + 1)
+
+        executor = futures.ThreadPoolExecutor(max_workers=12)
+        for i in range(12):
+            executor.submit(bulk, i)
+        try:
+            time.sleep(0.1)
+            for _ in range(5):
+                self.foreman.get_domains()
+        finally:
+            stop.set()
+            executor.shutdown(wait=True)
+        stats = self.scheduler.stats()
+        self.assertEqual(stats[BULK]['max_in_flight'], 3)
+        self.assertEqual(stats[INTERACTIVE]['requests'], 5)
+        # A free slot was always kept for interactive requests
+        self.assertLess(stats[INTERACTIVE]['max_wait_s'], 0.02)
+        self.assertGreater(stats[BULK]['max_wait_s'], 0.02)
+
+    def test_deadline_while_waiting(self):
+        with priority(BULK):
+            slots = [self.scheduler.acquire() for _ in range(3)]
+            with Deadline(0.05):
+                self.assertRaises(ForemanTimeoutError, self.foreman.get_domains)
+        for slot in slots:
+            self.scheduler.release(slot)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+
+from mockserver import MockForeman, generate_dataset
+from foreman.scoping import fetch_scoped, fetch_unassigned, shard_ids
+
+
+class ScopingTest(unittest.TestCase):
+    def setUp(self):
+        self.server = MockForeman(dataset=generate_dataset(hosts=40, organizations=4, locations=2)).start()
+        self.foreman = self.server.client()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_scoped_listing(self):
+        hosts = self.foreman.get_hosts()
+        scoped = self.foreman.get_hosts(organization_id=2)
+        self.assertTrue(scoped)
+        self.assertEqual(scoped, [host for host in hosts if host['organization_id'] == 2])
+        self.assertEqual(self.foreman.count_resources('hosts', organization_id=2, location_id=1),
+                         len([host for host in scoped if host['location_id'] == 1]))
+        self.assertEqual(list(self.foreman.iter_resources('hosts', per_page=3, organization_id=2)), scoped)
+
+    def test_fetch_scoped(self):
+        hosts = self.foreman.get_hosts()
+        self.assertEqual(fetch_scoped(self.foreman, 'hosts', per_page=7), hosts)
+        self.assertEqual(fetch_scoped(self.foreman, 'hosts', location_ids=[1, 2]), hosts)
+        self.assertEqual(fetch_scoped(self.foreman, 'hosts', organization_ids=[1, 3]),
+                         [host for host in hosts if host['organization_id'] in (1, 3)])
+
+    def test_fetch_unassigned(self):
+        self.server.dataset['hosts'][3]['organization_id'] = None
+        hosts = fetch_unassigned(self.foreman, 'hosts', per_page=7)
+        self.assertEqual([host['id'] for host in hosts], [4])
+        self.assertEqual(len(fetch_scoped(self.foreman, 'hosts')) + len(hosts), 40)
+
+    def test_shard_ids(self):
+        organizations = self.foreman.get_organizations()
+        shards = [shard_ids(organizations, index, 3) for index in range(3)]
+        self.assertEqual(shards, [[1, 4], [2], [3]])
+        self.assertRaises(ValueError, shard_ids, organizations, 3, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+import threading
+import unittest
+
+from foreman.foreman import ForemanError
+from mockserver import MockForeman, generate_dataset
+from foreman.singleflight import CallAborted, SingleFlight
+
+
+class SingleFlightTest(unittest.TestCase):
+    def test_error_is_shared(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        errors = []
+
+        def fail():
+            started.set()
+            release.wait()
+            raise ValueError('boom')
+
+        def call():
+            try:
+                flight.do('key', fail)
+            except ValueError as e:
+                errors.append(e)
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        started.wait()
+        follower = threading.Thread(target=call)
+        follower.start()
+        while flight.coalesced == 0:
+            pass
+        release.set()
+        leader.join()
+        follower.join()
+        self.assertEqual(len(errors), 2)
+        self.assertEqual(flight.stats(), {'calls': 1, 'coalesced': 1})
+        self.assertEqual(flight.in_flight(), 0)
+
+    def test_interrupted_leader(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        outcomes = []
+
+        def interrupted():
+            started.set()
+            release.wait()
+            raise SystemExit(1)
+
+        def call():
+            try:
+                outcomes.append(flight.do('key', interrupted))
+            except CallAborted as e:
+                outcomes.append(e)
+            except SystemExit:
+                outcomes.append('exit')
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        started.wait()
+        follower = threading.Thread(target=call)
+        follower.start()
+        while flight.coalesced == 0:
+            pass
+        release.set()
+        leader.join()
+        follower.join()
+        # The follower does not get None as if the call had succeeded
+        self.assertEqual(len(outcomes), 2)
+        self.assertIn('exit', outcomes)
+        self.assertTrue(any(isinstance(outcome, CallAborted) for outcome in outcomes))
+
+    def test_results_are_independent(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        results = []
+
+        def work():
+            release.wait()
+            return {'results': [1]}
+
+        def call():
+            result = flight.do('key', work)
+            # Modify right away, before waiters could have copied it
+            result['results'].append(2)
+            results.append(result)
+
+        threads = [threading.Thread(target=call) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        while flight.coalesced < 19:
+            pass
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [{'results': [1, 2]}] * 20)
+
+
+class CoalescedGetTest(unittest.TestCase):
+    def setUp(self):
+        self.server = MockForeman(dataset=generate_dataset(hosts=5), latency=0.2).start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def fetch_concurrently(self, foreman, count=10):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(foreman.get_hostgroup(id=1)))
+                   for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_identical_gets_share_one_request(self):
+        foreman = self.server.client()
+        results = self.fetch_concurrently(foreman)
+        self.assertEqual(len(results), 10)
+        self.assertEqual(self.server.request_count, 1)
+        self.assertEqual(foreman.get_request_stats(), {'calls': 1, 'coalesced': 9})
+        results[0]['name'] = 'changed'
+        self.assertNotEqual(results[1]['name'], 'changed')
+
+    def test_errors_reach_all_callers(self):
+        self.server.error_rate = 1.0
+        foreman = self.server.client()
+        errors = []
+
+        def fetch():
+            try:
+                foreman.get_domain(id=1)
+            except ForemanError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=fetch) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(errors), 5)
+        self.assertEqual(self.server.request_count, 1)
+
+    def test_disabled(self):
+        foreman = self.server.client(coalesce_requests=False)
+        self.fetch_concurrently(foreman, count=3)
+        self.assertEqual(self.server.request_count, 3)
+        self.assertEqual(foreman.get_request_stats(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import json
+import unittest
+
+from foreman.foreman import ForemanError
+from mockserver import MockForeman, generate_dataset
+from foreman.streaming import ResultStream
+
+RESPONSE = {
+    'total': 3, 'subtotal': 3, 'page': 1, 'per_page': 3, 'search': None,
+    'sort': {'by': None, 'order': None},
+    'results': [
+        {'id': 1, 'name': u'höst1', 'size': 123456789, 'ratio': -1.5e-3},
+        {'id': 2, 'name': u'中文', 'tags': ['a', {'b': [1, 2]}]},
+        {'id': 3, 'name': 'host3', 'comment': 'contains ] and } and "quotes"'},
+    ],
+    'trailer': 42,
+}
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class ResultStreamTest(unittest.TestCase):
+    def test_chunk_sizes(self):
+        body = json.dumps(RESPONSE, ensure_ascii=False).encode('utf-8')
+        for size in (1, 2, 3, 7, 64, len(body)):
+            stream = ResultStream(chunked(body, size))
+            self.assertEqual(list(stream), RESPONSE['results'], size)
+            self.assertEqual(stream.count, 3)
+            self.assertEqual(stream.meta['subtotal'], 3)
+            self.assertEqual(stream.meta['trailer'], 42)
+            self.assertNotIn('results', stream.meta)
+
+    def test_with_text(self):
+        body = json.dumps(RESPONSE, ensure_ascii=False).encode('utf-8')
+        for size in (1, 7, len(body)):
+            pairs = list(ResultStream(chunked(body, size), with_text=True))
+            self.assertEqual([item for item, _ in pairs], RESPONSE['results'], size)
+            self.assertEqual([json.loads(text) for _, text in pairs], RESPONSE['results'], size)
+
+    def test_meta_before_results(self):
+        stream = ResultStream([b'{"total": 2, "results": [1, 2], "page": 1}'])
+        iterator = iter(stream)
+        self.assertEqual(next(iterator), 1)
+        self.assertEqual(stream.meta, {'total': 2})
+        self.assertEqual(list(iterator), [2])
+        self.assertEqual(stream.meta, {'total': 2, 'page': 1})
+
+    def test_number_at_chunk_boundary(self):
+        stream = ResultStream([b'{"results": [12', b'34, 5', b'6]}'])
+        self.assertEqual(list(stream), [1234, 56])
+
+    def test_empty(self):
+        self.assertEqual(list(ResultStream([b'{}'])), [])
+        stream = ResultStream([b'{"total": 0, "results": [ ] }'])
+        self.assertEqual(list(stream), [])
+        self.assertEqual(stream.meta, {'total': 0})
+
+    def test_truncated(self):
+        with self.assertRaises(ValueError):
+            list(ResultStream([b'{"results": [{"id": 1}, {"id"']))
+
+    def test_close(self):
+        closed = []
+        stream = ResultStream([b'{"results": [1, 2, 3]}'], close=lambda: closed.append(True))
+        iterator = iter(stream)
+        next(iterator)
+        iterator.close()
+        self.assertEqual(closed, [True])
+
+
+class ForemanStreamTest(unittest.TestCase):
+    def test_stream(self):
+        with MockForeman(dataset=generate_dataset(hosts=250)) as server:
+            foreman = server.client()
+            hosts = foreman.get_resources(resource_type='hosts')
+            self.assertEqual(list(foreman.get_resources(resource_type='hosts', stream=True)), hosts)
+            self.assertEqual(list(foreman.iter_resources(resource_type='hosts', per_page=100, stream=True)), hosts)
+            found = list(foreman.search_resource(resource_type='hosts', data={'name': hosts[0]['name']},
+                                                 stream=True))
+            self.assertEqual(found, [hosts[0]])
+            with self.assertRaises(ForemanError):
+                foreman.get_resources(resource_type='hosts', resource_id='missing', component='parameters',
+                                      stream=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
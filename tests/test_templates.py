@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from mockserver import MockForeman, generate_dataset
+from foreman.templates import TemplateSync
+
+
+class TemplateSyncTest(unittest.TestCase):
+    def setUp(self):
+        self.server = MockForeman(dataset=generate_dataset(hosts=0, config_templates=6, partition_tables=2)).start()
+        self.foreman = self.server.client()
+        self.directory = tempfile.mkdtemp()
+        self.sync = TemplateSync(self.foreman, self.directory, max_workers=4)
+        self.sync.pull()
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    def path(self, resource_type, name):
+        return os.path.join(self.directory, resource_type, name + '.erb')
+
+    def test_pull(self):
+        self.assertTrue(os.path.exists(self.path('ptables', 'ptable2')))
+        self.server.reset_stats()
+        report = TemplateSync(self.foreman, self.directory).pull()
+        self.assertEqual(report.summary()['downloaded'], 0)
+        self.assertEqual(report.summary()['unchanged'], 8)
+        # Only the two listings, no template is downloaded again
+        self.assertEqual(self.server.request_count, 2)
+
+    def test_push_only_changed(self):
+        with open(self.path('config_templates', 'template3'), 'a') as f:
+            f.write('\n# changed\n')
+        self.assertEqual(self.sync.status(), [('config_templates', 'template3')])
+        self.server.reset_stats()
+        report = self.sync.push()
+        self.assertEqual(report.uploaded, [('config_templates', 'template3')])
+        self.assertEqual(self.server.requests_by_method.get('PUT'), 1)
+        self.assertTrue(self.foreman.get_config_template(id=3)['template'].endswith('# changed\n'))
+        self.assertEqual(self.sync.push().summary()['uploaded'], 0)
+
+    def test_create_new_template(self):
+        with open(self.path('ptables', 'new'), 'w') as f:
+            f.write('part / --size 1024')
+        report = self.sync.push()
+        self.assertEqual(report.created, [('ptables', 'new')])
+        ptable = self.foreman.search_partition_table({'name': 'new'})
+        self.assertEqual(self.foreman.get_partition_table(id=ptable['id'])['layout'], 'part / --size 1024')
+
+    def test_conflict(self):
+        self.foreman.update_config_template(id=1, data={'config_template': {'template': 'remote'}})
+        with open(self.path('config_templates', 'template1'), 'w') as f:
+            f.write('local')
+        self.assertEqual(self.sync.push().conflicts, [('config_templates', 'template1')])
+        self.assertEqual(self.sync.pull().conflicts, [('config_templates', 'template1')])
+        self.sync.pull(force=True)
+        with open(self.path('config_templates', 'template1')) as f:
+            self.assertEqual(f.read(), 'remote')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+
+from mockserver import MockForeman, generate_dataset
+from foreman.transport import HTTP2Transport, RequestsTransport, Transport
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+class RecordingTransport(Transport):
+    def __init__(self, transport):
+        super(RecordingTransport, self).__init__()
+        self.transport = transport
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url))
+        return self.transport.request(method, url, **kwargs)
+
+
+class TransportTest(unittest.TestCase):
+    def setUp(self):
+        self.server = MockForeman(dataset=generate_dataset(hosts=200, template_size=8192), compress=True).start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_compressed_response(self):
+        plain = self.server.client(transport=RequestsTransport())
+        self.server.compress = False
+        expected = plain.get_hosts()
+        uncompressed = self.server.bytes_sent
+        self.server.compress = True
+        self.server.reset_stats()
+        self.assertEqual(plain.get_hosts(), expected)
+        self.assertEqual(list(plain.get_resources(resource_type='hosts', stream=True)), expected)
+        self.assertLess(self.server.bytes_sent, uncompressed)
+
+    def test_compressed_request(self):
+        foreman = self.server.client(transport=RequestsTransport(compress_requests=True))
+        template = foreman.get_config_templates()[0]
+        content = 'echo {0}\n'.format('x' * 100) * 50
+        foreman.update_config_template(id=template['id'], data={'config_template': {'template': content}})
+        self.assertEqual(self.server.compressed_requests, 1)
+        self.assertEqual(foreman.get_config_template(id=template['id'])['template'], content)
+        # Small bodies are sent as is
+        foreman.update_config_template(id=template['id'], data={'config_template': {'name': 'renamed'}})
+        self.assertEqual(self.server.compressed_requests, 1)
+
+    def test_custom_transport(self):
+        transport = RecordingTransport(RequestsTransport())
+        foreman = self.server.client(transport=transport)
+        foreman.get_hosts()
+        self.assertEqual(transport.calls, [('get', self.server.url + '/api/v2/hosts')])
+
+    @unittest.skipIf(httpx is None, 'httpx not installed')
+    def test_http2_transport(self):
+        foreman = self.server.client(transport=HTTP2Transport(compress_requests=True))
+        expected = self.server.client().get_hosts()
+        self.assertEqual(foreman.get_hosts(), expected)
+        self.assertEqual(list(foreman.iter_resources(resource_type='hosts', per_page=50, stream=True)), expected)
+        foreman.close()
+
+
+if __name__ == '__main__':
+    unittest.main()